@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''Measure the fill time and worst main loop stall when adding search results
+to the model, one idle callback per row or in time-sliced batches.
+
+The main loop and the model are simulated, as a real Dee model needs a
+session bus: each dispatched callback costs DISPATCH_COST and each appended
+row APPEND_COST. Like GLib, an iteration dispatches every ready idle source.
+
+Run from the top directory with: python3 -m benchmarks.bench_batchappender'''
+
+import time
+
+from private_lib.batchappender import BatchAppender, DEFAULT_TIME_BUDGET
+
+SIZES = (100, 1000)
+BATCH_SIZES = (10, 50, 200)
+# simulated cost in seconds of dispatching an idle callback and of appending a row
+DISPATCH_COST = 5e-6
+APPEND_COST = 20e-6
+
+
+def spin(duration):
+    '''Busy wait for duration seconds'''
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        pass
+
+
+class SimulatedMainLoop(object):
+    '''Main loop running idle callbacks, recording the duration of each iteration'''
+
+    def __init__(self):
+        self.sources = []
+        self.iteration_durations = []
+
+    def idle_add(self, function, *args):
+        self.sources.append((function, args))
+
+    def run_until_idle(self):
+        while self.sources:
+            start = time.perf_counter()
+            (sources, self.sources) = (self.sources, [])
+            for (function, args) in sources:
+                spin(DISPATCH_COST)
+                if function(*args):
+                    self.sources.append((function, args))
+            self.iteration_durations.append(time.perf_counter() - start)
+
+
+def append_row(rows, row):
+    spin(APPEND_COST)
+    rows.append(row)
+
+
+def fill_per_row(loop, rows, num_rows):
+    '''Previous implementation: one idle callback per row'''
+    for i in range(num_rows):
+        loop.idle_add(append_row, rows, i)
+
+
+def fill_batched(loop, rows, num_rows, batch_size):
+    appender = BatchAppender(loop.idle_add, batch_size, DEFAULT_TIME_BUDGET)
+    for i in range(num_rows):
+        appender.append(append_row, rows, i)
+
+
+def measure(fill_function, num_rows, *args):
+    '''Return the fill time, worst stall and number of main loop iterations'''
+    loop = SimulatedMainLoop()
+    rows = []
+    start = time.perf_counter()
+    fill_function(loop, rows, num_rows, *args)
+    loop.run_until_idle()
+    fill_time = time.perf_counter() - start
+    assert len(rows) == num_rows
+    return (fill_time, max(loop.iteration_durations), len(loop.iteration_durations))
+
+
+def main():
+    print('{0:>6} {1:>14} {2:>14} {3:>17} {4:>11}'.format('rows', 'strategy', 'fill time (ms)', 'worst stall (ms)',
+                                                        'iterations'))
+    for num_rows in SIZES:
+        cases = [('per row', fill_per_row, ())]
+        cases.extend(('batch {0}'.format(batch_size), fill_batched, (batch_size,)) for batch_size in BATCH_SIZES)
+        for (name, fill_function, args) in cases:
+            (fill_time, worst_stall, iterations) = measure(fill_function, num_rows, *args)
+            print('{0:>6} {1:>14} {2:>14.2f} {3:>17.2f} {4:>11}'.format(num_rows, name, fill_time * 1000,
+                                                                       worst_stall * 1000, iterations))
+
+
+if __name__ == '__main__':
+    main()
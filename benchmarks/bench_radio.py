@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Compare attribute access and memory cost of Radio with the previous
+__getattribute__ based implementation.
+
+Run from the top directory with: python3 -m benchmarks.bench_radio'''
+
+import gc
+import json
+import os
+import re
+import time
+import tracemalloc
+
+from private_lib.radio import Radio, transform_decade_str_in_int
+
+SIZES = (1000, 100000)
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'private_lib', 'tests', 'data', 'radios_by_search')
+
+
+class LegacyRadio(object):
+    '''Radio as it was implemented with a __getattribute__ hook'''
+
+    def __init__(self, data, onlineradioinfo):
+        self.name = data['name']
+        self.picture_url = '{0}{1}'.format(data['pictureBaseURL'],
+                                           data['picture1Name'])
+        if not data['picture1Name']:
+            self.picture_url = 'audio-x-generic'
+        year_regexp = re.compile("(Années*|Years*) (\d*)")
+        genres_list = []
+        decades_list = []
+        for genre_candidate in [x.strip() for x in data['genresAndTopics'].split(',')]:
+            try:
+                decade = year_regexp.split(genre_candidate)[2]
+                decades_list.append(transform_decade_str_in_int(decade))
+            except IndexError:
+                genres_list.append(genre_candidate)
+        self.decades = decades_list
+        self.genres = genres_list
+
+        self.current_track = data['currentTrack']
+        self.country = data['country']
+        self.rating = data['rating']
+        self.id = data['id']
+        self.city = None
+        self.description = None
+        self.stream_urls = None
+        self.web_link = None
+        self._onlineradioinfo = onlineradioinfo
+
+    def __getattribute__(self, name):
+        if object.__getattribute__(self, 'stream_urls') is None and name in ('city', 'description', 'stream_urls', 'web_link'):
+            self.refresh_details_attributes()
+        return object.__getattribute__(self, name)
+
+
+def load_radio_data(size):
+    '''Return size radio json data, repeating the search fixture with new ids'''
+    with open(DATA_PATH, encoding='utf-8') as f:
+        base_data = json.load(f)
+    radios_data = []
+    for i in range(size):
+        data = dict(base_data[i % len(base_data)])
+        data['id'] = i
+        radios_data.append(data)
+    return radios_data
+
+
+def measure_memory(radio_class, radios_data):
+    '''Return the number of bytes allocated to build the radios'''
+    gc.collect()
+    tracemalloc.start()
+    radios = [radio_class(data, None) for data in radios_data]
+    (current, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del radios
+    return current
+
+
+def measure_access(radios, repeat=5):
+    '''Return the best time to read the attributes used to build the model rows'''
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for radio in radios:
+            (str(radio.id), radio.picture_url, radio.name, radio.current_track, radio.genres, radio.decades, radio.country)
+        duration = time.perf_counter() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+def main():
+    print('{0:>8} {1:>12} {2:>18} {3:>16}'.format('radios', 'class', 'access (ns/radio)', 'memory (B/radio)'))
+    for size in SIZES:
+        radios_data = load_radio_data(size)
+        for radio_class in (LegacyRadio, Radio):
+            memory = measure_memory(radio_class, radios_data)
+            radios = [radio_class(data, None) for data in radios_data]
+            access = measure_access(radios)
+            print('{0:>8} {1:>12} {2:>18.1f} {3:>16.1f}'.format(size, radio_class.__name__,
+                                                              access * 1e9 / size, memory / size))
+
+
+if __name__ == '__main__':
+    main()
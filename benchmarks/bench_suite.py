@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''Microbenchmarks of the radio parsing, filtering and model rows generation
+on synthetic catalogs, with machine readable baselines.
+
+Run from the top directory with: python3 -m benchmarks.bench_suite
+Save a baseline with --save benchmarks/baselines/<name>.json and check a change
+against it with --compare benchmarks/baselines/<name>.json: the exit status is 1
+if any case is slower than the baseline by more than the threshold ratio.
+Baselines are only comparable on the same machine and python version. The
+reference one leaves out the RadioHandler cases, which need the gi bindings.'''
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+from timeit import default_timer
+
+from private_lib.filterindex import FilterIndex
+from private_lib.modeldiff import get_row_operations
+from private_lib.radio import Radio, transform_decade_str_in_int
+
+from .catalog import generate_catalog
+
+try:
+    from private_lib.radiohandler import RadioHandler
+except ImportError as e:
+    # gi bindings are needed by the RadioHandler cases only
+    print('Skipping RadioHandler cases: {0}'.format(e), file=sys.stderr)
+    RadioHandler = None
+
+SIZES = (1000, 10000, 100000)
+DEFAULT_THRESHOLD = 1.2
+FILTERS = {'decade': [1980, 1990],
+           'genre': set(['Pop', 'Rock']),
+           'country': set(['France', 'Allemagne'])}
+SEARCH_TERMS = 'benchmark'
+
+
+def get_filter_combinations():
+    '''Return (name, filters) for every non empty combination of FILTERS'''
+    combinations = []
+    for length in range(1, len(FILTERS) + 1):
+        for categories in itertools.combinations(sorted(FILTERS), length):
+            combinations.append(('_'.join(categories), dict((category, FILTERS[category]) for category in categories)))
+    return combinations
+
+
+def measure(function, repeat):
+    '''Return the best duration of repeat calls to function'''
+    best = None
+    for i in range(repeat):
+        start = default_timer()
+        function()
+        duration = default_timer() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+def get_cases(radios_data, radios):
+    '''Return (name, function) benchmark cases on the catalog
+
+    RadioHandler cases are skipped if it can't be imported'''
+    decades = [str(decade) for decade in (30, 60, 75, 90, 0, 5, 12, 1950, 2001)] * (len(radios_data) // 9 + 1)
+    cases = [('radio_init', lambda: [Radio(data, None) for data in radios_data]),
+             ('transform_decade_str_in_int', lambda: [transform_decade_str_in_int(decade) for decade in decades])]
+    # the index is built once per search results, then filters them for every filters change
+    cases.append(('filterindex_build', lambda: FilterIndex(radios)))
+    filter_index = FilterIndex(radios)
+    for (name, filters) in get_filter_combinations():
+        cases.append(('filterindex_{0}'.format(name), lambda filters=filters: filter_index.filter(filters)))
+    # model update when toggling the filters on and off
+    rows = [(str(radio.id), radio.name) for radio in radios]
+    filtered_rows = [(str(radio.id), radio.name) for radio in FilterIndex(radios).filter(FILTERS)]
+    cases.append(('model_diff_filtered', lambda: get_row_operations(rows, filtered_rows)))
+    cases.append(('model_diff_unfiltered', lambda: get_row_operations(filtered_rows, rows)))
+
+    if RadioHandler is None:
+        return cases
+    handler = RadioHandler()
+    for (name, filters) in get_filter_combinations():
+        cases.append(('filter_radios_{0}'.format(name), lambda filters=filters: handler._filter_radios(radios, filters)))
+
+    def model_rows(filters):
+        # previous search results, so that only the model rows are generated
+        handler._last_search = SEARCH_TERMS
+        handler._last_all_radios_dict = {'search': radios}
+        handler._last_filter_indexes = {}
+        return list(handler.get_model_data_from_content_search(SEARCH_TERMS, None, filters=filters))
+    cases.append(('model_rows', lambda: model_rows({})))
+    cases.append(('model_rows_filtered', lambda: model_rows(FILTERS)))
+    return cases
+
+
+def run(sizes, repeat):
+    '''Run the benchmarks on catalogs of each size, returning {size: {case: seconds}}'''
+    results = {}
+    for size in sizes:
+        radios_data = generate_catalog(size)
+        radios = [Radio(data, None) for data in radios_data]
+        results[str(size)] = {}
+        for (name, function) in get_cases(radios_data, radios):
+            results[str(size)][name] = measure(function, repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''Print results against baseline, returning the list of regressed (size, case)
+
+    Cases missing from the baseline, or from the results for a size which was
+    run, are reported but aren't regressions.'''
+    regressions = []
+    missing = []
+    print('{0:>8} {1:<36} {2:>13} {3:>13} {4:>7}'.format('radios', 'case', 'baseline (ms)', 'current (ms)', 'ratio'))
+    for size in sorted(results, key=int):
+        size_results = results[size]
+        size_baseline = baseline.get(size, {})
+        for name in sorted(set(size_results) | set(size_baseline)):
+            reference = size_baseline.get(name)
+            current = size_results.get(name)
+            if reference is None or current is None:
+                missing.append((size, name))
+                print('{0:>8} {1:<36} {2:>13} {3:>13} {4:>7}'.format(
+                    size, name, '-' if reference is None else '{0:.3f}'.format(reference * 1e3),
+                    '-' if current is None else '{0:.3f}'.format(current * 1e3), '-'))
+                continue
+            ratio = current / reference
+            flag = ''
+            if ratio > threshold:
+                regressions.append((size, name))
+                flag = ' !'
+            print('{0:>8} {1:<36} {2:>13.3f} {3:>13.3f} {4:>7.2f}{5}'.format(size, name, reference * 1e3,
+                                                                          current * 1e3, ratio, flag))
+    if missing:
+        print('{0} case(s) not compared, missing from the baseline or not run'.format(len(missing)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Radio parsing, filtering and model rows benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='catalog sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each case, the best one is kept')
+    parser.add_argument('--save', help='save the results as a baseline in this file')
+    parser.add_argument('--compare', help='compare the results to this baseline file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown ratio from the baseline considered as a regression')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print('{0} regression(s) above {1}x'.format(len(regressions), args.threshold))
+            return 1
+        return 0
+    print('{0:>8} {1:<36} {2:>12}'.format('radios', 'case', 'best (ms)'))
+    for size in sorted(results, key=int):
+        for name in sorted(results[size]):
+            print('{0:>8} {1:<36} {2:>12.3f}'.format(size, name, results[size][name] * 1e3))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''Synthetic radio catalogs following the schema of the recorded fixtures'''
+
+import bisect
+import collections
+import itertools
+import json
+import os
+import random
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'private_lib', 'tests', 'data', 'radios_by_search')
+DECADE_PREFIXES = ('Années', 'Years')
+
+
+def _get_weighted_choice(generator, names, cumulative_weights):
+    '''Return one of names drawn by generator, following their cumulative weights'''
+    return names[bisect.bisect(cumulative_weights, generator.random() * cumulative_weights[-1])]
+
+
+def generate_catalog(size, seed=42):
+    '''Return size radio json data, with genres, decades and countries drawn like in the fixture'''
+    with open(DATA_PATH, encoding='utf-8') as f:
+        templates = json.load(f)
+    genres = collections.Counter()
+    decades = collections.Counter()
+    countries = collections.Counter(template['country'] for template in templates)
+    for template in templates:
+        for genre in [genre.strip() for genre in template['genresAndTopics'].split(',')]:
+            if genre.split(' ')[0] in DECADE_PREFIXES:
+                decades[genre.split(' ', 1)[1]] += 1
+            else:
+                genres[genre] += 1
+    (genre_names, genre_weights) = zip(*genres.items())
+    (decade_names, decade_weights) = zip(*decades.items())
+    (country_names, country_weights) = zip(*countries.items())
+    # random.choices() needs python 3.6
+    genre_weights = list(itertools.accumulate(genre_weights))
+    decade_weights = list(itertools.accumulate(decade_weights))
+    country_weights = list(itertools.accumulate(country_weights))
+
+    generator = random.Random(seed)
+    catalog = []
+    for i in range(size):
+        data = dict(templates[i % len(templates)])
+        data['id'] = i
+        data['name'] = '{0} {1}'.format(data['name'], i)
+        radio_genres = set(_get_weighted_choice(generator, genre_names, genre_weights)
+                           for j in range(generator.randint(1, 3)))
+        # about a fifth of the radios have decades, like in the fixture
+        if generator.random() < 0.2:
+            for decade in set(_get_weighted_choice(generator, decade_names, decade_weights)
+                              for j in range(generator.randint(1, 2))):
+                radio_genres.add('{0} {1}'.format(generator.choice(DECADE_PREFIXES), decade))
+        data['genresAndTopics'] = ', '.join(sorted(radio_genres))
+        data['country'] = _get_weighted_choice(generator, country_names, country_weights)
+        catalog.append(data)
+    return catalog
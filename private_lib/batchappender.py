@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import logging
+import threading
+import time
+
+_log = logging.getLogger(__name__)
+
+# default maximum number of calls run per main loop iteration
+DEFAULT_BATCH_SIZE = 50
+# default maximum time in seconds spent per main loop iteration, about a frame
+DEFAULT_TIME_BUDGET = 0.008
+
+
+class BatchAppender(object):
+    '''Queue of calls to run in the main loop, in time-sliced batches
+
+    Calls can be appended from any thread. They are run in order from an idle
+    callback scheduled with schedule_function (like GLib.idle_add), at most
+    batch_size of them and for at most time_budget seconds per main loop
+    iteration. The idle callback then returns to the main loop, letting it
+    process other events before the next batch.
+    A failing call is logged, and doesn't prevent the next ones from running.'''
+
+    def __init__(self, schedule_function, batch_size=DEFAULT_BATCH_SIZE, time_budget=DEFAULT_TIME_BUDGET):
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self._schedule_function = schedule_function
+        self._calls = collections.deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def __len__(self):
+        return len(self._calls)
+
+    def append(self, function, *args):
+        '''Append a call to function(*args), scheduling a batch if needed'''
+        with self._lock:
+            self._calls.append((function, args))
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._schedule_function(self._run_batch)
+
+    def _run_batch(self):
+        '''Run the next batch of calls
+
+        Returns True while there are calls left, to be called again by the main loop'''
+        deadline = time.time() + self.time_budget
+        for i in range(self.batch_size):
+            with self._lock:
+                if not self._calls:
+                    self._scheduled = False
+                    return False
+                (function, args) = self._calls.popleft()
+            try:
+                function(*args)
+            except Exception as error:
+                _log.warning("Batched call to {0} failed: {1}".format(function, error))
+            if time.time() >= deadline:
+                break
+        with self._lock:
+            if not self._calls:
+                self._scheduled = False
+                return False
+        return True
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import time
+
+from .tools import SYNC_BUDGET
+
+_log = logging.getLogger(__name__)
+
+# seconds before a category is synced again
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+
+class CatalogSync(object):
+    '''Incremental synchronization of a stationcatalog.StationCatalog with the radio website
+
+    Each run syncs the categories not synced for max_age seconds, never synced
+    and most used ones first. A category sync only writes the stations which
+    changed, and unchanged responses are revalidated without being downloaded
+    again, so that a sync costs what changed rather than the catalog size.
+    A run stops once budget bytes were received (None for no budget).'''
+
+    def __init__(self, radioinfo, catalog, max_age=DEFAULT_MAX_AGE, budget=SYNC_BUDGET):
+        self.radioinfo = radioinfo
+        self.catalog = catalog
+        self.max_age = max_age
+        self.budget = budget
+
+    def run(self, cancellable=None):
+        '''Sync the due categories, blocking
+
+        cancellable is an optional tools.Cancellable aborting the sync.
+        Return a dict of the synced categories, inserted, updated and deleted
+        stations, received bytes and if the budget was exhausted.'''
+        start_bytes = self.radioinfo.get_received_bytes()
+        for category_type in self.radioinfo.CATALOG_CATEGORY_TYPES:
+            self.catalog.set_categories(category_type, self.radioinfo.get_categories_by_category_type(category_type))
+        self.catalog.flush_category_uses()
+
+        stats = {'categories': 0, 'inserted': 0, 'updated': 0, 'deleted': 0, 'budget_exhausted': False}
+        for (category_type, value) in self.catalog.get_due_categories(time.time() - self.max_age):
+            if self.budget is not None and self.radioinfo.get_received_bytes() - start_bytes >= self.budget:
+                _log.debug('Catalog sync budget exhausted')
+                stats['budget_exhausted'] = True
+                break
+            if cancellable:
+                cancellable.raise_if_cancelled()
+            # received first, not to lock the catalog during the download
+            sync_time = time.time()
+            json_radios = list(self.radioinfo.get_json_stations_by_category(category_type, value, cancellable))
+            (inserted, updated, deleted) = self.catalog.sync_category(category_type, value, json_radios, sync_time)
+            if inserted or updated or deleted:
+                _log.debug('Synced {0} {1}: {2} inserted, {3} updated, {4} deleted'.format(category_type, value,
+                                                                                          inserted, updated, deleted))
+            stats['categories'] += 1
+            stats['inserted'] += inserted
+            stats['updated'] += updated
+            stats['deleted'] += deleted
+        stats['received_bytes'] = self.radioinfo.get_received_bytes() - start_bytes
+        return stats
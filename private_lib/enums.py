@@ -32,7 +32,19 @@ LEVELS = (logging.ERROR,
 
 DBUS_NAME = 'com.canonical.Unity.Lens.Radios'
 DBUS_PATH = '/com/canonical/unity/lens/radios'
+METRICS_DBUS_PATH = DBUS_PATH + '/metrics'
+METRICS_DBUS_INTERFACE = DBUS_NAME + '.Metrics'
 
 LENS_NAME = 'radios'
 
 SEARCH_HINT = _("Search online radios")
+
+# milliseconds without typing before sending a search to the server
+DEFAULT_SEARCH_DELAY = 150
+
+# number of first rows per category whose radio details are loaded in advance
+PREFETCH_ROWS = 6
+
+# search modes: only on the radio website, only in the local station catalog,
+# or in the local catalog first and then on the website if nothing was found
+(SEARCH_NETWORK, SEARCH_LOCAL, SEARCH_FALLBACK) = SEARCH_MODES = ('network', 'local', 'fallback')
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+
+
+class FilterIndex(object):
+    '''Index of a radio list resolving the unity filters with set operations
+
+    Sets of radios are stored as int bitsets, bit i being the i-th radio of the
+    list. That way, filtering keeps the original order of the radios.'''
+
+    def __init__(self, radios):
+        self.radios = list(radios)
+        self._all = (1 << len(self.radios)) - 1
+        self._genres = {}
+        self._countries = {}
+        decades = {}
+        self._without_decade = 0
+        for (position, radio) in enumerate(self.radios):
+            bit = 1 << position
+            for genre in radio.genres:
+                self._genres[genre] = self._genres.get(genre, 0) | bit
+            self._countries[radio.country] = self._countries.get(radio.country, 0) | bit
+            if not radio.decades:
+                self._without_decade |= bit
+            for decade in radio.decades:
+                decades[decade] = decades.get(decade, 0) | bit
+        # sorted decades and their radios, for range queries
+        self._decades = sorted(decades)
+        self._decade_bitsets = [decades[decade] for decade in self._decades]
+
+    def filter(self, filters):
+        '''Return the list of radios matching filters, in the original order
+
+        filters have the format returned by RadioHandler._return_active_filters'''
+        return self.get_radios(self.get_bitset(filters))
+
+    def get_bitset(self, filters):
+        '''Return the bitset of radios matching filters'''
+        bitset = self._all
+        if 'decade' in filters:
+            bitset &= self._get_decade_bitset(filters['decade'][0], filters['decade'][1])
+        if 'genre' in filters:
+            bitset &= self._get_genre_bitset(filters['genre'])
+        if 'country' in filters:
+            bitset &= self._get_country_bitset(filters['country'])
+        return bitset
+
+    def get_radios(self, bitset):
+        '''Return the radios of bitset, in the original order'''
+        bits = bin(bitset)[:1:-1]
+        radios = []
+        position = bits.find('1')
+        while position != -1:
+            radios.append(self.radios[position])
+            position = bits.find('1', position + 1)
+        return radios
+
+    def _get_decade_bitset(self, first_decade, last_decade):
+        '''Radios without any decade, or with one of them between first and last decade'''
+        bitset = self._without_decade
+        start = bisect.bisect_left(self._decades, first_decade)
+        end = bisect.bisect_right(self._decades, last_decade)
+        for decade_bitset in self._decade_bitsets[start:end]:
+            bitset |= decade_bitset
+        return bitset
+
+    def _get_genre_bitset(self, genres):
+        '''Radios having all their genres in genres'''
+        excluded = 0
+        for genre in self._genres:
+            if genre not in genres:
+                excluded |= self._genres[genre]
+        return self._all & ~excluded
+
+    def _get_country_bitset(self, countries):
+        '''Radios from one of the countries'''
+        bitset = 0
+        for country in countries:
+            bitset |= self._countries.get(country, 0)
+        return bitset
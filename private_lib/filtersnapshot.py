@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+
+from .tools import save_json
+
+_log = logging.getLogger(__name__)
+
+# bump when the snapshot format changes, older snapshots are then ignored
+SNAPSHOT_VERSION = 1
+
+
+class FilterSnapshot(object):
+    '''Versioned on-disk snapshot of the filter vocabularies
+
+    Vocabularies are a {filter name: option list} dict, like the genres and
+    countries of the radio website at source_url.'''
+
+    def __init__(self, path, source_url):
+        self.path = path
+        self.source_url = source_url
+
+    def load(self):
+        '''Return the saved vocabularies, or None if there is no valid snapshot for source_url'''
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, OSError):
+            return None
+        except ValueError as error:
+            _log.debug('Ignoring corrupted filter snapshot: {0}'.format(error))
+            return None
+        try:
+            if data['version'] != SNAPSHOT_VERSION or data['source_url'] != self.source_url:
+                _log.debug('Ignoring filter snapshot from another version or website')
+                return None
+            return dict((name, list(options)) for (name, options) in data['vocabularies'].items())
+        except (KeyError, TypeError, AttributeError) as error:
+            _log.debug('Ignoring invalid filter snapshot: {0}'.format(error))
+            return None
+
+    def save(self, vocabularies):
+        '''Atomically save vocabularies. Failing to save them is never fatal'''
+        data = {'version': SNAPSHOT_VERSION, 'source_url': self.source_url, 'vocabularies': vocabularies}
+        try:
+            save_json(self.path, data)
+        except (IOError, OSError) as error:
+            _log.warning("Couldn't save the filter snapshot: {0}".format(error))
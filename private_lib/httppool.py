@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import http.client
+import logging
+import socket
+import threading
+import time
+import urllib.parse
+import zlib
+
+from .tools import CancelledError
+
+_log = logging.getLogger(__name__)
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+CHUNK_SIZE = 16 * 1024
+
+
+class TransportError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return repr(self.message)
+
+
+class PooledResponse(object):
+    '''A response from a pooled connection
+
+    The body is decompressed while it's read. The connection goes back to the
+    pool once the body has been fully read, and is dropped if the response is
+    closed before. Cancelling the request aborts the transfer in progress.'''
+
+    def __init__(self, pool, pool_key, connection, response, cancellable=None, cancel_handler_id=0):
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.msg
+        self.bytes_received = 0
+        self._pool = pool
+        self._pool_key = pool_key
+        self._connection = connection
+        self._response = response
+        self._cancellable = cancellable
+        self._cancel_handler_id = cancel_handler_id
+        self._decompressor = None
+        content_encoding = (self.headers.get('Content-Encoding') or '').strip().lower()
+        if content_encoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif content_encoding == 'deflate':
+            self._decompressor = zlib.decompressobj()
+
+    def read(self, amt=None):
+        '''Read and return up to amt decompressed bytes, everything if amt is None.
+
+        Returns b'' once the body is exhausted'''
+        if amt is None:
+            return b''.join(iter(lambda: self.read(CHUNK_SIZE), b''))
+        while self._response is not None:
+            try:
+                raw_data = self._response.read(amt)
+            except (socket.error, http.client.HTTPException) as error:
+                self.close()
+                self._raise_if_cancelled()
+                raise TransportError(error)
+            if self._cancellable and self._cancellable.is_cancelled():
+                self.close()
+                raise CancelledError()
+            self.bytes_received += len(raw_data)
+            if not raw_data:
+                data = b''
+                if self._decompressor:
+                    data = self._decompressor.flush()
+                self._release()
+                return data
+            if not self._decompressor:
+                return raw_data
+            try:
+                data = self._decompressor.decompress(raw_data)
+            except zlib.error as error:
+                self.close()
+                raise TransportError(error)
+            # some compressed chunks don't produce any output by themselves
+            if data:
+                return data
+        return b''
+
+    def close(self):
+        '''Close the response, dropping the connection if the body wasn't fully read'''
+        if self._response is None:
+            return
+        self._disconnect_cancellable()
+        self._response.close()
+        self._response = None
+        self._pool._release(self._pool_key, self._connection, reusable=False)
+
+    def _release(self):
+        '''Hand back the connection to the pool when the server allows it'''
+        if self._response is None:
+            return
+        self._disconnect_cancellable()
+        will_close = self._response.will_close
+        self._response.close()
+        self._response = None
+        self._pool._release(self._pool_key, self._connection, reusable=not will_close)
+
+    def _disconnect_cancellable(self):
+        if self._cancellable and self._cancel_handler_id:
+            self._cancellable.disconnect(self._cancel_handler_id)
+        self._cancel_handler_id = 0
+
+    def _raise_if_cancelled(self):
+        if self._cancellable:
+            self._cancellable.raise_if_cancelled()
+
+
+class ConnectionPool(object):
+    '''HTTP/1.1 keep-alive connections, pooled per host
+
+    pool_size is the maximum number of idle connections kept per host and
+    idle_timeout the number of seconds an idle connection can be reused.
+    Responses are requested compressed and transparently decompressed.'''
+
+    def __init__(self, pool_size=4, idle_timeout=30, timeout=30):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle_connections = {}
+        # connections handed to a request, until they go back to the pool or are closed
+        self._checked_out_connections = set()
+        self._lock = threading.Lock()
+
+    def open(self, url, headers=None, cancellable=None):
+        '''Send a GET request to url and return a PooledResponse, following redirections
+
+        The body isn't read yet. The caller has to read it fully or to close it.
+        Cancelling cancellable shuts down the connection, making any pending
+        network operation raise a CancelledError.'''
+        for i in range(MAX_REDIRECTS + 1):
+            response = self._open_once(url, headers or {}, cancellable)
+            location = response.headers.get('Location')
+            if response.status not in REDIRECT_CODES or not location:
+                return response
+            response.read()
+            url = urllib.parse.urljoin(url, location)
+            _log.debug('Redirected to {0}'.format(url))
+        raise TransportError('Too many redirections for {0}'.format(url))
+
+    def request(self, url, headers=None, cancellable=None):
+        '''Send a GET request to url and return a (status, headers, body) tuple'''
+        response = self.open(url, headers, cancellable)
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        return (response.status, response.headers, body)
+
+    def close_all(self):
+        '''Close every idle connection'''
+        with self._lock:
+            idle_connections = self._idle_connections
+            self._idle_connections = {}
+        for connections in idle_connections.values():
+            for (connection, last_used) in connections:
+                connection.close()
+
+    def _open_once(self, url, headers, cancellable):
+        '''Send the request on a pooled connection and return a PooledResponse'''
+        url_parts = urllib.parse.urlsplit(url)
+        scheme = url_parts.scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise TransportError('Unsupported url: {0}'.format(url))
+        port = url_parts.port or (443 if scheme == 'https' else 80)
+        pool_key = (scheme, url_parts.hostname, port)
+        selector = url_parts.path or '/'
+        if url_parts.query:
+            selector += '?' + url_parts.query
+        request_headers = {'Accept-Encoding': 'gzip, deflate',
+                           'Connection': 'keep-alive',
+                           'User-Agent': 'unity-lens-radios'}
+        request_headers.update(headers)
+
+        (connection, reused) = self._get_connection(pool_key)
+        try:
+            return self._send_request(pool_key, connection, selector, request_headers, cancellable)
+        except TransportError:
+            if not reused:
+                raise
+        # the server closed the idle connection meanwhile, retry once on a fresh one
+        _log.debug('Reused connection to {0} was closed, reconnecting'.format(url_parts.hostname))
+        connection = self._new_connection(pool_key)
+        return self._send_request(pool_key, connection, selector, request_headers, cancellable)
+
+    def _send_request(self, pool_key, connection, selector, headers, cancellable):
+        '''Send the request on connection and return the PooledResponse once the headers are read'''
+        cancel_handler_id = 0
+        if cancellable:
+            cancellable.raise_if_cancelled()
+            cancel_handler_id = cancellable.connect(lambda: self._abort(connection))
+        try:
+            if connection.sock is None:
+                connection.connect()
+                if cancellable and cancellable.is_cancelled():
+                    self._abort(connection)
+            connection.request('GET', selector, headers=headers)
+            response = connection.getresponse()
+        except (socket.error, http.client.HTTPException) as error:
+            if cancel_handler_id:
+                cancellable.disconnect(cancel_handler_id)
+            self._release(pool_key, connection, reusable=False)
+            if cancellable:
+                cancellable.raise_if_cancelled()
+            raise TransportError(error)
+        return PooledResponse(self, pool_key, connection, response, cancellable, cancel_handler_id)
+
+    def _abort(self, connection):
+        '''Shut down the connection socket, unblocking any thread waiting on it
+
+        Called on cancellation, possibly from another thread: nothing is done
+        if the connection already went back to the pool meanwhile.'''
+        with self._lock:
+            sock = connection.sock
+            if connection not in self._checked_out_connections or sock is None:
+                return
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def _get_connection(self, pool_key):
+        '''Return a (connection, reused) tuple, picking a valid idle connection if any'''
+        now = time.time()
+        with self._lock:
+            connections = self._idle_connections.get(pool_key, [])
+            while connections:
+                (connection, last_used) = connections.pop()
+                if now - last_used < self.idle_timeout:
+                    self._checked_out_connections.add(connection)
+                    return (connection, True)
+                connection.close()
+        return (self._new_connection(pool_key), False)
+
+    def _new_connection(self, pool_key):
+        (scheme, host, port) = pool_key
+        _log.debug('Opening a new connection to {0}:{1}'.format(host, port))
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        with self._lock:
+            self._checked_out_connections.add(connection)
+        return connection
+
+    def _release(self, pool_key, connection, reusable=True):
+        '''Put back a checked out connection in the pool if it's reusable and there is still room for it
+
+        The connection is closed otherwise.'''
+        with self._lock:
+            self._checked_out_connections.discard(connection)
+            connections = self._idle_connections.setdefault(pool_key, [])
+            if reusable and len(connections) < self.pool_size:
+                connections.append((connection, time.time()))
+                return
+        connection.close()
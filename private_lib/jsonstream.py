@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import codecs
+import json
+import re
+
+_WHITESPACES = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+# parsing states
+(_START, _FIRST_ITEM, _ITEM, _SEPARATOR, _END) = range(5)
+
+
+def iter_json_array(chunks, encoding='utf-8'):
+    '''Yield the items of a top-level json array while its raw chunks arrive
+
+    chunks is an iterable of bytes. Items are yielded as soon as they are
+    complete, without waiting for the end of the array.
+    Raise a ValueError if the content isn't a valid json array.'''
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    parser = _ArrayParser()
+    for chunk in chunks:
+        for item in parser.feed(text_decoder.decode(chunk)):
+            yield item
+    for item in parser.feed(text_decoder.decode(b'', final=True), final=True):
+        yield item
+
+
+class _ArrayParser(object):
+    '''Incremental parser of the items of a json array'''
+
+    def __init__(self):
+        self._buf = ''
+        self._state = _START
+
+    def feed(self, text, final=False):
+        '''Add text to parse and return the list of items completed by it'''
+        buf = self._buf + text
+        pos = 0
+        items = []
+        while True:
+            pos = _WHITESPACES.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            char = buf[pos]
+            if self._state == _START:
+                if char != '[':
+                    raise ValueError('Expecting a json array')
+                self._state = _FIRST_ITEM
+                pos += 1
+            elif self._state == _END:
+                raise ValueError('Extra data after the json array')
+            elif self._state == _SEPARATOR:
+                if char == ',':
+                    self._state = _ITEM
+                elif char == ']':
+                    self._state = _END
+                else:
+                    raise ValueError("Expecting ',' delimiter at {0}".format(buf[pos:pos + 20]))
+                pos += 1
+            elif char == ']' and self._state == _FIRST_ITEM:
+                self._state = _END
+                pos += 1
+            else:
+                try:
+                    (item, end) = _decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # most likely an incomplete item, wait for the next chunk
+                    if final:
+                        raise
+                    break
+                # a number could still continue in the next chunk
+                if end == len(buf) and not final:
+                    break
+                items.append(item)
+                self._state = _SEPARATOR
+                pos = end
+        self._buf = buf[pos:]
+        if final and self._state != _END:
+            raise ValueError('Unterminated json array')
+        return items
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from .tools import singleton
+
+_log = logging.getLogger(__name__)
+
+# latencies kept per path for the percentiles
+MAX_SAMPLES = 1000
+PERCENTILES = (50, 95, 99)
+
+
+def get_percentile(sorted_samples, percentile):
+    '''Return the nearest rank percentile of sorted_samples, None if empty'''
+    if not sorted_samples:
+        return None
+    rank = max(int(round(percentile / 100.0 * len(sorted_samples))), 1)
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+class _PathMetrics(object):
+    '''Request metrics of an API path'''
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.received_bytes = 0
+        self.parses = 0
+        self.parse_time = 0.0
+        self.total_latency = 0.0
+        # most recent latencies, in seconds
+        self.latencies = collections.deque(maxlen=MAX_SAMPLES)
+
+    def get_snapshot(self):
+        '''Return the metrics as a dict, with times in milliseconds'''
+        snapshot = {'requests': self.requests,
+                    'errors': self.errors,
+                    'bytes': self.bytes,
+                    'received_bytes': self.received_bytes,
+                    'parses': self.parses,
+                    'parse_time_ms': self.parse_time * 1000}
+        if self.requests:
+            snapshot['mean_latency_ms'] = self.total_latency * 1000 / self.requests
+        latencies = sorted(self.latencies)
+        for percentile in PERCENTILES:
+            value = get_percentile(latencies, percentile)
+            snapshot['p{0}_latency_ms'.format(percentile)] = None if value is None else value * 1000
+        return snapshot
+
+
+@singleton
+class Metrics(object):
+    '''In process registry of the requests and caches metrics
+
+    Requests are recorded by API path and caches by name, each cache counting
+    its outcomes (like hit or miss). Recording is thread-safe.'''
+
+    def __init__(self):
+        self.start_time = time.time()
+        self._paths = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def record_request(self, path, duration, size, received_bytes=None):
+        '''Record a successful request of path, received in duration seconds with size bytes
+
+        received_bytes are the ones transferred (compressed), size if None'''
+        with self._lock:
+            path_metrics = self._get_path_metrics(path)
+            path_metrics.requests += 1
+            path_metrics.bytes += size
+            path_metrics.received_bytes += size if received_bytes is None else received_bytes
+            path_metrics.total_latency += duration
+            path_metrics.latencies.append(duration)
+
+    def record_error(self, path):
+        '''Record a failed request of path'''
+        with self._lock:
+            self._get_path_metrics(path).errors += 1
+
+    def record_parse(self, path, duration):
+        '''Record the json decoding of a path response, taking duration seconds'''
+        with self._lock:
+            path_metrics = self._get_path_metrics(path)
+            path_metrics.parses += 1
+            path_metrics.parse_time += duration
+
+    def record_cache(self, name, outcome):
+        '''Count an outcome (like "hit" or "miss") of the name cache'''
+        with self._lock:
+            outcomes = self._caches.setdefault(name, {})
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def get_snapshot(self):
+        '''Return all the metrics as a json serializable dict'''
+        with self._lock:
+            return {'uptime': time.time() - self.start_time,
+                    'paths': dict((path, path_metrics.get_snapshot()) for (path, path_metrics) in self._paths.items()),
+                    'caches': dict((name, dict(outcomes)) for (name, outcomes) in self._caches.items())}
+
+    def dump(self, path):
+        '''Write the metrics snapshot to path, as json'''
+        _log.debug("Dumping metrics to {0}".format(path))
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.get_snapshot(), f, indent=2, sort_keys=True)
+
+    def reset(self):
+        with self._lock:
+            self.start_time = time.time()
+            self._paths = {}
+            self._caches = {}
+
+    def _get_path_metrics(self, path):
+        path_metrics = self._paths.get(path)
+        if path_metrics is None:
+            path_metrics = _PathMetrics()
+            self._paths[path] = path_metrics
+        return path_metrics
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import difflib
+
+
+def get_row_operations(old_keys, new_keys):
+    '''Return the operations transforming the old_keys rows into the new_keys ones
+
+    Operations are (position, number of rows to remove, first new index, last new index)
+    tuples: at position, remove the rows and then insert new_keys[first:last].
+    They are ordered from the end, so that each position is still valid after
+    applying the previous operations. Rows in common are never touched.'''
+    operations = _get_subsequence_operations(old_keys, new_keys)
+    if operations is not None:
+        return operations
+    matcher = difflib.SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    operations = []
+    for (tag, old_start, old_end, new_start, new_end) in matcher.get_opcodes():
+        if tag != 'equal':
+            operations.append((old_start, old_end - old_start, new_start, new_end))
+    operations.reverse()
+    return operations
+
+
+def _get_subsequence_operations(old_keys, new_keys):
+    '''Return the operations if new_keys only removes or only inserts rows, None otherwise
+
+    This is the common case of a filter being added or removed, found in linear time.'''
+    operations = []
+    run_start = None
+    if len(new_keys) <= len(old_keys):
+        j = 0
+        for (i, key) in enumerate(old_keys):
+            if j < len(new_keys) and key == new_keys[j]:
+                if run_start is not None:
+                    operations.append((run_start, i - run_start, j, j))
+                    run_start = None
+                j += 1
+            elif run_start is None:
+                run_start = i
+        if j < len(new_keys):
+            return None
+        if run_start is not None:
+            operations.append((run_start, len(old_keys) - run_start, j, j))
+    else:
+        i = 0
+        for (j, key) in enumerate(new_keys):
+            if i < len(old_keys) and key == old_keys[i]:
+                if run_start is not None:
+                    operations.append((i, 0, run_start, j))
+                    run_start = None
+                i += 1
+            elif run_start is None:
+                run_start = j
+        if i < len(old_keys):
+            return None
+        if run_start is not None:
+            operations.append((i, 0, run_start, len(new_keys)))
+    operations.reverse()
+    return operations
+
+
+def apply_row_operations(rows, new_rows, operations):
+    '''Apply operations to the rows list, taking inserted rows from new_rows'''
+    for (position, remove_count, new_start, new_end) in operations:
+        rows[position:position + remove_count] = new_rows[new_start:new_end]
+    return rows
@@ -21,12 +21,22 @@
 import json
 import locale
 import logging
-import urllib
+import os
+import queue
+import threading
+import time
 import urllib.parse
-import urllib.request
 
-from .tools import singleton
+from . import tracing
+from .enums import SEARCH_LOCAL, SEARCH_NETWORK
+from .httppool import CHUNK_SIZE, ConnectionPool, TransportError
+from .jsonstream import iter_json_array
+from .metrics import Metrics
+from .paging import PageSizer
+from .playlist import PlaylistResolver
+from .tools import Cancellable, CancelledError, get_cache_path, singleton
 from .radio import Radio
+from .responsecache import ResponseCache
 
 _log = logging.getLogger(__name__)
 
@@ -39,21 +49,86 @@ class ConnectionError(Exception):
         return repr(self.message)
 
 
+class _InFlightRequest(object):
+    '''A request being sent, whose result is shared with the identical requests made meanwhile'''
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._done = False
+        self._result = None
+        self._error = None
+
+    def finish(self, result=None, error=None):
+        '''Wake up the waiting requests with the result or error
+
+        Without any of them, the request was abandoned and waiting requests
+        have to send it themselves.'''
+        with self._condition:
+            self._done = True
+            self._result = result
+            self._error = error
+            self._condition.notify_all()
+
+    def wait(self, cancellable=None):
+        '''Wait for the request to finish and return its result, None if it was abandoned
+
+        Raise the request error if it failed, or CancelledError if cancellable is cancelled first.'''
+        handler_id = 0
+        if cancellable:
+            handler_id = cancellable.connect(self._wake_up)
+        try:
+            with self._condition:
+                while not self._done and not (cancellable and cancellable.is_cancelled()):
+                    self._condition.wait()
+        finally:
+            if cancellable:
+                cancellable.disconnect(handler_id)
+        if cancellable:
+            cancellable.raise_if_cancelled()
+        if self._error:
+            raise self._error
+        return self._result
+
+    def _wake_up(self):
+        with self._condition:
+            self._condition.notify_all()
+
+
 @singleton
 class OnlineRadioInfo(object):
     '''Class to get radio informations from the web.
 
     If a language is provided (either at, de, en, fr) it will override the
     autodetection.
-    en is the default'''
+    en is the default
+
+    base_url, or the BASE_URL_ENV environment variable, overrides the radio
+    website url, like for a local replay server.
+    search_mode is one of enums.SEARCH_MODES, telling if searches are answered
+    by the website or by the local station catalog, filled by crawl_catalog.'''
 
     MAIN_URLS = {'at': 'http://www.radio.at/',
                  'de': 'http://radio.de/info',
                  'en': 'http://rad.io/info',
                  'fr': 'http://radio.fr/info'}
+    BASE_URL_ENV = 'UNITY_LENS_RADIOS_URL'
     VALID_CATEGORY_TYPES = ('genre', 'topic', 'country', 'city', 'language')
-
-    def __init__(self, language=None):
+    # every station has a country, genres add the ones without any
+    CATALOG_CATEGORY_TYPES = ('country', 'genre')
+    # time in seconds a cached response is used without revalidating it.
+    # Responses for paths not listed here are never cached.
+    CACHE_TTLS = {'menu/valuesofcategory': 3 * 24 * 60 * 60,
+                  'menu/broadcastsofcategory': 60 * 60,
+                  'broadcast/editorialreccomendationsembedded': 60 * 60,
+                  'index/searchembeddedbroadcast': 30 * 60,
+                  'broadcast/getbroadcastembedded': 60,
+                  'account/getmostwantedbroadcastlists': 5 * 60}
+    # maximum number of idle keep-alive connections kept per host, and how long
+    # in seconds they can stay idle before being dropped
+    POOL_SIZE = 4
+    POOL_IDLE_TIMEOUT = 30
+
+    def __init__(self, language=None, base_url=None):
         if not language:
             try:
                 language = locale.setlocale(locale.LC_MESSAGES, '').split('_')[0]
@@ -62,6 +137,30 @@ class OnlineRadioInfo(object):
                 language = 'en'
         self.radio_base_url = self.MAIN_URLS.get(language, self.MAIN_URLS['en'])
         _log.debug('Selected radio for {0} language: {1}'.format(language, self.radio_base_url))
+        base_url = base_url or os.environ.get(self.BASE_URL_ENV)
+        if base_url:
+            self.radio_base_url = base_url.rstrip('/')
+            _log.debug('Radio website overridden by: {0}'.format(self.radio_base_url))
+        self._cache = ResponseCache(os.path.join(get_cache_path(), 'responses'))
+        self._pool = ConnectionPool(self.POOL_SIZE, self.POOL_IDLE_TIMEOUT)
+        # late bound, so that _url_request can be replaced
+        self._playlist_resolver = PlaylistResolver(lambda url: self._url_request(url))
+        # requests being sent, by request key, shared with identical concurrent ones
+        self._inflight_requests = {}
+        self._inflight_lock = threading.Lock()
+        # bytes received, by thread
+        self._transfers = threading.local()
+        # completeness of the last search, by thread
+        self._searches = threading.local()
+        # page sizers by website, they have their own latency and throughput
+        self._page_sizers = {}
+        self._page_sizers_lock = threading.Lock()
+        self.search_mode = SEARCH_NETWORK
+        # websites searched concurrently, see set_federated_languages
+        self.federated_base_urls = ()
+        # local station catalog, opened on first use
+        self._catalog = None
+        self._catalog_lock = threading.Lock()
 
     def __str__(self):
         return('{0}, using radio: {1}'.format(repr(self), self.radio_base_url))
@@ -69,37 +168,229 @@ class OnlineRadioInfo(object):
     def get_recommended_stations(self):
         '''returns a generator list of 12 editors recommended stations'''
         _log.debug('getting recommended stations')
-        for json_radio in self._get_json_result_for_parameters('broadcast/editorialreccomendationsembedded'):
-            yield Radio(json_radio, self)
+        for json_radio in self._iter_json_array_for_parameters('broadcast/editorialreccomendationsembedded'):
+            yield self._make_radio(json_radio)
 
     def get_top_stations(self):
         '''returns a generator list of the 100 most listen stations'''
         _log.debug('getting top stations')
         return self.get_stations_by_category('top')
 
-    def get_most_wanted_stations(self, num_entries=25):
+    def get_most_wanted_stations(self, num_entries=25, cancellable=None):
         '''Return a dict of most wanted Radios by types of recommendation, limited to num_entries per type
 
         Format is: {"recommended": (Radio generator), <- equivalent to get_recommended_stations()
                     "top":         (Radio generator), <- equivalent to get_top_stations()
                     "local"        (Radio generator)} <- most listened radio locally
+
+        cancellable is an optional tools.Cancellable aborting the request
         '''
         _log.debug('getting {0} most wanted stations'.format(num_entries))
-        json_result = self._get_json_result_for_parameters('account/getmostwantedbroadcastlists', sizeoflists=num_entries)
+        json_result = self._get_json_result_for_parameters('account/getmostwantedbroadcastlists', cancellable,
+                                                           sizeoflists=num_entries)
         result = {}
         for source_type, dest_type in (('recommendedBroadcasts', 'recommended'), ('topBroadcasts', 'top'), ('localBroadcasts', 'local')):
-            result[dest_type] = (Radio(json_radio, self) for json_radio in json_result[source_type])
+            result[dest_type] = (self._make_radio(json_radio) for json_radio in json_result[source_type])
         return result
 
-    def get_stations_by_searchstring(self, search_string, max_num_entries=1000):
+    def get_stations_by_searchstring(self, search_string, max_num_entries=1000, cancellable=None):
         '''returns a generator list of Radio matching a search string,
 
-        max_num_entries is the maximum number of results'''
+        max_num_entries is the maximum number of results
+        cancellable is an optional tools.Cancellable aborting the request
+
+        Results are requested page after page, see _iter_search_pages, from
+        every federated website if any (see _iter_federated_search).
+        Depending on search_mode, stations come from the local catalog instead.
+        See is_last_search_complete once every station is received.'''
+        self._searches.complete = True
         _log.debug('getting stations for {1} research, limited to {0} results'.format(search_string, max_num_entries))
-        for json_radio in self._get_json_result_for_parameters('index/searchembeddedbroadcast', q=search_string,
-                                                                                                start=0,
-                                                                                                rows=max_num_entries):
-            yield Radio(json_radio, self)
+        if self.search_mode != SEARCH_NETWORK:
+            with tracing.span('catalog search'):
+                json_radios = self.get_catalog().search(search_string, max_num_entries)
+            Metrics().record_cache('catalog', 'hit' if json_radios else 'miss')
+            if json_radios or self.search_mode == SEARCH_LOCAL:
+                for json_radio in json_radios:
+                    yield self._make_radio(json_radio)
+                return
+        if self.federated_base_urls:
+            json_radios = self._iter_federated_search(search_string, max_num_entries, cancellable)
+        else:
+            json_radios = self._iter_search_pages(search_string, max_num_entries, cancellable)
+        for json_radio in json_radios:
+            yield self._make_radio(json_radio)
+
+    def is_last_search_complete(self):
+        '''Return False if the last search of the current thread missed results of a federated website
+
+        Those results depend on the websites timings, and aren't worth caching.'''
+        return getattr(self._searches, 'complete', True)
+
+    def set_federated_languages(self, languages):
+        '''Search the MAIN_URLS websites of languages as well, concurrently with the selected one
+
+        An empty languages list only searches the selected website.'''
+        base_urls = [self.radio_base_url]
+        for language in languages:
+            if language not in self.MAIN_URLS:
+                _log.warning('No radio website for {0}, not searching it'.format(language))
+                continue
+            base_url = self.MAIN_URLS[language].rstrip('/')
+            if base_url not in base_urls:
+                base_urls.append(base_url)
+        self.federated_base_urls = tuple(base_urls) if len(base_urls) > 1 else ()
+        _log.debug('Federated radio websites: {0}'.format(self.federated_base_urls))
+
+    def _iter_federated_search(self, search_string, max_num_entries, cancellable=None):
+        '''Yield the json radios found by every federated website for search_string, without duplicates
+
+        Websites are searched concurrently, racing each other: radios are
+        yielded as they arrive, the first website finding a station giving it,
+        and are never reordered. The searches still running are only cancelled
+        once max_num_entries radios are found.
+        An error is only raised if every website failed. If some websites
+        failed or were cancelled, the search isn't complete.'''
+        results = queue.Queue()
+        website_cancellables = []
+        search_id = tracing.Tracer().get_search_id()
+        for base_url in self.federated_base_urls:
+            website_cancellable = Cancellable()
+            website_cancellables.append(website_cancellable)
+            thread = threading.Thread(target=self._search_website, args=(base_url, search_string, max_num_entries,
+                                                                         website_cancellable, results, search_id))
+            thread.daemon = True
+            thread.start()
+        # wake up on cancellation
+        handler_id = cancellable.connect(lambda: results.put(None)) if cancellable else 0
+        seen_ids = set()
+        errors = []
+        finished = 0
+        try:
+            while finished < len(self.federated_base_urls) and len(seen_ids) < max_num_entries:
+                item = results.get()
+                if cancellable:
+                    cancellable.raise_if_cancelled()
+                (base_url, json_radio, error) = item
+                if json_radio is not None:
+                    if json_radio['id'] not in seen_ids:
+                        seen_ids.add(json_radio['id'])
+                        yield json_radio
+                    continue
+                finished += 1
+                if error:
+                    _log.warning("Can't search {0} on {1}: {2}".format(search_string, base_url, error))
+                    errors.append(error)
+            if len(errors) == len(self.federated_base_urls):
+                raise errors[0]
+            if errors or finished < len(self.federated_base_urls):
+                _log.debug('Federated search for {0} is incomplete'.format(search_string))
+                self._searches.complete = False
+        finally:
+            for website_cancellable in website_cancellables:
+                website_cancellable.cancel()
+            if cancellable:
+                cancellable.disconnect(handler_id)
+
+    def _search_website(self, base_url, search_string, max_num_entries, cancellable, results, search_id=None):
+        '''Put the (base_url, json radio, None) tuples found by the base_url website in the results queue
+
+        Then a (base_url, None, error) tuple once done, with the error if it failed.
+        search_id tags the trace spans of the search.'''
+        tracing.Tracer().set_search_id(search_id)
+        try:
+            for json_radio in self._iter_search_pages(search_string, max_num_entries, cancellable, base_url):
+                results.put((base_url, json_radio, None))
+        except Exception as error:
+            # raised again in the searching thread
+            results.put((base_url, None, error))
+        else:
+            results.put((base_url, None, None))
+
+    def _iter_search_pages(self, search_string, max_num_entries, cancellable=None, base_url=None):
+        '''Yield the json radios found by the website for search_string, page after page
+
+        The first page is small and streamed, for the first results to be shown
+        quickly. Once a page is complete, the next one is fetched in background
+        while it's yielded, with a size adapted to the network by the page sizer.
+        This stops once max_num_entries are received, at the first incomplete
+        page, or when the search is cancelled or abandoned.
+        base_url is the website to search, the selected one by default.'''
+        path = 'index/searchembeddedbroadcast'
+        page_sizer = self._get_page_sizer(base_url or self.radio_base_url)
+        # also cancels the page fetched in background if the search is abandoned
+        pages_cancellable = Cancellable()
+        handler_id = cancellable.connect(pages_cancellable.cancel) if cancellable else 0
+        try:
+            rows = min(page_sizer.get_first_page_size(), max_num_entries)
+            timings = []
+            received = 0
+            for json_radio in self._iter_json_array_for_parameters(path, pages_cancellable, timings, base_url,
+                                                                   q=search_string, start=0, rows=rows):
+                received += 1
+                # the whole response is still read, to be cached
+                if received <= max_num_entries:
+                    yield json_radio
+            page_request = None
+            if received == rows:
+                self._record_page_timings(page_sizer, received, timings)
+                page_request = self._fetch_page_in_background(path, pages_cancellable, search_string, received,
+                                                              page_sizer.get_next_page_size(rows),
+                                                              max_num_entries, base_url)
+            while page_request:
+                (rows, json_radios, timings) = page_request.wait(pages_cancellable)
+                self._record_page_timings(page_sizer, len(json_radios), timings)
+                json_radios = json_radios[:max_num_entries - received]
+                start = received
+                received += len(json_radios)
+                page_request = None
+                if len(json_radios) == rows and received < max_num_entries:
+                    page_request = self._fetch_page_in_background(path, pages_cancellable, search_string, received,
+                                                                  page_sizer.get_next_page_size(rows),
+                                                                  max_num_entries, base_url)
+                _log.debug('Got {0} results of {1} from {2}'.format(len(json_radios), search_string, start))
+                for json_radio in json_radios:
+                    yield json_radio
+        finally:
+            pages_cancellable.cancel()
+            if cancellable:
+                cancellable.disconnect(handler_id)
+
+    def _fetch_page_in_background(self, path, cancellable, search_string, start, rows, max_num_entries,
+                                  base_url=None):
+        '''Start fetching the page of rows search results at start, up to max_num_entries, in a thread
+
+        Return an _InFlightRequest, whose result is a (rows, json radios, timings) tuple.'''
+        rows = min(rows, max_num_entries - start)
+        page_request = _InFlightRequest()
+        search_id = tracing.Tracer().get_search_id()
+
+        def fetch_page():
+            tracing.Tracer().set_search_id(search_id)
+            timings = []
+            try:
+                json_radios = list(self._iter_json_array_for_parameters(path, cancellable, timings, base_url,
+                                                                        q=search_string, start=start, rows=rows))
+            except Exception as error:
+                # raised again in the searching thread
+                page_request.finish(error=error)
+            else:
+                page_request.finish((rows, json_radios, timings))
+
+        thread = threading.Thread(target=fetch_page)
+        thread.daemon = True
+        thread.start()
+        return page_request
+
+    def _get_page_sizer(self, base_url):
+        with self._page_sizers_lock:
+            if base_url not in self._page_sizers:
+                self._page_sizers[base_url] = PageSizer()
+            return self._page_sizers[base_url]
+
+    def _record_page_timings(self, page_sizer, stations, timings):
+        '''Give page_sizer the timings of a page of stations received from the network'''
+        for (latency, transfer_time) in timings:
+            page_sizer.record_page(stations, latency, transfer_time)
 
     def get_details_by_station_id(self, station_id):
         '''Return some updated details info for the current station id
@@ -118,6 +409,29 @@ class OnlineRadioInfo(object):
 
         return radio_details
 
+    def get_catalog(self):
+        '''Return the local station catalog, opening it if needed'''
+        with self._catalog_lock:
+            if self._catalog is None:
+                # not needed at startup
+                from .stationcatalog import StationCatalog
+                self._catalog = StationCatalog(os.path.join(get_cache_path(), 'catalog.sqlite'), self.radio_base_url)
+            return self._catalog
+
+    def crawl_catalog(self, cancellable=None):
+        '''Fill the local station catalog with the stations of every CATALOG_CATEGORY_TYPES value
+
+        This is blocking and sends one request per value, without any bandwidth
+        budget. Afterwards, catalogsync.CatalogSync keeps the catalog up to date.
+        cancellable is an optional tools.Cancellable aborting the crawl.
+        Return the number of stations in the catalog.'''
+        # not needed at startup
+        from .catalogsync import CatalogSync
+        catalog = self.get_catalog()
+        CatalogSync(self, catalog, max_age=0, budget=None).run(cancellable)
+        catalog.set_crawl_time(time.time())
+        return len(catalog)
+
     def get_category_types(self):
         '''returns a list of possible values of category_types
 
@@ -133,23 +447,218 @@ class OnlineRadioInfo(object):
         _log.debug('returning available categories for category type {0}'.format(category_type))
         return self._get_json_result_for_parameters('menu/valuesofcategory', category='_{0}'.format(category_type))
 
-    def get_stations_by_category(self, category_type, category_value=''):
-        '''returns a generator list of Radio for a given category of category_type'''
+    def get_stations_by_category(self, category_type, category_value='', cancellable=None):
+        '''returns a generator list of Radio for a given category of category_type
+
+        cancellable is an optional tools.Cancellable aborting the request'''
+        for json_radio in self.get_json_stations_by_category(category_type, category_value, cancellable):
+            yield self._make_radio(json_radio)
+
+    def get_json_stations_by_category(self, category_type, category_value='', cancellable=None):
+        '''Same than get_stations_by_category, yielding the stations json data instead of Radio'''
         _log.debug('getting stations for {1} in {0}'.format(category_type, category_value))
-        for json_radio in self._get_json_result_for_parameters('menu/broadcastsofcategory', category='_{0}'.format(category_type),
-                                                                                            value=category_value):
-            yield Radio(json_radio, self)
+        for json_radio in self._iter_json_array_for_parameters('menu/broadcastsofcategory', cancellable,
+                                                               category='_{0}'.format(category_type),
+                                                               value=category_value):
+            yield json_radio
 
-    def _get_json_result_for_parameters(self, path, **parameters):
+    def _make_radio(self, json_radio):
+        with tracing.span('radio'):
+            return Radio(json_radio, self)
+
+    def _get_json_result_for_parameters(self, path, cancellable=None, **parameters):
         '''Get a json resulting object from the selected radio.
 
         path represents the url path to get the request
-        parameters are optional parameters given as GET param to the request'''
+        cancellable is an optional tools.Cancellable aborting the request
+        parameters are optional parameters given as GET param to the request
+
+        Responses are cached on disk for the path CACHE_TTLS, then revalidated.
+        A stale cached response is served if the network is unavailable.'''
 
-        response = self._url_request(path, **parameters)
+        if path not in self.CACHE_TTLS:
+            return self._decode_json(self._url_request(path, cancellable, **parameters), path)
 
+        (key, entry, fresh) = self._get_cache_entry(path, parameters)
+        if fresh:
+            _log.debug('Using cached response for {0}'.format(path))
+            Metrics().record_cache('responses', 'hit')
+            return self._decode_json(entry.body, path)
+
+        validation_headers = {}
+        if entry:
+            validation_headers = entry.get_validation_headers()
+        try:
+            (response, response_headers) = self._url_open(path, validation_headers, cancellable, **parameters)
+        except ConnectionError:
+            if not entry:
+                raise
+            _log.warning('Serving stale cached response for {0}'.format(path))
+            Metrics().record_cache('responses', 'stale')
+            return self._decode_json(entry.body, path)
+
+        if response is None and entry:
+            _log.debug('Cached response for {0} is still valid'.format(path))
+            Metrics().record_cache('responses', 'revalidated')
+            self._cache.refresh(key, entry)
+            return self._decode_json(entry.body, path)
+
+        Metrics().record_cache('responses', 'miss')
+        json_result = self._decode_json(response, path)
+        self._cache.store(key, response, response_headers.get('ETag'), response_headers.get('Last-Modified'))
+        return json_result
+
+    def _iter_json_array_for_parameters(self, path, cancellable=None, timings=None, base_url=None, **parameters):
+        '''Get the items of a json resulting array from the selected radio.
+
+        Same than _get_json_result_for_parameters, but items are yielded while the
+        response is downloaded, before the whole array is received. Identical
+        concurrent requests get the whole array at once, when it's received.
+        If the response is received from the network, a (latency, transfer time)
+        tuple is appended to the timings list, if given.
+        base_url is the website to request, the selected one by default.'''
+
+        (key, entry, fresh) = self._get_cache_entry(path, parameters, base_url)
+        if fresh:
+            _log.debug('Using cached response for {0}'.format(path))
+            Metrics().record_cache('responses', 'hit')
+            for item in self._decode_json(entry.body, path):
+                yield item
+            return
+
+        validation_headers = {}
+        if entry:
+            validation_headers = entry.get_validation_headers()
+        request_key = ('stream', self._build_url(path, parameters, base_url),
+                       tuple(sorted(validation_headers.items())))
+        (request, body) = self._join_request(request_key, cancellable)
+        if request is None:
+            for item in self._decode_json(body, path):
+                yield item
+            return
+
+        # the received body is appended to bodies, to be shared once complete
+        bodies = []
+        error = None
         try:
-            json_result = json.loads(response)
+            for item in self._iter_response_json_array(path, key, entry, validation_headers, bodies,
+                                                       cancellable, parameters, timings, base_url):
+                yield item
+        except ConnectionError as connection_error:
+            error = connection_error
+            raise
+        finally:
+            self._finish_request(request_key, request, bodies[0] if bodies else None, error)
+
+    def _iter_response_json_array(self, path, key, entry, validation_headers, bodies, cancellable, parameters,
+                                  timings=None, base_url=None):
+        '''Send the request and yield the items of its json array, appending the whole body to bodies
+
+        The recorded latency only counts the time spent waiting for the network,
+        not the one spent by the caller between items. The recorded parse time
+        is the one spent decoding the items, without the network one.'''
+        start_time = time.time()
+        try:
+            response = self._open_response(path, validation_headers, cancellable, base_url, **parameters)
+        except ConnectionError:
+            if not entry:
+                raise
+            _log.warning('Serving stale cached response for {0}'.format(path))
+            Metrics().record_cache('responses', 'stale')
+            bodies.append(entry.body)
+            for item in self._decode_json(entry.body, path):
+                yield item
+            return
+        # list for _read_chunks to add the time spent reading the body
+        latency = time.time() - start_time
+        network_time = [latency]
+
+        if response.status == 304 and entry:
+            _log.debug('Cached response for {0} is still valid'.format(path))
+            Metrics().record_cache('responses', 'revalidated')
+            response.close()
+            self._record_request(path, network_time[0], 0, response.bytes_received)
+            self._cache.refresh(key, entry)
+            bodies.append(entry.body)
+            for item in self._decode_json(entry.body, path):
+                yield item
+            return
+
+        if key:
+            Metrics().record_cache('responses', 'miss')
+        encoding = response.headers.get_content_charset() or 'utf-8'
+        chunks = []
+        parse_time = 0.0
+        try:
+            items = iter_json_array(self._read_chunks(response, chunks, network_time), encoding)
+            while True:
+                start_time = time.time()
+                start_network_time = network_time[0]
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                finally:
+                    parse_time += time.time() - start_time - (network_time[0] - start_network_time)
+                yield item
+        except TransportError as error:
+            _log.warning('Get a networking error: {0}'.format(error))
+            Metrics().record_error(self._get_metrics_path(path))
+            raise ConnectionError(error)
+        except (LookupError, ValueError) as error:
+            _log.warning("Couldn't convert the result into json. The Error is: {0}".format(error))
+            Metrics().record_error(self._get_metrics_path(path))
+            raise ConnectionError(error)
+        finally:
+            response.close()
+
+        body = b''.join(chunks)
+        _log.debug('Connection successfully completed done ({} bytes)'.format(len(body)))
+        self._record_request(path, network_time[0], len(body), response.bytes_received)
+        Metrics().record_parse(self._get_metrics_path(path), parse_time)
+        if timings is not None:
+            timings.append((latency, network_time[0] - latency))
+        bodies.append(body.decode(encoding))
+        if key:
+            self._cache.store(key, bodies[0], response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    def _read_chunks(self, response, chunks, network_time=None):
+        '''Yield the response body chunks as they arrive, keeping them in chunks
+
+        The time spent reading is added to network_time[0], if given'''
+        while True:
+            start_time = time.time()
+            with tracing.span('http read'):
+                chunk = response.read(CHUNK_SIZE)
+            if network_time is not None:
+                network_time[0] += time.time() - start_time
+            if not chunk:
+                break
+            chunks.append(chunk)
+            yield chunk
+
+    def _get_cache_entry(self, path, parameters, base_url=None):
+        '''Return a (key, cache entry, is fresh) tuple for the request
+
+        key is None if the path responses are never cached and entry is None
+        if there is nothing in cache'''
+        ttl = self.CACHE_TTLS.get(path)
+        if ttl is None:
+            return (None, None, False)
+        key = ResponseCache.make_key(base_url or self.radio_base_url, path, parameters)
+        entry = self._cache.get(key)
+        return (key, entry, entry is not None and entry.is_fresh(ttl))
+
+    def _decode_json(self, response, path=None):
+        '''Convert a response to a json object, raising a ConnectionError if invalid
+
+        The decoding time is recorded in the path metrics, if given'''
+        start_time = time.time()
+        try:
+            with tracing.span('json decode', path=path):
+                json_result = json.loads(response)
+            if path is not None:
+                Metrics().record_parse(self._get_metrics_path(path), time.time() - start_time)
             _log.debug('Connection successfully completed done ({} bytes)'.format(len(response)))
             #_log.debug('Connection successfully completed done ({0} bytes) and returning: {1}'.format(len(response), json_result))
         except (ValueError, TypeError) as error:
@@ -158,50 +667,152 @@ class OnlineRadioInfo(object):
 
         return json_result
 
+    def resolve_playlists(self, playlist_urls):
+        '''Return a {playlist url: stream urls} dict for playlist_urls, fetching them concurrently'''
+        return self._playlist_resolver.resolve_many(playlist_urls)
+
     def _resolve_playlist(self, playlist_url):
+        '''Return the stream urls of playlist_url (m3u, m3u8, pls, xspf or asx), using the already resolved ones'''
         _log.debug('Resolving playlist: {0}'.format(playlist_url))
+        return self._playlist_resolver.resolve(playlist_url)
 
-        stream_url = []
-        if playlist_url.endswith('m3u') or playlist_url.endswith('pls'):
-            response = self._url_request(playlist_url)
-
-        if playlist_url.endswith('m3u'):
-            _log.debug('m3u file found')
-            for entry in response.splitlines():
-                if entry and not entry.strip().startswith('#'):
-                    stream_url.append(entry.strip())
-
-        elif playlist_url.endswith('pls'):
-            _log.debug('pls file found')
-            for line in response.splitlines():
-                if line.strip().startswith('File'):
-                    stream_url.append(line.split('=')[1])
-
-        if not stream_url:
-            _log.debug('Failing to parse it or to find a useful playlist, trying to assign it directly')
-            stream_url = [playlist_url]
-        return stream_url
-
-    def _url_request(self, path, **parameters):
+    def _url_request(self, path, cancellable=None, **parameters):
         '''Get a response for a particular path
 
         path represents the url path to get the request
+        cancellable is an optional tools.Cancellable aborting the request
         parameters are optional parameters given as GET param to the request
 
         Returns the reponse'''
+        return self._url_open(path, {}, cancellable, **parameters)[0]
 
-        url = '{website}/{path}'.format(website=self.radio_base_url, path=path)
-        if parameters:
-            url += '?{0}'.format(urllib.parse.urlencode(parameters))
-        req = urllib.request.Request(url)
+    def _url_open(self, path, request_headers, cancellable=None, **parameters):
+        '''Get a response and its headers for a particular path
+
+        path can be an absolute url as well (like playlists ones)
+        request_headers are additional headers sent with the request, like
+        conditional ones. The response is None if the server replied that
+        the content wasn't modified.
+        Identical concurrent requests share the same response.
+
+        Returns a (response, response headers) tuple'''
+
+        request_key = ('full', self._build_url(path, parameters), tuple(sorted(request_headers.items())))
+        (request, result) = self._join_request(request_key, cancellable)
+        if request is None:
+            return result
+
+        result = None
+        error = None
+        try:
+            result = self._url_open_once(path, request_headers, cancellable, **parameters)
+        except ConnectionError as connection_error:
+            error = connection_error
+            raise
+        finally:
+            self._finish_request(request_key, request, result, error)
+        return result
+
+    def _join_request(self, request_key, cancellable=None):
+        '''Wait for the identical request in flight, if any, and share its result
+
+        Return a (None, result) tuple in that case. Otherwise, the caller has to
+        send the request and call _finish_request once done, with the returned
+        (in flight request, None) tuple.'''
+        while True:
+            with self._inflight_lock:
+                request = self._inflight_requests.get(request_key)
+                if request is None:
+                    request = _InFlightRequest()
+                    self._inflight_requests[request_key] = request
+                    return (request, None)
+            _log.debug('Waiting for the identical request in flight: {0}'.format(request_key[1]))
+            result = request.wait(cancellable)
+            # otherwise, the request was abandoned (cancelled): send it ourself
+            if result is not None:
+                return (None, result)
+
+    def _finish_request(self, request_key, request, result, error):
+        '''Share the result or error of an in flight request with the waiting identical ones'''
+        with self._inflight_lock:
+            del self._inflight_requests[request_key]
+        request.finish(result, error)
+
+    def _url_open_once(self, path, request_headers, cancellable=None, **parameters):
+        '''Same than _url_open, without sharing the response'''
+        start_time = time.time()
+        response = self._open_response(path, request_headers, cancellable, **parameters)
+        try:
+            with tracing.span('http read'):
+                body = response.read()
+        except TransportError as error:
+            _log.warning('Get a networking error: {0}'.format(error))
+            Metrics().record_error(self._get_metrics_path(path))
+            raise ConnectionError(error)
+        finally:
+            response.close()
+
+        self._record_request(path, time.time() - start_time, len(body), response.bytes_received)
+        response_headers = response.headers
+        if response.status == 304:
+            return (None, response_headers)
+        encoding = response_headers.get_content_charset() or 'utf-8'
+        try:
+            result = body.decode(encoding)
+        except (LookupError, UnicodeDecodeError) as error:
+            _log.warning("Couldn't decode the result with {0}: {1}".format(encoding, error))
+            raise ConnectionError(error)
+
+        return (result, response_headers)
+
+    def _open_response(self, path, request_headers, cancellable=None, base_url=None, **parameters):
+        '''Send the request for path and return the response, once its headers are received
+
+        The caller is responsible for reading and closing the response.
+        Raise a ConnectionError on networking or HTTP errors.'''
 
+        url = self._build_url(path, parameters, base_url)
         try:
             _log.debug('Contacting {0}'.format(url))
-            response = urllib.request.urlopen(req)
-            encoding = response.headers.get_content_charset()
-            result = response.readall().decode(encoding)
-        except (urllib.error.HTTPError, urllib.error.URLError) as error:
+            with tracing.span('http request', url=url):
+                response = self._pool.open(url, request_headers, cancellable)
+        except TransportError as error:
             _log.warning('Get a networking error: {0}'.format(error))
+            Metrics().record_error(self._get_metrics_path(path))
             raise ConnectionError(error)
 
-        return result
+        if response.status >= 400:
+            response.close()
+            _log.warning('Get a networking error: HTTP Error {0} for {1}'.format(response.status, url))
+            Metrics().record_error(self._get_metrics_path(path))
+            raise ConnectionError('HTTP Error {0}'.format(response.status))
+        return response
+
+    def _record_request(self, path, duration, size, received_bytes):
+        '''Record a successful request in the metrics and in the bytes received by the current thread
+
+        size is the one of the decompressed body, received_bytes the ones actually transferred.'''
+        Metrics().record_request(self._get_metrics_path(path), duration, size, received_bytes)
+        self._transfers.received_bytes = self.get_received_bytes() + received_bytes
+
+    def get_received_bytes(self):
+        '''Return the number of (compressed) response bytes received by the requests of the current thread'''
+        return getattr(self._transfers, 'received_bytes', 0)
+
+    def _get_metrics_path(self, path):
+        '''Return the name under which path requests are recorded
+
+        Absolute urls are the playlists ones, recorded together'''
+        if urllib.parse.urlsplit(path).scheme:
+            return 'playlists'
+        return path
+
+    def _build_url(self, path, parameters, base_url=None):
+        '''Return the full url for path and its GET parameters, on base_url or the selected website'''
+        if urllib.parse.urlsplit(path).scheme:
+            url = path
+        else:
+            url = '{website}/{path}'.format(website=base_url or self.radio_base_url, path=path)
+        if parameters:
+            url += '?{0}'.format(urllib.parse.urlencode(parameters))
+        return url
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+# stations of the first page of results, enough to fill the first rows of the dash
+FIRST_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 800
+# transfer time of a page, in request latencies
+LATENCY_RATIO = 4
+# weight of the last page in the latency and throughput averages
+SMOOTHING = 0.25
+
+
+class PageSizer(object):
+    '''Size of the result pages, adapted to the measured network latency and throughput
+
+    Pages start with FIRST_PAGE_SIZE stations and at most double each time,
+    up to the size whose transfer takes LATENCY_RATIO times the request
+    latency. The latency is then a small part of the page time, while pages
+    stay small enough to be shown quickly and not to be wasted much if the
+    search is abandoned.
+    Sizes are FIRST_PAGE_SIZE times a power of two, so that the same pages are
+    requested again and found in the response cache.
+    It can be used from any thread.'''
+
+    def __init__(self):
+        # seconds before the response headers are received
+        self._latency = None
+        # seconds to transfer a station
+        self._station_time = None
+        self._lock = threading.Lock()
+
+    def get_first_page_size(self):
+        return FIRST_PAGE_SIZE
+
+    def get_next_page_size(self, page_size):
+        '''Return the size of the page following one of page_size stations'''
+        size = min(page_size * 2, MAX_PAGE_SIZE)
+        with self._lock:
+            if self._latency is not None and self._station_time:
+                size = min(size, LATENCY_RATIO * self._latency / self._station_time)
+        rounded_size = FIRST_PAGE_SIZE
+        while rounded_size * 2 <= size:
+            rounded_size *= 2
+        return rounded_size
+
+    def record_page(self, stations, latency, transfer_time):
+        '''Learn from a page of stations, received latency seconds after the request, in transfer_time seconds'''
+        if not stations:
+            return
+        station_time = transfer_time / stations
+        with self._lock:
+            if self._latency is None:
+                (self._latency, self._station_time) = (latency, station_time)
+            else:
+                self._latency += SMOOTHING * (latency - self._latency)
+                self._station_time += SMOOTHING * (station_time - self._station_time)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import logging
+import re
+import threading
+import time
+import urllib.parse
+
+_log = logging.getLogger(__name__)
+
+PLAYLIST_FORMATS = ('m3u', 'm3u8', 'pls', 'xspf', 'asx')
+
+_PLS_ENTRY = re.compile(r'^\s*File(\d+)\s*=\s*(.+?)\s*$', re.IGNORECASE)
+_PLS_NUMBER_OF_ENTRIES = re.compile(r'^\s*NumberOfEntries\s*=\s*(\d+)', re.IGNORECASE | re.MULTILINE)
+_ASX_REF = re.compile(r'<ref\s[^>]*?href\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+_XSPF_NAMESPACE = '{http://xspf.org/ns/0/}'
+
+
+def get_playlist_format(url):
+    '''Return the playlist format of url, guessed from its extension, or None if it's not a playlist'''
+    path = urllib.parse.urlsplit(url).path
+    extension = path.rsplit('.', 1)[-1].lower()
+    if extension in PLAYLIST_FORMATS:
+        return extension
+    return None
+
+
+def parse_playlist(content, playlist_format):
+    '''Return the list of urls of a playlist content
+
+    An empty list is returned if the content can't be parsed, and for HLS
+    playlists which have to be given as is to the player.'''
+    if playlist_format in ('m3u', 'm3u8'):
+        if '#EXT-X-' in content:
+            return []
+        return [line.strip() for line in content.splitlines() if line.strip() and not line.strip().startswith('#')]
+    elif playlist_format == 'pls':
+        entries = {}
+        for line in content.splitlines():
+            match = _PLS_ENTRY.match(line)
+            if match:
+                entries[int(match.group(1))] = match.group(2)
+        match = _PLS_NUMBER_OF_ENTRIES.search(content)
+        if match:
+            entries = dict((number, url) for (number, url) in entries.items() if number <= int(match.group(1)))
+        return [entries[number] for number in sorted(entries)]
+    elif playlist_format == 'xspf':
+        # xml modules are slow to import, and rarely needed
+        from xml.etree import ElementTree
+        try:
+            root = ElementTree.fromstring(content.encode('utf-8'))
+        except ElementTree.ParseError as error:
+            _log.debug("Can't parse xspf playlist: {0}".format(error))
+            return []
+        return [location.text.strip() for location in root.iter(_XSPF_NAMESPACE + 'location') if location.text]
+    elif playlist_format == 'asx':
+        # asx files are rarely well-formed xml
+        from xml.sax.saxutils import unescape
+        return [unescape(url.strip()) for url in _ASX_REF.findall(content)]
+    return []
+
+
+class PlaylistResolver(object):
+    '''Resolve playlist urls into stream urls, caching the results
+
+    fetch_function(url) returns the playlist content. Resolved playlists are
+    kept for ttl seconds, with at most max_entries of them, least recently used
+    evicted first. Playlists referencing other playlists are resolved up to
+    max_depth levels.'''
+
+    def __init__(self, fetch_function, max_entries=200, ttl=60 * 60, max_workers=4, max_depth=3):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self._fetch_function = fetch_function
+        # playlist url: (stream urls, timestamp)
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, playlist_url):
+        '''Return the list of stream urls of playlist_url
+
+        Urls which aren't playlists, or without any stream, are returned as is.
+        Errors while fetching playlist_url are raised, nested playlists failing
+        are kept as is.'''
+        return list(self._resolve(playlist_url, 0, set()))
+
+    def resolve_many(self, playlist_urls):
+        '''Resolve concurrently playlist_urls, with at most max_workers fetches at once
+
+        Return a {playlist url: stream urls} dict. Failing playlists are resolved as themselves.'''
+        import concurrent.futures
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+            futures = dict((executor.submit(self.resolve, url), url) for url in set(playlist_urls))
+            for future in concurrent.futures.as_completed(futures):
+                url = futures[future]
+                try:
+                    results[url] = future.result()
+                except Exception as error:
+                    _log.warning("Can't resolve playlist {0}: {1}".format(url, error))
+                    results[url] = [url]
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _resolve(self, playlist_url, depth, visited):
+        '''Resolve playlist_url, visited being the playlist urls already resolved for the top level one'''
+        playlist_format = get_playlist_format(playlist_url)
+        if not playlist_format or depth > self.max_depth:
+            return [playlist_url]
+        # already part of the result (or a loop)
+        if playlist_url in visited:
+            return []
+        visited.add(playlist_url)
+
+        stream_urls = self._get_cached(playlist_url)
+        if stream_urls is not None:
+            return stream_urls
+
+        _log.debug('Resolving {0} playlist: {1}'.format(playlist_format, playlist_url))
+        urls = parse_playlist(self._fetch_function(playlist_url), playlist_format)
+        stream_urls = []
+        for url in urls:
+            if urllib.parse.urlsplit(playlist_url).scheme:
+                url = urllib.parse.urljoin(playlist_url, url)
+            if get_playlist_format(url):
+                try:
+                    url_stream_urls = self._resolve(url, depth + 1, visited)
+                except Exception as error:
+                    _log.debug("Can't resolve nested playlist {0}: {1}".format(url, error))
+                    url_stream_urls = [url]
+            else:
+                url_stream_urls = [url]
+            for stream_url in url_stream_urls:
+                if stream_url not in stream_urls:
+                    stream_urls.append(stream_url)
+        if not stream_urls:
+            _log.debug('Failing to parse it or to find a useful playlist, trying to assign it directly')
+            stream_urls = [playlist_url]
+        self._store(playlist_url, stream_urls)
+        return stream_urls
+
+    def _get_cached(self, playlist_url):
+        with self._lock:
+            try:
+                (stream_urls, timestamp) = self._cache.pop(playlist_url)
+            except KeyError:
+                return None
+            if time.time() - timestamp >= self.ttl:
+                return None
+            self._cache[playlist_url] = (stream_urls, timestamp)
+            return stream_urls
+
+    def _store(self, playlist_url, stream_urls):
+        with self._lock:
+            self._cache.pop(playlist_url, None)
+            self._cache[playlist_url] = (stream_urls, time.time())
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import heapq
+import itertools
+import logging
+import threading
+
+from .onlineradioinfo import ConnectionError
+
+_log = logging.getLogger(__name__)
+
+# default maximum number of details requests running at once
+DEFAULT_MAX_WORKERS = 2
+# default maximum number of radios prefetched per generation
+DEFAULT_BUDGET = 24
+
+
+class DetailsPrefetcher(object):
+    '''Bounded pool of worker threads loading the radio details before they are needed
+
+    Radios are prefetched lower priority first, by at most max_workers threads.
+    At most budget radios are prefetched per generation: a new generation (like
+    a new search) drops the radios still waiting and resets the budget.'''
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, budget=DEFAULT_BUDGET):
+        self.max_workers = max_workers
+        self.budget = budget
+        self._condition = threading.Condition()
+        # (priority, order, radio) heap
+        self._queue = []
+        self._order = itertools.count()
+        # ids of the radios queued or being prefetched
+        self._pending_ids = set()
+        self._spent = 0
+        self._workers = []
+        self._idle_workers = 0
+
+    def prefetch(self, radio, priority=0):
+        '''Queue radio details loading, unless already loaded, queued or over budget
+
+        Return True if the radio was queued'''
+        if radio.get_loaded_detail('stream_urls') is not None:
+            return False
+        with self._condition:
+            if radio.id in self._pending_ids or self._spent >= self.budget:
+                return False
+            self._spent += 1
+            self._pending_ids.add(radio.id)
+            heapq.heappush(self._queue, (priority, next(self._order), radio))
+            if not self._idle_workers and len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._run_worker)
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+            else:
+                self._condition.notify()
+        return True
+
+    def new_generation(self):
+        '''Drop the radios waiting to be prefetched and reset the budget'''
+        with self._condition:
+            for (priority, order, radio) in self._queue:
+                self._pending_ids.discard(radio.id)
+            self._queue = []
+            self._spent = 0
+
+    def _run_worker(self):
+        '''Prefetch queued radios, forever'''
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._idle_workers += 1
+                    self._condition.wait()
+                    self._idle_workers -= 1
+                (priority, order, radio) = heapq.heappop(self._queue)
+            try:
+                if radio.get_loaded_detail('stream_urls') is None:
+                    _log.debug("Prefetching details of radio {0}".format(radio.id))
+                    radio.refresh_details_attributes()
+            except (ConnectionError, KeyError) as error:
+                _log.debug("Couldn't prefetch details of radio {0}: {1}".format(radio.id, error))
+            except Exception as error:
+                # keep the worker alive, it would never be replaced
+                _log.warning("Unexpected error prefetching details of radio {0}: {1}".format(radio.id, error))
+            finally:
+                with self._condition:
+                    self._pending_ids.discard(radio.id)
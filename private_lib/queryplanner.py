@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import json
+import logging
+import threading
+
+from .searchcache import get_canonical_search_terms
+from .tools import save_json
+
+_log = logging.getLogger(__name__)
+
+# bump when the file format changes, older estimates are then ignored
+ESTIMATES_VERSION = 1
+# filters which can be answered by the website, fetching the stations of their categories
+PUSHABLE_FILTERS = ('genre', 'country')
+# stations of a search or a category never seen yet. Searches are limited to 1000 results
+DEFAULT_SEARCH_SIZE = 1000
+DEFAULT_CATEGORY_SIZE = 250
+# cost of one more request, in downloaded stations
+REQUEST_COST = 25
+# number of search sizes kept, the least recently used are forgotten
+MAX_SEARCH_SIZES = 500
+
+
+class QueryPlan(collections.namedtuple('QueryPlan', ['category_type', 'values', 'cost'])):
+    '''How to get the results of a search
+
+    category_type is None to search and then filter the results locally,
+    otherwise the stations of the category_type values are fetched and then
+    matched with the search terms. cost is the number of stations expected
+    to be downloaded.'''
+
+    __slots__ = ()
+
+    def covers(self, filters):
+        '''Return True if the results of the plan contain the ones of the same search with filters'''
+        if self.category_type is None:
+            return True
+        values = filters.get(self.category_type)
+        return bool(values) and set(values).issubset(self.values)
+
+
+class CardinalityEstimates(object):
+    '''Number of stations of the searches and categories of the radio website at source_url
+
+    They are learned from earlier responses and saved to path by save (meant
+    to be called periodically, out of the searches). A search result also
+    gives a lower bound of the size of the categories of its stations.
+    It can be used from any thread.'''
+
+    def __init__(self, path, source_url):
+        self.path = path
+        self.source_url = source_url
+        # canonical search terms: number of stations
+        self._search_sizes = collections.OrderedDict()
+        # (category type, value): [number of stations, True if exact or False if a lower bound]
+        self._category_sizes = {}
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.Lock()
+        # only one save at a time, without holding _lock while writing
+        self._save_lock = threading.Lock()
+
+    def get_search_size(self, search_terms):
+        '''Return the estimated number of stations of search_terms'''
+        with self._lock:
+            self._load()
+            size = self._search_sizes.get(get_canonical_search_terms(search_terms))
+        return DEFAULT_SEARCH_SIZE if size is None else size
+
+    def get_category_size(self, category_type, value):
+        '''Return the estimated number of stations of the category_type value
+
+        Categories never fetched are as big as the average category of the same
+        type, or as their lower bound if bigger.'''
+        with self._lock:
+            self._load()
+            (size, exact) = self._category_sizes.get((category_type, value), (0, False))
+            if exact:
+                return size
+            known_sizes = [known_size for ((known_type, known_value), (known_size, known_exact))
+                           in self._category_sizes.items() if known_type == category_type and known_exact]
+        if known_sizes:
+            return max(size, sum(known_sizes) // len(known_sizes))
+        return max(size, DEFAULT_CATEGORY_SIZE)
+
+    def record_search(self, search_terms, radios):
+        '''Learn from the radios list found for search_terms'''
+        category_counts = collections.Counter()
+        for radio in radios:
+            category_counts[('country', radio.country)] += 1
+            for genre in radio.genres:
+                category_counts[('genre', genre)] += 1
+        with self._lock:
+            self._load()
+            canonical_search_terms = get_canonical_search_terms(search_terms)
+            self._search_sizes.pop(canonical_search_terms, None)
+            self._search_sizes[canonical_search_terms] = len(radios)
+            while len(self._search_sizes) > MAX_SEARCH_SIZES:
+                self._search_sizes.popitem(last=False)
+            for (key, count) in category_counts.items():
+                (size, exact) = self._category_sizes.get(key, (0, False))
+                if not exact and count > size:
+                    self._category_sizes[key] = [count, False]
+            self._dirty = True
+
+    def record_category(self, category_type, value, size):
+        '''Learn the exact number of stations of the category_type value'''
+        with self._lock:
+            self._load()
+            self._category_sizes[(category_type, value)] = [size, True]
+            self._dirty = True
+
+    def save(self):
+        '''Atomically save the estimates if they changed since the last save. Failing to save them is never fatal
+
+        Searches are only blocked while copying the estimates, not while writing them.'''
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {'version': ESTIMATES_VERSION, 'source_url': self.source_url,
+                        'searches': list(self._search_sizes.items()),
+                        'categories': [(category_type, value, size, exact)
+                                       for ((category_type, value), (size, exact)) in self._category_sizes.items()]}
+                self._dirty = False
+            try:
+                save_json(self.path, data)
+            except (IOError, OSError) as error:
+                _log.warning("Couldn't save the cardinality estimates: {0}".format(error))
+                with self._lock:
+                    self._dirty = True
+
+    def _load(self):
+        '''Load the saved estimates, if not done yet'''
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, OSError):
+            return
+        except ValueError as error:
+            _log.debug('Ignoring corrupted cardinality estimates: {0}'.format(error))
+            return
+        try:
+            if data['version'] != ESTIMATES_VERSION or data['source_url'] != self.source_url:
+                _log.debug('Ignoring cardinality estimates from another version or website')
+                return
+            search_sizes = collections.OrderedDict((search_terms, size) for (search_terms, size) in data['searches'])
+            category_sizes = dict(((category_type, value), [size, exact])
+                                  for (category_type, value, size, exact) in data['categories'])
+        except (KeyError, TypeError, ValueError) as error:
+            _log.debug('Ignoring invalid cardinality estimates: {0}'.format(error))
+            return
+        self._search_sizes = search_sizes
+        self._category_sizes = category_sizes
+
+
+class QueryPlanner(object):
+    '''Choose the cheapest way to get the results of a filtered search
+
+    Either the search results are downloaded and filtered locally, or the
+    stations of the categories of one of the PUSHABLE_FILTERS are downloaded
+    and matched with the search terms locally, whichever downloads less
+    stations according to the estimates (a CardinalityEstimates).'''
+
+    def __init__(self, estimates):
+        self.estimates = estimates
+
+    def plan(self, search_terms, filters):
+        '''Return the QueryPlan of search_terms with filters, as returned by RadioHandler._return_active_filters'''
+        best_plan = QueryPlan(None, (), self.estimates.get_search_size(search_terms) + REQUEST_COST)
+        for category_type in PUSHABLE_FILTERS:
+            values = tuple(sorted(filters.get(category_type, ())))
+            if not values:
+                continue
+            cost = sum(self.estimates.get_category_size(category_type, value) + REQUEST_COST for value in values)
+            if cost < best_plan.cost:
+                best_plan = QueryPlan(category_type, values, cost)
+        _log.debug('Planned {0} for {1} with {2}'.format(best_plan, search_terms, filters))
+        return best_plan
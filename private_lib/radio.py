@@ -23,10 +23,37 @@ import re
 _log = logging.getLogger(__name__)
 
 
+class _LazyDetail(object):
+    '''Radio attribute loading the radio details on first access'''
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, radio, owner):
+        if radio is None:
+            return self
+        if radio._stream_urls is None:
+            radio.refresh_details_attributes()
+        return getattr(radio, self.slot)
+
+    def __set__(self, radio, value):
+        setattr(radio, self.slot, value)
+
+
 class Radio(object):
 
     '''Represent a radio'''
 
+    # lot of radios are kept in memory, no need of a __dict__ for each of them
+    __slots__ = ('name', 'picture_url', 'decades', 'genres', 'current_track', 'country', 'rating', 'id',
+                 '_city', '_description', '_stream_urls', '_web_link', '_onlineradioinfo')
+
+    # lazy loaded on first access, which refreshes the current_track as well
+    city = _LazyDetail('_city')
+    description = _LazyDetail('_description')
+    stream_urls = _LazyDetail('_stream_urls')
+    web_link = _LazyDetail('_web_link')
+
     def __init__(self, data, onlineradioinfo):
         '''Tranform radio raw data to objects with the desired structure'''
 
@@ -51,10 +78,10 @@ class Radio(object):
         self.country = data['country']
         self.rating = data['rating']
         self.id = data['id']
-        self.city = None
-        self.description = None
-        self.stream_urls = None
-        self.web_link = None
+        self._city = None
+        self._description = None
+        self._stream_urls = None
+        self._web_link = None
 
         # keep it for lazy loading of more info on the radio
         self._onlineradioinfo = onlineradioinfo
@@ -68,11 +95,20 @@ class Radio(object):
         self.stream_urls = details['stream_urls']
         self.web_link = details['web_link']
 
-    def __getattribute__(self, name):
-        '''Lazy load some attributes and use that to refresh the current_track'''
-        if object.__getattribute__(self, 'stream_urls') is None and name in ('city', 'description', 'stream_urls', 'web_link'):
-            self.refresh_details_attributes()
-        return object.__getattribute__(self, name)
+    def get_json_data(self):
+        '''Return radio data in the radio website json format, to build the same radio again
+
+        Lazy loaded details aren't part of it'''
+        genres = self.genres + ['Years {0}'.format(decade) for decade in self.decades]
+        return {'id': self.id, 'name': self.name, 'pictureBaseURL': '', 'picture1Name': self.picture_url,
+                'genresAndTopics': ', '.join(genres), 'currentTrack': self.current_track, 'country': self.country,
+                'rating': self.rating}
+
+    def get_loaded_detail(self, name):
+        '''Return the lazy loaded detail name if already loaded, None otherwise
+
+        This never triggers any network access'''
+        return getattr(self, '_{0}'.format(name))
 
 
 def transform_decade_str_in_int(decade):
@@ -19,16 +19,33 @@
 
 import gettext
 from gi.repository import Unity
+import itertools
 import logging
+import os
+import threading
 
-from .enums import CATEGORIES
+from . import tracing
+from .enums import CATEGORIES, SEARCH_NETWORK
+from .filterindex import FilterIndex
+from .filtersnapshot import FilterSnapshot
+from .metrics import Metrics
 from .onlineradioinfo import OnlineRadioInfo
-from .radio import transform_decade_str_in_int
-from .tools import singleton
+from .queryplanner import CardinalityEstimates, QueryPlan, QueryPlanner
+from .radio import Radio
+from .searchcache import get_canonical_search_terms, SearchResultCache
+from .tools import get_cache_path, singleton
+from .trigramindex import TrigramIndex
 
 _ = gettext.gettext
 _log = logging.getLogger(__name__)
 
+# filters whose options come from the radio website
+VOCABULARY_FILTERS = ('genre', 'country')
+# maximum number of radios suggested for a search without results
+MAX_SUGGESTIONS = 25
+# plan of the searches answered by the website search, or from the cache
+SEARCH_PLAN = QueryPlan(None, (), 0)
+
 
 @singleton
 class RadioHandler(object):
@@ -36,8 +53,24 @@ class RadioHandler(object):
 
     def __init__(self):
         self._last_search = None
+        # how the previous search results were fetched, they can be pre-filtered
+        self._last_plan = SEARCH_PLAN
         # all radios from previous search, before filtering
         self._last_all_radios_dict = {}
+        # filter indexes of the previous search radios, by category
+        self._last_filter_indexes = {}
+        # all radios from older searches
+        self._search_cache = SearchResultCache()
+        self._query_planner = QueryPlanner(CardinalityEstimates(os.path.join(get_cache_path(), 'estimates.json'),
+                                                                OnlineRadioInfo().radio_base_url))
+        # every radio seen, for suggestions
+        self._trigram_index = TrigramIndex(os.path.join(get_cache_path(), 'trigrams.json'))
+        # unity filters by name, once built
+        self._unity_filters = {}
+        self._filter_snapshot = FilterSnapshot(os.path.join(get_cache_path(), 'filters.json'),
+                                               OnlineRadioInfo().radio_base_url)
+        # searches can run concurrently in different threads
+        self._lock = threading.Lock()
 
     def get_unity_radio_categories(self, categories):
         '''Build and return new radio categories for unity'''
@@ -49,8 +82,12 @@ class RadioHandler(object):
         return unity_categories
 
     def get_unity_radio_filters(self):
-        '''Build and return new radio filters for unity'''
+        '''Build and return new radio filters for unity
+
+        Genre and country options are the ones of the last snapshot, without
+        any network access. They are refreshed by refresh_filter_vocabularies.'''
         _log.debug("Got unity filter")
+        vocabularies = self._filter_snapshot.load() or {}
         # decade, genre, country
         unity_filters = []
         filt = Unity.MultiRangeFilter.new("decade", _("Decade"), None, False)
@@ -63,41 +100,128 @@ class RadioHandler(object):
         filt.add_option("2010", _("10s"), None)
         unity_filters.append(filt)
         filt = Unity.CheckOptionFilter.new("genre", _("Genre"), None, False)
-        for genre in OnlineRadioInfo().get_categories_by_category_type('genre'):
+        for genre in vocabularies.get('genre', []):
             filt.add_option(genre, genre, None)
         unity_filters.append(filt)
         filt = Unity.CheckOptionFilter.new("country", _("Country"), None, False)
-        for country in OnlineRadioInfo().get_categories_by_category_type('country'):
+        for country in vocabularies.get('country', []):
             filt.add_option(country, country, None)
         unity_filters.append(filt)
+        self._unity_filters = dict((unity_filter.props.id, unity_filter) for unity_filter in unity_filters)
         return unity_filters
 
-    def get_model_data_from_content_search(self, search_terms, scope):
+    def refresh_filter_vocabularies(self):
+        '''Fetch the genre and country filter options, saving them in the snapshot
+
+        This is blocking, and can be called from a worker thread.
+        Return the new vocabularies, or None if they didn't change.'''
+        vocabularies = {}
+        for name in VOCABULARY_FILTERS:
+            vocabularies[name] = list(OnlineRadioInfo().get_categories_by_category_type(name))
+        if vocabularies == self._filter_snapshot.load():
+            return None
+        _log.debug("Filter vocabularies changed")
+        self._filter_snapshot.save(vocabularies)
+        return vocabularies
+
+    def update_unity_radio_filters(self, vocabularies):
+        '''Update in place the options of the unity filters to vocabularies, keeping the active ones'''
+        for name in VOCABULARY_FILTERS:
+            unity_filter = self._unity_filters.get(name)
+            if unity_filter is None or name not in vocabularies:
+                continue
+            new_options = set(vocabularies[name])
+            current_options = set()
+            for option in list(unity_filter.options):
+                if option.props.id in new_options:
+                    current_options.add(option.props.id)
+                else:
+                    unity_filter.remove_option(option.props.id)
+            for option in vocabularies[name]:
+                if option not in current_options:
+                    unity_filter.add_option(option, option, None)
+                    current_options.add(option)
+
+    def get_model_data_from_content_search(self, search_terms, scope, cancellable=None, filters=None):
         '''Search current content, eventually filtered
 
+        cancellable is an optional tools.Cancellable aborting the network requests.
+        filters are the active filters, as returned by _return_active_filters. They
+        are read from the scope if None, which then needs to happen in the main thread.
+
+        Results of the recent searches are kept in a cache, so that searching
+        them again doesn't need any network request. Searches without results
+        give suggestions instead, which are never cached as results.
+        Otherwise, when searching the website with genre or country filters, the
+        query planner can choose to fetch the stations of the selected categories
+        instead of every search result, if there are less of them.
+
         returns a tuple with the radio itself and an updated model data ready to be appended (iterator)'''
 
         _log.debug("Searching for: {0}".format(search_terms))
-        radios_dict = self._last_all_radios_dict
+        if filters is None:
+            filters = self._return_active_filters(scope)
+        if filters:
+            self._record_filter_uses(filters)
+        with self._lock:
+            last_search = self._last_search
+            last_plan = self._last_plan
+            radios_dict = self._last_all_radios_dict
         # first, the search itself
-        if self._last_search is None or search_terms != self._last_search:
-            if search_terms == "":
-                radios_dict = OnlineRadioInfo().get_most_wanted_stations()
-                # change the generator to a list for copying them back in cache
-                for category in radios_dict:
-                    radios_dict[category] = list(radios_dict[category])
-            else:
-                radios_dict = {}
-                radios_dict["search"] = list(OnlineRadioInfo().get_stations_by_searchstring(search_terms))
+        if last_search is None or get_canonical_search_terms(search_terms) != get_canonical_search_terms(last_search) \
+           or not last_plan.covers(filters):
+            streamed = False
+            complete = True
+            plan = SEARCH_PLAN
+            radios_dict = self._search_cache.get(search_terms)
+            Metrics().record_cache('searches', 'miss' if radios_dict is None else 'hit')
+            if radios_dict is None:
+                if search_terms == "":
+                    radios_dict = OnlineRadioInfo().get_most_wanted_stations(cancellable=cancellable)
+                    # change the generator to a list for copying them back in cache
+                    for category in radios_dict:
+                        radios_dict[category] = list(radios_dict[category])
+                else:
+                    if filters and OnlineRadioInfo().search_mode == SEARCH_NETWORK:
+                        plan = self._query_planner.plan(search_terms, filters)
+                    if plan.category_type is None:
+                        radios_generator = OnlineRadioInfo().get_stations_by_searchstring(search_terms,
+                                                                                          cancellable=cancellable)
+                    else:
+                        radios_generator = self._get_category_radios(search_terms, plan, cancellable)
+                    # stream the results while they are downloaded
+                    radios = []
+                    for radio in radios_generator:
+                        radios.append(radio)
+                        if not filters or self._is_radio_fulfill_filters(radio, filters):
+                            yield (radio, self._get_model_data(radio, CATEGORIES.SEARCH_RADIO))
+                    if plan.category_type is None:
+                        # results cut off by a federated search are neither cached nor counted
+                        complete = OnlineRadioInfo().is_last_search_complete()
+                    if plan.category_type is None and OnlineRadioInfo().search_mode == SEARCH_NETWORK and complete:
+                        self._query_planner.estimates.record_search(search_terms, radios)
+                    radios_dict = {"search": radios}
+                    streamed = True
+                self._trigram_index.add_radios(itertools.chain(*radios_dict.values()))
+                # only complete results can be used with other filters
+                if plan.category_type is None and complete:
+                    self._search_cache.store(search_terms, radios_dict)
 
-            # save the state, without filters (all radios)
-            self._last_all_radios_dict = radios_dict
-            self._last_search = search_terms
+            # save the state, without filters (all radios, or the ones of the plan categories)
+            with self._lock:
+                self._last_all_radios_dict = radios_dict
+                self._last_filter_indexes = {}
+                self._last_search = search_terms
+                self._last_plan = plan
+            if streamed:
+                if not radios_dict["search"]:
+                    for (radio, model_data) in self.get_suggested_model_data(search_terms, filters):
+                        yield (radio, model_data)
+                return
 
-        filters = self._return_active_filters(scope)
-        validate_function = lambda radio, absorber: radio
+        validate_function = lambda radios, absorber: radios
         if filters:
-            validate_function = self._filter_radios
+            validate_function = self._filter_radios_with_index
         for category in radios_dict:
             if category == "search":
                 cat = CATEGORIES.SEARCH_RADIO
@@ -108,7 +232,111 @@ class RadioHandler(object):
             elif category == "local":
                 cat = CATEGORIES.LOCAL
             for valid_radio in validate_function(radios_dict[category], filters):
-                yield (valid_radio, (str(valid_radio.id), valid_radio.picture_url, cat, "text/html", valid_radio.name, valid_radio.current_track, ""))
+                yield (valid_radio, self._get_model_data(valid_radio, cat))
+        if radios_dict.get("search") == []:
+            for (radio, model_data) in self.get_suggested_model_data(search_terms, filters):
+                yield (radio, model_data)
+
+    def get_suggestions(self, search_terms):
+        '''Return the radios seen before whose name, city, country or genres are close to search_terms
+
+        This is typo tolerant, and doesn't need any network access.'''
+        with tracing.span('suggestions'):
+            return [Radio(data, OnlineRadioInfo())
+                    for (radio_id, data, similarity) in self._trigram_index.lookup(search_terms, MAX_SUGGESTIONS)]
+
+    def get_suggested_model_data(self, search_terms, filters):
+        '''Return the model data of the suggestions for search_terms, with filters
+
+        Like get_refined_model_data, it's local and can be shown while the
+        server results are awaited. Suggestions for the search terms are never
+        kept as their results.
+
+        returns a list of (radio, model data) tuples'''
+        radios = self.get_suggestions(search_terms)
+        if filters:
+            radios = self._filter_radios(radios, filters)
+        return [(radio, self._get_model_data(radio, CATEGORIES.SEARCH_RADIO)) for radio in radios]
+
+    def save(self):
+        '''Save the radios seen for suggestions and the cardinality estimates, if they changed
+
+        Call it out of the searches.'''
+        self._trigram_index.save()
+        self._query_planner.estimates.save()
+
+    def get_refined_model_data(self, search_terms, filters):
+        '''Return the model data of search_terms computed locally from the previous search
+
+        This is only possible when search_terms extends the previous search (like
+        "jazz" after "jaz"): results are then the previous ones matching every
+        search word in their name, genres or city (if already loaded).
+        It's only a preview of the server results, which can differ.
+
+        returns a list of (radio, model data) tuples, or None if the previous
+        search can't be refined into search_terms'''
+        with self._lock:
+            last_search = self._last_search
+            radios = self._last_all_radios_dict.get("search")
+        if not last_search or radios is None:
+            return None
+        canonical_search_terms = get_canonical_search_terms(search_terms)
+        canonical_last_search = get_canonical_search_terms(last_search)
+        if len(canonical_search_terms) <= len(canonical_last_search) or \
+           not canonical_search_terms.startswith(canonical_last_search):
+            return None
+
+        _log.debug("Refining {0} results into {1}".format(last_search, search_terms))
+        words = canonical_search_terms.split()
+        refined_radios = [radio for radio in radios if self._is_radio_matching_words(radio, words, with_country=False)]
+        if filters:
+            refined_radios = self._filter_radios(refined_radios, filters)
+        return [(radio, self._get_model_data(radio, CATEGORIES.SEARCH_RADIO)) for radio in refined_radios]
+
+    def _get_category_radios(self, search_terms, plan, cancellable=None):
+        '''Yield the radios of the plan categories matching search_terms, without duplicates
+
+        The category sizes are recorded for the next plans.'''
+        words = get_canonical_search_terms(search_terms).split()
+        seen_ids = set()
+        for value in plan.values:
+            size = 0
+            for radio in OnlineRadioInfo().get_stations_by_category(plan.category_type, value, cancellable):
+                size += 1
+                if radio.id not in seen_ids and self._is_radio_matching_words(radio, words):
+                    seen_ids.add(radio.id)
+                    yield radio
+            self._query_planner.estimates.record_category(plan.category_type, value, size)
+
+    def _is_radio_matching_words(self, radio, words, with_country=True):
+        '''Return True if every canonical word is in the radio name, genres, country or city (if already loaded)
+
+        The country is only searched if with_country.'''
+        texts = [radio.name, radio.get_loaded_detail('city') or ''] + radio.genres
+        if with_country:
+            texts.append(radio.country)
+        searchable_text = get_canonical_search_terms(' '.join(texts))
+        for word in words:
+            if word not in searchable_text:
+                return False
+        return True
+
+    def _record_filter_uses(self, filters):
+        '''Count the use of the genre and country filters in the local station catalog, if used
+
+        Most used categories are synced first. Uses are only counted in memory
+        here, the catalog sync writes them.'''
+        radioinfo = OnlineRadioInfo()
+        if radioinfo.search_mode == SEARCH_NETWORK:
+            return
+        catalog = radioinfo.get_catalog()
+        for category_type in VOCABULARY_FILTERS:
+            for value in filters.get(category_type, ()):
+                catalog.record_category_use(category_type, value)
+
+    def _get_model_data(self, radio, category):
+        '''Return the model row of radio in category'''
+        return (str(radio.id), radio.picture_url, category, "text/html", radio.name, radio.current_track, "")
 
     def _return_active_filters(self, scope):
         '''Return current active filters for the scope
@@ -130,10 +358,30 @@ class RadioHandler(object):
         _log.debug("Returning active filters: {0}".format(filters))
         return filters
 
+    def _filter_radios_with_index(self, radios, filters):
+        '''Filter a radio list of the previous search, using its filter index
+
+        The index is built on first use and kept as long as the previous search.'''
+        with self._lock:
+            for category in self._last_all_radios_dict:
+                if self._last_all_radios_dict[category] is radios:
+                    break
+            else:
+                # not a radio list from the previous search
+                return self._filter_radios(radios, filters)
+            filter_index = self._last_filter_indexes.get(category)
+            if filter_index is None:
+                with tracing.span('filter index', radios=len(radios)):
+                    filter_index = FilterIndex(radios)
+                self._last_filter_indexes[category] = filter_index
+        with tracing.span('filter', radios=len(radios)):
+            return filter_index.filter(filters)
+
     def _filter_radios(self, radios, filters):
         '''Filter a radio set and return matching radios'''
         # in a list to keep the order as the radio came from the request
-        return [radio for radio in radios if self._is_radio_fulfill_filters(radio, filters)]
+        with tracing.span('filter', radios=len(radios)):
+            return [radio for radio in radios if self._is_radio_fulfill_filters(radio, filters)]
 
     def _is_radio_fulfill_filters(self, radio, filters):
         '''Return True if the radio should be part of the filtering result'''
@@ -143,9 +391,9 @@ class RadioHandler(object):
                 # initialize with false by default
                 if radio.decades:
                     valid = False
+                # decades are already converted to int when building the radio
                 for decade in radio.decades:
-                    radio_decade = transform_decade_str_in_int(decade)
-                    if radio_decade >= filters['decade'][0] and radio_decade <= filters['decade'][1]:
+                    if decade >= filters['decade'][0] and decade <= filters['decade'][1]:
                         valid = True
                         break
             elif category == "genre":
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+
+from .tools import save_json
+
+_log = logging.getLogger(__name__)
+
+# default maximum total size in bytes of the cached responses
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+# number of stored responses between two checks of the cache size
+PRUNE_INTERVAL = 100
+
+
+class CacheEntry(object):
+    '''A cached response with its revalidation informations'''
+
+    def __init__(self, body, etag=None, last_modified=None, timestamp=None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        if timestamp is None:
+            timestamp = time.time()
+        self.timestamp = timestamp
+
+    def is_fresh(self, ttl):
+        '''Return True if the entry is younger than ttl seconds'''
+        return time.time() - self.timestamp < ttl
+
+    def get_validation_headers(self):
+        '''Return the conditional request headers to revalidate this entry'''
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    '''Persistent on-disk cache of the online radio responses
+
+    Entries are keyed by (base url, path, canonical parameters) and stored one per file.
+    Beyond max_size bytes, the least recently used entries are removed: this is
+    checked on the first store, then every PRUNE_INTERVAL stores.'''
+
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._stores_before_prune = 0
+
+    @staticmethod
+    def make_key(base_url, path, parameters):
+        '''Return the cache key of a request, independant of the parameters order'''
+        canonical_parameters = urllib.parse.urlencode(sorted((key, str(value)) for key, value in parameters.items()))
+        raw_key = '{0}|{1}|{2}'.format(base_url, path, canonical_parameters)
+        return hashlib.sha1(raw_key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        '''Return the CacheEntry for key or None if there is no (valid) one'''
+        entry_path = self._get_entry_path(key)
+        try:
+            with open(entry_path, encoding='utf-8') as f:
+                data = json.load(f)
+            # the modification time orders the entries for pruning
+            os.utime(entry_path, None)
+            return CacheEntry(data['body'], data['etag'], data['last_modified'], data['timestamp'])
+        except (IOError, OSError):
+            return None
+        except (ValueError, KeyError) as error:
+            _log.debug('Ignoring corrupted cache entry {0}: {1}'.format(key, error))
+            return None
+
+    def store(self, key, body, etag=None, last_modified=None):
+        '''Store a new response for key and return the corresponding CacheEntry'''
+        entry = CacheEntry(body, etag, last_modified)
+        self._write(key, entry)
+        with self._lock:
+            self._stores_before_prune -= 1
+            prune = self._stores_before_prune <= 0
+            if prune:
+                self._stores_before_prune = PRUNE_INTERVAL
+        if prune:
+            self.prune()
+        return entry
+
+    def refresh(self, key, entry):
+        '''Mark entry as just revalidated'''
+        entry.timestamp = time.time()
+        self._write(key, entry)
+
+    def prune(self):
+        '''Remove the least recently used entries until the cache fits in max_size bytes'''
+        entries = []
+        try:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    path = os.path.join(self.cache_dir, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        except (IOError, OSError) as error:
+            _log.debug("Couldn't list the cache entries: {0}".format(error))
+            return
+        total_size = sum(size for (mtime, size, path) in entries)
+        if total_size <= self.max_size:
+            return
+        entries.sort()
+        for (mtime, size, path) in entries:
+            try:
+                os.remove(path)
+            except (IOError, OSError) as error:
+                _log.debug("Couldn't remove cache entry {0}: {1}".format(path, error))
+            total_size -= size
+            if total_size <= self.max_size:
+                break
+        _log.debug('Cache pruned to {0} bytes'.format(total_size))
+
+    def _get_entry_path(self, key):
+        return os.path.join(self.cache_dir, '{0}.json'.format(key))
+
+    def _write(self, key, entry):
+        '''Atomically write entry on disk. Failing to write the cache is never fatal'''
+        data = {'body': entry.body, 'etag': entry.etag, 'last_modified': entry.last_modified,
+                'timestamp': entry.timestamp}
+        try:
+            save_json(self._get_entry_path(key), data)
+        except (IOError, OSError, TypeError, ValueError) as error:
+            _log.warning("Couldn't write cache entry {0}: {1}".format(key, error))
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import logging
+import threading
+import time
+import unicodedata
+
+_log = logging.getLogger(__name__)
+
+# estimated memory of a radio without its strings, in bytes
+RADIO_BASE_SIZE = 400
+
+
+def get_canonical_search_terms(search_terms):
+    '''Return search_terms without case, accents and whitespaces differences'''
+    decomposed = unicodedata.normalize('NFKD', search_terms)
+    without_accents = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(without_accents.lower().split())
+
+
+def estimate_size(radios_dict):
+    '''Return the estimated memory used by the radios of radios_dict, in bytes'''
+    size = 0
+    for radios in radios_dict.values():
+        for radio in radios:
+            size += RADIO_BASE_SIZE + len(radio.name or '') + len(radio.picture_url or '') + \
+                len(radio.current_track or '') + sum(len(genre) for genre in radio.genres)
+    return size
+
+
+class SearchResultCache(object):
+    '''Bounded LRU cache of the radios found by previous searches
+
+    Entries are keyed by canonical search terms and evicted, least recently
+    used first, when there are more than max_entries or when their estimated
+    memory exceeds max_size bytes. Entries older than max_age seconds are
+    outdated (current tracks change) and never returned.'''
+
+    def __init__(self, max_entries=20, max_size=4 * 1024 * 1024, max_age=600):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        # canonical search terms: (radios_dict, size, timestamp)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, search_terms):
+        '''Return the radios dict cached for search_terms, or None'''
+        key = get_canonical_search_terms(search_terms)
+        with self._lock:
+            try:
+                (radios_dict, size, timestamp) = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            if time.time() - timestamp >= self.max_age:
+                self.size -= size
+                self.misses += 1
+                return None
+            self._entries[key] = (radios_dict, size, timestamp)
+            self.hits += 1
+        _log.debug("Search results cache hit for {0} ({1} hits, {2} misses)".format(search_terms, self.hits,
+                                                                                    self.misses))
+        return radios_dict
+
+    def store(self, search_terms, radios_dict):
+        '''Cache the radios dict found for search_terms, evicting old entries if needed'''
+        key = get_canonical_search_terms(search_terms)
+        size = estimate_size(radios_dict)
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            if size > self.max_size:
+                _log.debug("Not caching {0} results, too big: {1} bytes".format(search_terms, size))
+                return
+            self._entries[key] = (radios_dict, size, time.time())
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                (evicted_key, evicted_entry) = self._entries.popitem(last=False)
+                self.size -= evicted_entry[1]
+                _log.debug("Evicting {0} from the search results cache".format(evicted_key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
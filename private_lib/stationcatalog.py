@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from .searchcache import get_canonical_search_terms
+
+_log = logging.getLogger(__name__)
+
+# bump when the schema changes, older catalogs are then rebuilt
+CATALOG_VERSION = 2
+
+# station fields changing all the time, not worth an update of the catalog
+VOLATILE_FIELDS = ('currentTrack',)
+
+_TABLES = ('stations', 'stations_index', 'categories', 'category_stations')
+_SCHEMA = ('CREATE TABLE stations (id INTEGER PRIMARY KEY, rank INTEGER, rating INTEGER, digest TEXT, data TEXT)',
+           # texts are canonical search terms, docid is the station id
+           'CREATE VIRTUAL TABLE stations_index USING fts4(name, genres, country, city)',
+           # synced is the time of the last sync of the category, uses how many times it was used
+           'CREATE TABLE categories (category_type TEXT, value TEXT, synced REAL, uses INTEGER DEFAULT 0, '
+           'PRIMARY KEY (category_type, value))',
+           'CREATE TABLE category_stations (category_type TEXT, value TEXT, station_id INTEGER, '
+           'PRIMARY KEY (category_type, value, station_id))',
+           'CREATE INDEX category_stations_by_station ON category_stations (station_id)')
+
+
+def get_digest(json_radio):
+    '''Return a digest of the json_radio data, ignoring the VOLATILE_FIELDS'''
+    data = dict((key, value) for (key, value) in json_radio.items() if key not in VOLATILE_FIELDS)
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_match_expression(search_string):
+    '''Return the full-text query matching stations with every word of search_string as prefix'''
+    return ' '.join('{0}*'.format(word) for word in re.findall(r'\w+', get_canonical_search_terms(search_string)))
+
+
+class StationCatalog(object):
+    '''Local catalog of the radio website stations, with a full-text index
+
+    The station json data is stored as received, and indexed by name, genres,
+    country and city (if present). The catalog is emptied if it was built for
+    another website than source_url or by another version.
+    Stations can be synced by category (like genre Jazz), keeping track of the
+    categories freshness and uses. Stations in no category anymore are removed.
+    Uses are counted in memory, and only written by flush_category_uses.
+    It can be used from any thread.'''
+
+    def __init__(self, path, source_url):
+        self.path = path
+        self.source_url = source_url
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # (category type, value): uses not written yet
+        self._pending_uses = collections.Counter()
+        self._uses_lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+            if self._get_metadata('version') != str(CATALOG_VERSION) or \
+               self._get_metadata('source_url') != source_url:
+                _log.debug('Resetting the station catalog for {0}'.format(source_url))
+                for table in _TABLES:
+                    self._connection.execute('DROP TABLE IF EXISTS {0}'.format(table))
+                self._connection.execute('DELETE FROM metadata')
+                for statement in _SCHEMA:
+                    self._connection.execute(statement)
+                self._set_metadata('version', str(CATALOG_VERSION))
+                self._set_metadata('source_url', source_url)
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM stations').fetchone()[0]
+
+    def store(self, json_radios):
+        '''Add or replace the stations of the json_radios iterable, return how many there were'''
+        count = 0
+        with self._lock, self._connection:
+            for json_radio in json_radios:
+                self._write_station(json_radio, get_digest(json_radio))
+                count += 1
+        return count
+
+    def sync_category(self, category_type, value, json_radios, sync_time):
+        '''Make the category stations the json_radios list, received at sync_time
+
+        Only new and changed stations are written, and stations of no category
+        anymore are deleted.
+        Return a (inserted, updated, deleted) tuple of station counts.'''
+        (inserted, updated, deleted) = (0, 0, 0)
+        with self._lock, self._connection:
+            digests = dict(self._connection.execute('SELECT id, digest FROM stations WHERE id IN '
+                                                    '(SELECT station_id FROM category_stations '
+                                                    'WHERE category_type = ? AND value = ?)', (category_type, value)))
+            new_ids = set()
+            for json_radio in json_radios:
+                station_id = json_radio['id']
+                new_ids.add(station_id)
+                digest = get_digest(json_radio)
+                if station_id in digests:
+                    if digests[station_id] == digest:
+                        continue
+                    updated += 1
+                else:
+                    # can be in another category already
+                    row = self._connection.execute('SELECT digest FROM stations WHERE id = ?', (station_id,)).fetchone()
+                    self._connection.execute('INSERT OR IGNORE INTO category_stations VALUES (?, ?, ?)',
+                                             (category_type, value, station_id))
+                    if row is None:
+                        inserted += 1
+                    elif row[0] == digest:
+                        continue
+                    else:
+                        updated += 1
+                self._write_station(json_radio, digest)
+            removed_ids = [station_id for station_id in digests if station_id not in new_ids]
+            self._connection.executemany('DELETE FROM category_stations WHERE category_type = ? AND value = ? '
+                                         'AND station_id = ?',
+                                         [(category_type, value, station_id) for station_id in removed_ids])
+            for station_id in removed_ids:
+                if self._connection.execute('SELECT 1 FROM category_stations WHERE station_id = ?',
+                                            (station_id,)).fetchone() is None:
+                    self._delete_station(station_id)
+                    deleted += 1
+            self._connection.execute('UPDATE categories SET synced = ? WHERE category_type = ? AND value = ?',
+                                     (sync_time, category_type, value))
+        return (inserted, updated, deleted)
+
+    def set_categories(self, category_type, values):
+        '''Make values the categories of category_type, forgetting the other ones and their stations'''
+        with self._lock, self._connection:
+            old_values = set(value for (value,) in self._connection.execute(
+                'SELECT value FROM categories WHERE category_type = ?', (category_type,)))
+            for value in values:
+                if value not in old_values:
+                    self._connection.execute('INSERT INTO categories (category_type, value) VALUES (?, ?)',
+                                             (category_type, value))
+            for value in old_values.difference(values):
+                _log.debug('Removing the catalog category {0} {1}'.format(category_type, value))
+                self._connection.execute('DELETE FROM categories WHERE category_type = ? AND value = ?',
+                                         (category_type, value))
+                station_ids = [station_id for (station_id,) in self._connection.execute(
+                    'SELECT station_id FROM category_stations WHERE category_type = ? AND value = ?',
+                    (category_type, value))]
+                self._connection.execute('DELETE FROM category_stations WHERE category_type = ? AND value = ?',
+                                         (category_type, value))
+                for station_id in station_ids:
+                    if self._connection.execute('SELECT 1 FROM category_stations WHERE station_id = ?',
+                                                (station_id,)).fetchone() is None:
+                        self._delete_station(station_id)
+
+    def get_due_categories(self, synced_before):
+        '''Return the (category type, value) of the categories not synced since synced_before
+
+        The never synced ones come first, then the most used and the least recently synced.'''
+        with self._lock:
+            return self._connection.execute('SELECT category_type, value FROM categories '
+                                            'WHERE synced IS NULL OR synced < ? '
+                                            'ORDER BY synced IS NOT NULL, uses DESC, synced', (synced_before,)).fetchall()
+
+    def record_category_use(self, category_type, value):
+        '''Count a use of the category, to sync it before the other ones. Nothing is written yet'''
+        with self._uses_lock:
+            self._pending_uses[(category_type, value)] += 1
+
+    def flush_category_uses(self):
+        '''Write the category uses counted since the last flush'''
+        with self._uses_lock:
+            pending_uses = self._pending_uses
+            self._pending_uses = collections.Counter()
+        if not pending_uses:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany('UPDATE categories SET uses = uses + ? WHERE category_type = ? AND value = ?',
+                                         [(uses, category_type, value)
+                                          for ((category_type, value), uses) in pending_uses.items()])
+
+    def search(self, search_string, limit=1000):
+        '''Return the json data of the stations matching every word of search_string
+
+        Most popular stations (lower rank, then higher rating) come first.'''
+        match_expression = get_match_expression(search_string)
+        if not match_expression:
+            return []
+        with self._lock:
+            rows = self._connection.execute('SELECT stations.data FROM stations_index '
+                                            'JOIN stations ON stations.id = stations_index.docid '
+                                            'WHERE stations_index MATCH ? '
+                                            'ORDER BY stations.rank IS NULL, stations.rank, stations.rating DESC '
+                                            'LIMIT ?', (match_expression, limit)).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def get_crawl_time(self):
+        '''Return the time of the last complete crawl, None if never crawled'''
+        with self._lock:
+            crawl_time = self._get_metadata('crawl_time')
+        return None if crawl_time is None else float(crawl_time)
+
+    def set_crawl_time(self, crawl_time):
+        with self._lock, self._connection:
+            self._set_metadata('crawl_time', repr(crawl_time))
+
+    def close(self):
+        self.flush_category_uses()
+        with self._lock:
+            self._connection.close()
+
+    def _write_station(self, json_radio, digest):
+        station_id = json_radio['id']
+        self._connection.execute('INSERT OR REPLACE INTO stations VALUES (?, ?, ?, ?, ?)',
+                                 (station_id, json_radio.get('rank'), json_radio.get('rating'), digest,
+                                  json.dumps(json_radio)))
+        self._connection.execute('DELETE FROM stations_index WHERE docid = ?', (station_id,))
+        self._connection.execute('INSERT INTO stations_index (docid, name, genres, country, city) '
+                                 'VALUES (?, ?, ?, ?, ?)',
+                                 (station_id, get_canonical_search_terms(json_radio.get('name') or ''),
+                                  get_canonical_search_terms(json_radio.get('genresAndTopics') or ''),
+                                  get_canonical_search_terms(json_radio.get('country') or ''),
+                                  get_canonical_search_terms(json_radio.get('city') or '')))
+
+    def _delete_station(self, station_id):
+        self._connection.execute('DELETE FROM stations WHERE id = ?', (station_id,))
+        self._connection.execute('DELETE FROM stations_index WHERE docid = ?', (station_id,))
+
+    def _get_metadata(self, key):
+        row = self._connection.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _set_metadata(self, key, value):
+        self._connection.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?)', (key, value))
@@ -0,0 +1,26 @@
+
+'''Radios shared by the tests, in the json format of the radio website or as Radio objects'''
+
+from ..radio import Radio
+
+
+def make_json_radio(radio_id, name, genres='Rock', country='France', rank=100, rating=0, city=None):
+    json_radio = {'id': radio_id, 'name': name, 'genresAndTopics': genres, 'country': country, 'rank': rank,
+                  'rating': rating, 'pictureBaseURL': 'http://static/', 'picture1Name': 'radio.png',
+                  'currentTrack': 'A track'}
+    if city:
+        json_radio['city'] = city
+    return json_radio
+
+
+def make_radio(radio_id, name, city=None, **kwargs):
+    '''Return a Radio without details, except for city if given'''
+    radio = Radio(make_json_radio(radio_id, name, **kwargs), None)
+    if city:
+        radio.city = city
+    return radio
+
+
+def make_radios_dict(name, num_radios=1):
+    '''Return search results of num_radios radios named name'''
+    return {'search': [make_radio(i, name) for i in range(num_radios)]}
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Local stand-in of the rad.io json API, serving the recorded test fixtures
+
+Latency, bandwidth, error rate and catalog size can be set, for offline and
+repeatable measurements of the networking code. Run it from the top directory:
+    python3 -m private_lib.tests.replayserver --port 8080 --latency 0.2
+and select it as the radio website with:
+    UNITY_LENS_RADIOS_URL=http://127.0.0.1:8080/info ./unity-lens-radios'''
+
+import argparse
+import gzip
+import hashlib
+import http.server
+import json
+import os
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+API_PREFIX = '/info/'
+PLAYLIST_PREFIX = '/playlists/'
+PLAYLISTS = ('valid.m3u', 'valid.pls', 'invalid.m3u', 'invalid.pls')
+# size of the chunks written when throttling the bandwidth
+THROTTLE_CHUNK_SIZE = 4096
+
+
+def load_fixture(dataid):
+    with open(os.path.join(DATA_DIR, dataid), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ReplayCatalog(object):
+    '''Radios served by the replay server
+
+    The recorded search radios are repeated scale times, with new ids and
+    names, to get bigger catalogs.'''
+
+    def __init__(self, scale=1):
+        base_radios = load_fixture('radios_by_search')
+        self.radios = []
+        for copy in range(scale):
+            for radio in base_radios:
+                if copy:
+                    radio = dict(radio)
+                    radio['id'] = radio['id'] + copy * 1000000
+                    radio['name'] = '{0} #{1}'.format(radio['name'], copy)
+                self.radios.append(radio)
+        self._radios_by_id = dict((radio['id'], radio) for radio in self.radios)
+
+    def search(self, query, start=0, rows=None):
+        '''Return the radios matching every word of query in their name, genres or country'''
+        words = query.lower().split()
+        matching_radios = []
+        for radio in self.radios:
+            text = ' '.join((radio['name'], radio['genresAndTopics'], radio['country'])).lower()
+            if all(word in text for word in words):
+                matching_radios.append(radio)
+        if rows is None:
+            return matching_radios[start:]
+        return matching_radios[start:start + rows]
+
+    def get_radios_of_category(self, category, value):
+        if category == '_top':
+            return load_fixture('top_stations')
+        if category == '_country':
+            return [radio for radio in self.radios if radio['country'] == value]
+        return [radio for radio in self.radios if value in [genre.strip() for genre in radio['genresAndTopics'].split(',')]]
+
+    def get_category_values(self, category):
+        if category == '_genre':
+            return load_fixture('availablecategory_per_genre')
+        if category == '_country':
+            return sorted(set(radio['country'] for radio in self.radios))
+        return []
+
+    def get_details(self, radio_id, playlist_url):
+        '''Return the details of radio_id, based on the recorded ones'''
+        radio = self._radios_by_id.get(radio_id)
+        if radio is None:
+            return load_fixture('invalid_radio_by_id')
+        details = load_fixture('radio_by_id2511')
+        for key in ('id', 'name', 'country', 'currentTrack', 'pictureBaseURL', 'picture1Name'):
+            details[key] = radio[key]
+        details['streamURL'] = playlist_url
+        return details
+
+
+class ReplayHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, don't wait for the delayed ack
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path
+        parameters = dict(urllib.parse.parse_qsl(url.query))
+        with self.server.lock:
+            self.server.requests.append(path)
+            failing = self.server.random.random() < self.server.error_rate
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if failing:
+            self._reply(500, b'Replayed internal error', 'text/plain')
+            return
+
+        if path.startswith(PLAYLIST_PREFIX) and path[len(PLAYLIST_PREFIX):] in PLAYLISTS:
+            with open(os.path.join(DATA_DIR, path[len(PLAYLIST_PREFIX):]), 'rb') as f:
+                self._reply(200, f.read(), 'audio/x-scpls')
+            return
+        if not path.startswith(API_PREFIX):
+            self._reply(404, b'Not found', 'text/plain')
+            return
+        content = self._get_api_content(path[len(API_PREFIX):], parameters)
+        if content is None:
+            self._reply(404, b'Not found', 'text/plain')
+            return
+        self._reply(200, json.dumps(content).encode('utf-8'), 'application/json; charset=UTF-8')
+
+    def _get_api_content(self, api_path, parameters):
+        catalog = self.server.catalog
+        if api_path == 'index/searchembeddedbroadcast':
+            return catalog.search(parameters.get('q', ''), int(parameters.get('start', 0)),
+                                  int(parameters['rows']) if 'rows' in parameters else None)
+        elif api_path == 'account/getmostwantedbroadcastlists':
+            return load_fixture('mostwanted_stations')
+        elif api_path == 'broadcast/editorialreccomendationsembedded':
+            return load_fixture('recommended_stations')
+        elif api_path == 'menu/valuesofcategory':
+            return catalog.get_category_values(parameters.get('category'))
+        elif api_path == 'menu/broadcastsofcategory':
+            return catalog.get_radios_of_category(parameters.get('category'), parameters.get('value', ''))
+        elif api_path == 'broadcast/getbroadcastembedded':
+            playlist_url = 'http://{0}:{1}{2}valid.pls'.format(self.server.server_address[0],
+                                                               self.server.server_address[1], PLAYLIST_PREFIX)
+            try:
+                return catalog.get_details(int(parameters.get('broadcast')), playlist_url)
+            except (TypeError, ValueError):
+                return load_fixture('invalid_radio_by_id')
+        return None
+
+    def _reply(self, status, body, content_type):
+        '''Send body, handling conditional requests, gzip encoding and bandwidth throttling'''
+        etag = '"{0}"'.format(hashlib.sha1(body).hexdigest())
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if status == 200:
+            self.send_header('ETag', etag)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not self.server.bandwidth:
+            self.wfile.write(body)
+            return
+        for i in range(0, len(body), THROTTLE_CHUNK_SIZE):
+            chunk = body[i:i + THROTTLE_CHUNK_SIZE]
+            self.wfile.write(chunk)
+            self.wfile.flush()
+            time.sleep(len(chunk) / self.server.bandwidth)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ReplayServer(object):
+    '''Serve the rad.io api fixtures from a local thread
+
+    latency is the time in seconds before each reply, bandwidth the maximum
+    bytes per second of each reply (None for unlimited), error_rate the
+    probability of replying an internal error and scale the number of times
+    the search catalog is repeated. seed makes the errors reproducible.'''
+
+    def __init__(self, latency=0, bandwidth=None, error_rate=0, scale=1, seed=None, port=0):
+        self._server = _ThreadingServer(('127.0.0.1', port), ReplayHandler)
+        self._server.latency = latency
+        self._server.bandwidth = bandwidth
+        self._server.error_rate = error_rate
+        self._server.catalog = ReplayCatalog(scale)
+        self._server.random = random.Random(seed)
+        self._server.lock = threading.Lock()
+        self._server.connections = 0
+        self._server.requests = []
+        self._thread = None
+
+    @property
+    def base_url(self):
+        '''Radio website url to give to OnlineRadioInfo'''
+        return 'http://127.0.0.1:{0}{1}'.format(self._server.server_port, API_PREFIX.rstrip('/'))
+
+    @property
+    def connections(self):
+        '''Number of connections accepted so far'''
+        return self._server.connections
+
+    @property
+    def requests(self):
+        '''Paths requested so far'''
+        return list(self._server.requests)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='rad.io api replay server')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0, help='seconds before each reply')
+    parser.add_argument('--bandwidth', type=int, default=None, help='maximum bytes per second of each reply')
+    parser.add_argument('--error-rate', dest='error_rate', type=float, default=0,
+                        help='probability of replying an internal error')
+    parser.add_argument('--scale', type=int, default=1, help='number of times the search catalog is repeated')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    server = ReplayServer(args.latency, args.bandwidth, args.error_rate, args.scale, args.seed, args.port).start()
+    print('Serving {0}'.format(server.base_url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from mock import patch
+import threading
+import unittest
+
+from ..batchappender import BatchAppender
+
+
+class FakeMainLoop(object):
+    '''Mimic GLib idle callbacks, run on demand'''
+
+    def __init__(self):
+        self.sources = []
+
+    def idle_add(self, function):
+        self.sources.append(function)
+
+    def iterate(self):
+        '''Run each idle callback once, dropping the ones returning False'''
+        self.sources = [function for function in self.sources if function()]
+
+
+class BatchAppenderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = FakeMainLoop()
+        self.calls = []
+        self.appender = BatchAppender(self.loop.idle_add, batch_size=3, time_budget=10)
+
+    def test_calls_run_in_batches(self):
+        '''Test that calls are run in order, batch_size per main loop iteration'''
+        for i in range(7):
+            self.appender.append(self.calls.append, i)
+        self.assertEqual(len(self.loop.sources), 1)
+        self.assertEqual(self.calls, [])
+        self.loop.iterate()
+        self.assertEqual(self.calls, [0, 1, 2])
+        self.loop.iterate()
+        self.loop.iterate()
+        self.assertEqual(self.calls, list(range(7)))
+        self.assertEqual(self.loop.sources, [])
+        self.assertEqual(len(self.appender), 0)
+
+    def test_reschedule_after_empty(self):
+        '''Test that a new batch is scheduled for calls appended once the queue is empty'''
+        self.appender.append(self.calls.append, 0)
+        self.loop.iterate()
+        self.assertEqual(self.loop.sources, [])
+        self.appender.append(self.calls.append, 1)
+        self.assertEqual(len(self.loop.sources), 1)
+        self.loop.iterate()
+        self.assertEqual(self.calls, [0, 1])
+
+    @patch('private_lib.batchappender.time.time')
+    def test_time_budget(self, timemock):
+        '''Test that a batch stops once its time budget is spent'''
+        timemock.side_effect = range(100)
+        self.appender.time_budget = 1.5
+        for i in range(3):
+            self.appender.append(self.calls.append, i)
+        self.loop.iterate()
+        self.assertEqual(self.calls, [0, 1])
+        self.assertEqual(len(self.loop.sources), 1)
+
+    def test_failing_call(self):
+        '''Test that a failing call doesn't stop the other calls, nor the next batches'''
+        def fail(i):
+            raise ValueError(i)
+        self.appender.append(self.calls.append, 0)
+        self.appender.append(fail, 1)
+        self.appender.append(self.calls.append, 2)
+        self.loop.iterate()
+        self.assertEqual(self.calls, [0, 2])
+        self.assertEqual(self.loop.sources, [])
+        self.appender.append(fail, 3)
+        self.loop.iterate()
+        self.appender.append(self.calls.append, 4)
+        self.assertEqual(len(self.loop.sources), 1)
+        self.loop.iterate()
+        self.assertEqual(self.calls, [0, 2, 4])
+
+    def test_append_from_threads(self):
+        '''Test appending calls from several threads at once'''
+        self.appender.batch_size = 1000
+
+        def append_calls(start):
+            for i in range(start, start + 100):
+                self.appender.append(self.calls.append, i)
+        threads = [threading.Thread(target=append_calls, args=(start,)) for start in range(0, 400, 100)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        while self.loop.sources:
+            self.loop.iterate()
+        self.assertEqual(sorted(self.calls), list(range(400)))
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..catalogsync import CatalogSync
+from ..stationcatalog import StationCatalog
+from ..tools import Cancellable, CancelledError
+from .fixtures import make_json_radio
+
+
+class FakeRadioInfo(object):
+    '''Mimic OnlineRadioInfo with stations by category, each response costing 100 bytes'''
+
+    CATALOG_CATEGORY_TYPES = ('country', 'genre')
+
+    def __init__(self, stations):
+        # {(category type, value): json radios}
+        self.stations = stations
+        self.requests = []
+        self.received_bytes = 0
+
+    def get_categories_by_category_type(self, category_type):
+        return sorted(value for (stations_category_type, value) in self.stations
+                      if stations_category_type == category_type)
+
+    def get_json_stations_by_category(self, category_type, value, cancellable=None):
+        self.requests.append((category_type, value))
+        self.received_bytes += 100
+        return iter(self.stations[(category_type, value)])
+
+    def get_received_bytes(self):
+        return self.received_bytes
+
+
+class CatalogSyncTests(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog_dir = tempfile.mkdtemp()
+        self.catalog = StationCatalog(os.path.join(self.catalog_dir, 'catalog.sqlite'), 'http://rad.io/info')
+        self.radioinfo = FakeRadioInfo({('country', 'France'): [make_json_radio(1, 'Jazz Radio', genres='Jazz'),
+                                                                make_json_radio(2, 'Rock FM')],
+                                        ('genre', 'Jazz'): [make_json_radio(1, 'Jazz Radio', genres='Jazz')],
+                                        ('genre', 'Rock'): [make_json_radio(2, 'Rock FM')]})
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.catalog_dir)
+
+    def test_initial_sync(self):
+        '''Test that a first sync inserts every station once'''
+        stats = CatalogSync(self.radioinfo, self.catalog, budget=None).run()
+        self.assertEqual(stats, {'categories': 3, 'inserted': 2, 'updated': 0, 'deleted': 0,
+                                 'budget_exhausted': False, 'received_bytes': 300})
+        self.assertEqual(len(self.catalog), 2)
+
+    def test_incremental_sync(self):
+        '''Test that only the changes are applied, volatile fields not being a change'''
+        CatalogSync(self.radioinfo, self.catalog, max_age=0, budget=None).run()
+        changed_radio = make_json_radio(2, 'Rock FM', rating=5)
+        self.radioinfo.stations[('country', 'France')] = [make_json_radio(1, 'Jazz Radio', genres='Jazz'),
+                                                          changed_radio, make_json_radio(3, 'Radio Paris')]
+        self.radioinfo.stations[('genre', 'Rock')] = [changed_radio]
+        self.radioinfo.stations[('genre', 'Jazz')] = [dict(make_json_radio(1, 'Jazz Radio', genres='Jazz'),
+                                                           currentTrack='Miles Davis - So What')]
+        stats = CatalogSync(self.radioinfo, self.catalog, max_age=0, budget=None).run()
+        self.assertEqual((stats['inserted'], stats['updated'], stats['deleted']), (1, 1, 0))
+        self.assertEqual(self.catalog.search('rock')[0]['rating'], 5)
+        self.assertEqual(len(self.catalog.search('paris')), 1)
+
+    def test_deleted_stations(self):
+        '''Test that stations are deleted once they are in no category anymore'''
+        CatalogSync(self.radioinfo, self.catalog, max_age=0, budget=None).run()
+        self.radioinfo.stations[('genre', 'Jazz')] = []
+        stats = CatalogSync(self.radioinfo, self.catalog, max_age=0, budget=None).run()
+        # still in France
+        self.assertEqual(stats['deleted'], 0)
+        self.assertEqual(len(self.catalog.search('jazz')), 1)
+        self.radioinfo.stations[('country', 'France')] = [make_json_radio(2, 'Rock FM')]
+        stats = CatalogSync(self.radioinfo, self.catalog, max_age=0, budget=None).run()
+        self.assertEqual(stats['deleted'], 1)
+        self.assertEqual(self.catalog.search('jazz'), [])
+        # a removed category removes its stations too
+        del(self.radioinfo.stations[('genre', 'Rock')])
+        self.radioinfo.stations[('country', 'France')] = []
+        CatalogSync(self.radioinfo, self.catalog, max_age=0, budget=None).run()
+        self.assertEqual(len(self.catalog), 0)
+
+    def test_freshness(self):
+        '''Test that recently synced categories aren't synced again'''
+        CatalogSync(self.radioinfo, self.catalog, budget=None).run()
+        self.radioinfo.requests = []
+        self.assertEqual(CatalogSync(self.radioinfo, self.catalog, budget=None).run()['categories'], 0)
+        self.assertEqual(self.radioinfo.requests, [])
+
+    def test_most_used_first_and_budget(self):
+        '''Test that the most used categories are synced first, until the budget is exhausted'''
+        CatalogSync(self.radioinfo, self.catalog, budget=None).run()
+        self.catalog.record_category_use('genre', 'Rock')
+        self.radioinfo.requests = []
+        stats = CatalogSync(self.radioinfo, self.catalog, max_age=0, budget=150).run()
+        self.assertTrue(stats['budget_exhausted'])
+        self.assertEqual(stats['categories'], 2)
+        self.assertEqual(self.radioinfo.requests, [('genre', 'Rock'), ('country', 'France')])
+
+    def test_cancelled(self):
+        '''Test that a cancelled sync stops'''
+        cancellable = Cancellable()
+        cancellable.cancel()
+        self.assertRaises(CancelledError, CatalogSync(self.radioinfo, self.catalog).run, cancellable)
+        self.assertEqual(self.radioinfo.requests, [])
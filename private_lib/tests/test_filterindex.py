@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import json
+import os
+import unittest
+
+from ..filterindex import FilterIndex
+from ..radio import Radio
+
+
+def is_radio_fulfill_filters(radio, filters):
+    '''Straightforward filtering of a radio, as a reference'''
+    if 'decade' in filters and radio.decades:
+        if not [decade for decade in radio.decades if filters['decade'][0] <= decade <= filters['decade'][1]]:
+            return False
+    if 'genre' in filters and [genre for genre in radio.genres if genre not in filters['genre']]:
+        return False
+    if 'country' in filters and radio.country not in filters['country']:
+        return False
+    return True
+
+
+class FilterIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        radio_attributes = {'name': "Radio1", "pictureBaseURL": "/root/", "picture1Name": "foo.png",
+                            "genresAndTopics": "Rock, Techno, Années 90s, Years 2100",
+                            'currentTrack': "Radio1 current track", "country": "France", "rating": 5, "id": 1}
+        self.radio1 = Radio(radio_attributes, None)
+        radio_attributes.update({"genresAndTopics": "Rock, Années 70s", "country": "UK", "id": 2})
+        self.radio2 = Radio(radio_attributes, None)
+        radio_attributes.update({"genresAndTopics": "Jazz", "country": "France", "id": 3})
+        self.radio3 = Radio(radio_attributes, None)
+        self.index = FilterIndex([self.radio1, self.radio2, self.radio3])
+
+    def test_no_filter(self):
+        '''Test that all radios are returned without any filter'''
+        self.assertEqual(self.index.filter({}), [self.radio1, self.radio2, self.radio3])
+
+    def test_country_filter(self):
+        '''Test filtering by countries'''
+        self.assertEqual(self.index.filter({'country': {'France'}}), [self.radio1, self.radio3])
+        self.assertEqual(self.index.filter({'country': {'France', 'UK'}}), [self.radio1, self.radio2, self.radio3])
+        self.assertEqual(self.index.filter({'country': {'Germany'}}), [])
+
+    def test_genre_filter(self):
+        '''Test that all genres of a radio need to be selected'''
+        self.assertEqual(self.index.filter({'genre': {'Rock'}}), [self.radio2])
+        self.assertEqual(self.index.filter({'genre': {'Rock', 'Techno'}}), [self.radio1, self.radio2])
+        self.assertEqual(self.index.filter({'genre': ['Jazz', 'Blues']}), [self.radio3])
+
+    def test_decade_filter(self):
+        '''Test filtering by decade range, radios without decades always matching'''
+        self.assertEqual(self.index.filter({'decade': (1990, 2000)}), [self.radio1, self.radio3])
+        self.assertEqual(self.index.filter({'decade': [1960, 1980]}), [self.radio2, self.radio3])
+        self.assertEqual(self.index.filter({'decade': (2010, 2010)}), [self.radio3])
+
+    def test_combined_filters(self):
+        '''Test that combined filters are all applied'''
+        self.assertEqual(self.index.filter({'decade': (1990, 2000), 'genre': {'Rock', 'Techno'}, 'country': {'France'}}),
+                         [self.radio1])
+
+    def test_empty_index(self):
+        '''Test filtering an empty list'''
+        self.assertEqual(FilterIndex([]).filter({'country': {'France'}, 'decade': (1990, 2000)}), [])
+
+    def test_same_result_as_reference(self):
+        '''Test filter combinations on real data, compared to a straightforward filtering'''
+        with open(os.path.join(os.path.dirname(__file__), "data", "radios_by_search"), encoding='utf-8') as f:
+            radios = [Radio(data, None) for data in json.load(f)]
+        index = FilterIndex(radios)
+        genres = sorted(set(genre for radio in radios for genre in radio.genres))
+        countries = sorted(set(radio.country for radio in radios))
+        all_filters = {'decade': [(0, 1960), (1980, 1990), (2000, 2010)],
+                       'genre': [set(genres[:10]), set(genres[::2]), {'Pop', 'Rock', 'Dance'}],
+                       'country': [{'France'}, set(countries[:5]), {'Germany', 'USA'}]}
+        for categories_count in range(4):
+            for categories in itertools.combinations(sorted(all_filters), categories_count):
+                for values in itertools.product(*[all_filters[category] for category in categories]):
+                    filters = dict(zip(categories, values))
+                    self.assertEqual(index.filter(filters),
+                                     [radio for radio in radios if is_radio_fulfill_filters(radio, filters)])
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..filtersnapshot import FilterSnapshot, SNAPSHOT_VERSION
+
+
+class FilterSnapshotTests(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.snapshot_dir, 'cache', 'filters.json')
+        self.snapshot = FilterSnapshot(self.path, 'http://rad.io/info')
+        self.vocabularies = {'genre': ["Rock", "Jazz"], 'country': ["France"]}
+
+    def tearDown(self):
+        shutil.rmtree(self.snapshot_dir)
+
+    def test_no_snapshot(self):
+        self.assertEqual(self.snapshot.load(), None)
+
+    def test_save_and_load(self):
+        '''Test that saved vocabularies are loaded back, creating the directory if needed'''
+        self.snapshot.save(self.vocabularies)
+        self.assertEqual(self.snapshot.load(), self.vocabularies)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['filters.json'])
+
+    def test_other_website(self):
+        '''Test that a snapshot of another website is ignored'''
+        self.snapshot.save(self.vocabularies)
+        self.assertEqual(FilterSnapshot(self.path, 'http://radio.fr/info').load(), None)
+
+    def test_other_version(self):
+        '''Test that a snapshot of another version is ignored'''
+        self.snapshot.save(self.vocabularies)
+        with open(self.path) as f:
+            data = json.load(f)
+        data['version'] = SNAPSHOT_VERSION + 1
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+        self.assertEqual(self.snapshot.load(), None)
+
+    def test_corrupted_snapshot(self):
+        '''Test that corrupted or invalid snapshots are ignored'''
+        os.makedirs(os.path.dirname(self.path))
+        for content in ('{"version": ', '[]', '{"version": 1}'):
+            with open(self.path, 'w') as f:
+                f.write(content)
+            self.assertEqual(self.snapshot.load(), None)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import http.server
+import socketserver
+import threading
+import time
+import unittest
+import zlib
+
+from ..httppool import ConnectionPool, TransportError
+from ..tools import Cancellable, CancelledError
+
+BODY = b'[' + b','.join(b'{"id": ' + str(i).encode('ascii') + b'}' for i in range(2000)) + b']'
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append(self.headers)
+        if self.path == '/redirect':
+            self._reply(302, b'', {'Location': '/plain'})
+            return
+        if self.path == '/slow':
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(BODY)))
+            self.end_headers()
+            for i in range(0, len(BODY), 100):
+                self.wfile.write(BODY[i:i + 100])
+                self.wfile.flush()
+                time.sleep(0.1)
+            return
+        if self.path == '/close':
+            self._reply(200, BODY, {'Connection': 'close'})
+            self.close_connection = True
+            return
+        accept_encoding = self.headers.get('Accept-Encoding', '')
+        if self.path == '/gzip' and 'gzip' in accept_encoding:
+            self._reply(200, gzip.compress(BODY), {'Content-Encoding': 'gzip'})
+        elif self.path == '/deflate' and 'deflate' in accept_encoding:
+            self._reply(200, zlib.compress(BODY), {'Content-Encoding': 'deflate'})
+        else:
+            self._reply(200, BODY)
+
+    def _reply(self, status, body, headers={}):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        for header in headers:
+            self.send_header(header, headers[header])
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class ConnectionPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.server.connections = 0
+        self.server.requests = []
+        self.server_thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05})
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+        self.pool = ConnectionPool(pool_size=2, idle_timeout=30)
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+
+    def test_plain_request(self):
+        '''Test getting a plain response'''
+        (status, headers, body) = self.pool.request(self.base_url + '/plain')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers.get_content_charset(), 'utf-8')
+        self.assertEqual(body, BODY)
+
+    def test_connection_reused(self):
+        '''Test that sequential requests are reusing the same connection'''
+        for i in range(5):
+            self.assertEqual(self.pool.request(self.base_url + '/plain')[2], BODY)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_compression_requested(self):
+        '''Test that the responses are requested compressed'''
+        self.pool.request(self.base_url + '/plain')
+        self.assertEqual(self.server.requests[0]['Accept-Encoding'], 'gzip, deflate')
+
+    def test_gzip_decompression(self):
+        '''Test that gzip responses are decompressed, and the connection reused'''
+        self.assertEqual(self.pool.request(self.base_url + '/gzip')[2], BODY)
+        self.assertEqual(self.pool.request(self.base_url + '/gzip')[2], BODY)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_deflate_decompression(self):
+        '''Test that deflate responses are decompressed'''
+        self.assertEqual(self.pool.request(self.base_url + '/deflate')[2], BODY)
+
+    def test_streaming_read(self):
+        '''Test that a compressed body can be read chunk by chunk'''
+        response = self.pool.open(self.base_url + '/gzip')
+        chunks = []
+        while True:
+            chunk = response.read(100)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(b''.join(chunks), BODY)
+        self.assertTrue(response.bytes_received < len(BODY))
+
+    def test_additional_headers(self):
+        '''Test sending additional headers with the request'''
+        self.pool.request(self.base_url + '/plain', {'If-None-Match': '"42"'})
+        self.assertEqual(self.server.requests[0]['If-None-Match'], '"42"')
+
+    def test_unfinished_response_drop_connection(self):
+        '''Test that a connection isn't reused if its response wasn't fully read'''
+        response = self.pool.open(self.base_url + '/plain')
+        response.read(10)
+        response.close()
+        self.pool.request(self.base_url + '/plain')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_server_closing_connection(self):
+        '''Test that a connection closed by the server isn't reused'''
+        self.pool.request(self.base_url + '/close')
+        self.pool.request(self.base_url + '/plain')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_idle_timeout(self):
+        '''Test that connections idle for too long are dropped'''
+        self.pool.idle_timeout = 0
+        self.pool.request(self.base_url + '/plain')
+        self.pool.request(self.base_url + '/plain')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_pool_size(self):
+        '''Test that no more than pool_size idle connections are kept'''
+        responses = [self.pool.open(self.base_url + '/plain') for i in range(3)]
+        for response in responses:
+            response.read()
+        self.assertEqual(len(self.pool._idle_connections[('http', '127.0.0.1', self.server.server_port)]), 2)
+
+    def test_redirection(self):
+        '''Test that redirections are followed'''
+        (status, headers, body) = self.pool.request(self.base_url + '/redirect')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, BODY)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_connection_refused(self):
+        '''Test that a networking error raises a TransportError'''
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertRaises(TransportError, self.pool.request, self.base_url + '/plain')
+
+    def test_unsupported_url(self):
+        '''Test that only http and https urls are supported'''
+        self.assertRaises(TransportError, self.pool.request, 'ftp://127.0.0.1/foo')
+
+    def test_cancelled_before_request(self):
+        '''Test that no request is sent once cancelled'''
+        cancellable = Cancellable()
+        cancellable.cancel()
+        self.assertRaises(CancelledError, self.pool.request, self.base_url + '/plain', None, cancellable)
+        self.assertEqual(self.server.requests, [])
+
+    def test_cancel_transfer_in_progress(self):
+        '''Test that cancelling from another thread aborts a blocked transfer right away'''
+        cancellable = Cancellable()
+        response = self.pool.open(self.base_url + '/slow', None, cancellable)
+        threading.Timer(0.2, cancellable.cancel).start()
+        start_time = time.time()
+        self.assertRaises(CancelledError, response.read)
+        self.assertTrue(time.time() - start_time < 1)
+        # the connection is dropped, not reused
+        self.pool.request(self.base_url + '/plain')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_not_cancelled(self):
+        '''Test that a finished request isn't affected by a later cancellation'''
+        cancellable = Cancellable()
+        self.assertEqual(self.pool.request(self.base_url + '/plain', None, cancellable)[2], BODY)
+        cancellable.cancel()
+        self.assertEqual(self.pool.request(self.base_url + '/plain')[2], BODY)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_late_abort_released_connection(self):
+        '''Test that a cancellation racing with the end of a transfer doesn't shut down the pooled connection'''
+        response = self.pool.open(self.base_url + '/plain', None, Cancellable())
+        connection = response._connection
+        self.assertEqual(response.read(), BODY)
+        # the cancel callback was already running when the response was released
+        self.pool._abort(connection)
+        self.assertEqual(self.pool.request(self.base_url + '/plain')[2], BODY)
+        self.assertEqual(self.server.connections, 1)
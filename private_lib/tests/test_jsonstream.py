@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import unittest
+
+from ..jsonstream import iter_json_array
+
+
+def split_in_chunks(content, size):
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+class JsonStreamTests(unittest.TestCase):
+
+    def test_simple_array(self):
+        '''Test parsing a simple array in one chunk'''
+        self.assertEqual(list(iter_json_array([b'[1, "foo", {"bar": [null, true]}, 4.2]'])),
+                         [1, "foo", {"bar": [None, True]}, 4.2])
+
+    def test_empty_array(self):
+        '''Test parsing empty arrays'''
+        self.assertEqual(list(iter_json_array([b'[]'])), [])
+        self.assertEqual(list(iter_json_array([b' [', b' ] \n'])), [])
+
+    def test_split_values(self):
+        '''Test that values split between chunks are parsed once complete'''
+        self.assertEqual(list(iter_json_array([b'[12', b'34, "fo', b'o", {"a"', b': 1}', b']'])),
+                         [1234, "foo", {"a": 1}])
+
+    def test_split_multibytes_characters(self):
+        '''Test that a multibytes character split between chunks is decoded'''
+        content = '["Années 90", "Années 80"]'.encode('utf-8')
+        self.assertEqual(list(iter_json_array(split_in_chunks(content, 1))), ["Années 90", "Années 80"])
+
+    def test_other_encoding(self):
+        '''Test decoding content which isn't utf-8'''
+        content = '["Années 90"]'.encode('latin-1')
+        self.assertEqual(list(iter_json_array([content], 'latin-1')), ["Années 90"])
+
+    def test_items_yielded_while_receiving(self):
+        '''Test that items are yielded before the end of the content'''
+        received = []
+
+        def chunks():
+            for chunk in (b'[{"id": 1},', b' {"id": 2},', b' {"id": 3}]'):
+                received.append(chunk)
+                yield chunk
+
+        items = iter_json_array(chunks())
+        self.assertEqual(next(items), {"id": 1})
+        self.assertEqual(len(received), 1)
+        self.assertEqual(list(items), [{"id": 2}, {"id": 3}])
+
+    def test_same_result_as_json_module(self):
+        '''Test that parsing real data in small chunks gives the same result than the json module'''
+        with open(os.path.join(os.path.dirname(__file__), "data", "radios_by_search"), 'rb') as f:
+            content = f.read()
+        self.assertEqual(list(iter_json_array(split_in_chunks(content, 97))), json.loads(content.decode('utf-8')))
+
+    def test_invalid_content(self):
+        '''Test that invalid arrays are raising a ValueError'''
+        for content in (b'', b'{"foo": 1}', b'[1 2]', b'[,1]', b'[1,]', b'[1', b'[1]extra', b'[{"foo": }]'):
+            self.assertRaises(ValueError, list, iter_json_array([content]))
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..metrics import get_percentile, Metrics
+
+
+class PercentileTests(unittest.TestCase):
+
+    def test_percentiles(self):
+        '''Test nearest rank percentiles'''
+        samples = list(range(1, 101))
+        self.assertEqual(get_percentile(samples, 50), 50)
+        self.assertEqual(get_percentile(samples, 95), 95)
+        self.assertEqual(get_percentile(samples, 99), 99)
+        self.assertEqual(get_percentile([3], 99), 3)
+        self.assertIsNone(get_percentile([], 50))
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+        self.metrics.reset()
+
+    def tearDown(self):
+        self.metrics.reset()
+
+    def test_is_singleton(self):
+        '''Test that every component records in the same registry'''
+        self.assertEqual(self.metrics, Metrics())
+
+    def test_record_requests(self):
+        '''Test that requests, errors and parse times are recorded by path'''
+        for i in range(1, 101):
+            self.metrics.record_request('search', i / 1000.0, 10)
+        self.metrics.record_error('search')
+        self.metrics.record_parse('search', 0.002)
+        self.metrics.record_request('details', 0.5, 3, 2)
+
+        snapshot = self.metrics.get_snapshot()['paths']
+        self.assertEqual(snapshot['search']['requests'], 100)
+        self.assertEqual(snapshot['search']['errors'], 1)
+        self.assertEqual(snapshot['search']['bytes'], 1000)
+        self.assertEqual(snapshot['search']['parses'], 1)
+        self.assertAlmostEqual(snapshot['search']['parse_time_ms'], 2)
+        self.assertAlmostEqual(snapshot['search']['p50_latency_ms'], 50)
+        self.assertAlmostEqual(snapshot['search']['p95_latency_ms'], 95)
+        self.assertAlmostEqual(snapshot['search']['p99_latency_ms'], 99)
+        self.assertAlmostEqual(snapshot['search']['mean_latency_ms'], 50.5)
+        self.assertEqual(snapshot['search']['received_bytes'], 1000)
+        self.assertEqual(snapshot['details']['requests'], 1)
+        self.assertEqual((snapshot['details']['bytes'], snapshot['details']['received_bytes']), (3, 2))
+
+    def test_only_errors(self):
+        '''Test that a path with only errors has no latencies'''
+        self.metrics.record_error('search')
+        snapshot = self.metrics.get_snapshot()['paths']['search']
+        self.assertEqual(snapshot['errors'], 1)
+        self.assertIsNone(snapshot['p50_latency_ms'])
+        self.assertNotIn('mean_latency_ms', snapshot)
+
+    def test_record_cache(self):
+        '''Test that cache outcomes are counted by cache'''
+        self.metrics.record_cache('searches', 'hit')
+        self.metrics.record_cache('searches', 'hit')
+        self.metrics.record_cache('searches', 'miss')
+        self.metrics.record_cache('responses', 'stale')
+        self.assertEqual(self.metrics.get_snapshot()['caches'], {'searches': {'hit': 2, 'miss': 1},
+                                                                 'responses': {'stale': 1}})
+
+    def test_dump(self):
+        '''Test that the snapshot is dumped as json, creating the directory'''
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'unity-lens-radios', 'metrics.json')
+            self.metrics.record_request('search', 0.1, 10)
+            self.metrics.dump(path)
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['paths']['search']['requests'], 1)
+        finally:
+            shutil.rmtree(directory)
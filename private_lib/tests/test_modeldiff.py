@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from ..modeldiff import apply_row_operations, get_row_operations
+
+
+class ModelDiffTests(unittest.TestCase):
+
+    def check_operations(self, old_rows, new_rows):
+        '''Check that the operations transform old_rows into new_rows and return them'''
+        operations = get_row_operations(old_rows, new_rows)
+        self.assertEqual(apply_row_operations(list(old_rows), new_rows, operations), new_rows)
+        return operations
+
+    def test_same_rows(self):
+        '''Test that identical rows don't need any operation'''
+        self.assertEqual(self.check_operations(['a', 'b', 'c'], ['a', 'b', 'c']), [])
+
+    def test_removed_rows(self):
+        '''Test that removing rows only touches them'''
+        self.assertEqual(self.check_operations(['a', 'b', 'c', 'd'], ['a', 'c', 'd']), [(1, 1, 1, 1)])
+        self.assertEqual(self.check_operations(['a', 'b', 'c', 'd'], ['b', 'd']), [(2, 1, 1, 1), (0, 1, 0, 0)])
+
+    def test_filter_toggled(self):
+        '''Test that adding or removing a filter only removes or only inserts the rows which changed'''
+        all_rows = ['a', 'b', 'a', 'c', 'd', 'e', 'b']
+        filtered_rows = ['a', 'c', 'e', 'b']
+        self.assertEqual(self.check_operations(all_rows, filtered_rows), [(4, 1, 2, 2), (1, 2, 1, 1)])
+        self.assertEqual(self.check_operations(filtered_rows, all_rows), [(2, 0, 4, 5), (1, 0, 1, 3)])
+
+    def test_not_a_subsequence(self):
+        '''Test that rows both removed and inserted are still found'''
+        self.assertEqual(self.check_operations(['a', 'b', 'c'], ['a', 'x', 'c']), [(1, 1, 1, 2)])
+        operations = self.check_operations(['a', 'b', 'c', 'd'], ['b', 'a', 'd'])
+        self.assertEqual(sum(remove_count for (position, remove_count, start, end) in operations), 2)
+
+    def test_inserted_and_replaced_rows(self):
+        '''Test that the common rows are kept in the middle of insertions and replacements'''
+        operations = self.check_operations(['a', 'b', 'c'], ['x', 'a', 'c', 'y', 'z'])
+        self.assertEqual(sum(remove_count for (position, remove_count, start, end) in operations), 1)
+        self.assertEqual(sum(end - start for (position, remove_count, start, end) in operations), 3)
+
+    def test_from_and_to_empty_rows(self):
+        '''Test filling and clearing rows'''
+        self.assertEqual(self.check_operations([], ['a', 'b']), [(0, 0, 0, 2)])
+        self.assertEqual(self.check_operations(['a', 'b'], []), [(0, 2, 0, 0)])
@@ -17,14 +17,56 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import http.client
+import io
 import json
-from mock import patch, Mock
+import mock
+from mock import patch
 import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
-import urllib
+import urllib.parse
 
+from ..catalogsync import CatalogSync
+from ..httppool import TransportError
+from ..metrics import Metrics
 from ..onlineradioinfo import singleton, OnlineRadioInfo, ConnectionError
+from ..paging import FIRST_PAGE_SIZE, PageSizer
 from ..radio import Radio
+from ..tools import Cancellable, CancelledError
+from ..tracing import Tracer
+from .replayserver import ReplayServer
+
+
+class FakeResponse(object):
+    '''Mimic a PooledResponse with a given body'''
+
+    def __init__(self, body, status=200, headers='Content-Type: application/json; charset=UTF-8'):
+        self.status = status
+        self.headers = http.client.parse_headers(io.BytesIO('{0}\r\n\r\n'.format(headers).encode('ascii')))
+        self._body = io.BytesIO(body)
+        self.closed = False
+
+    @property
+    def bytes_received(self):
+        return self._body.tell()
+
+    def read(self, amt=None):
+        return self._body.read(amt)
+
+    def is_fully_read(self):
+        return self._body.tell() == len(self._body.getvalue())
+
+    def close(self):
+        self.closed = True
+
+
+def get_data_path(dataid):
+    '''Return the path of a data file in the data/ directory'''
+    return os.path.join(os.path.dirname(__file__), "data", dataid)
 
 
 class OnlineRadioInfoTestsCommon(unittest.TestCase):
@@ -32,9 +74,23 @@ class OnlineRadioInfoTestsCommon(unittest.TestCase):
     def setUp(self):
         # create the singleton. Don't call the super method for children if they need
         # to create the singleton with other parameters
+        self._use_temporary_cache()
         self.radioinfo = OnlineRadioInfo()
 
+    def _use_temporary_cache(self):
+        '''Redirect the response cache to a fresh temporary directory'''
+        self.cache_dir = tempfile.mkdtemp()
+        self.system_cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = self.cache_dir
+
     def tearDown(self):
+        # restore the cache location
+        if hasattr(self, 'cache_dir'):
+            shutil.rmtree(self.cache_dir)
+            if self.system_cache_home is None:
+                del(os.environ['XDG_CACHE_HOME'])
+            else:
+                os.environ['XDG_CACHE_HOME'] = self.system_cache_home
         # remove the current singleton
         try:
         # need to use the singleton to find the class as it's decorated
@@ -47,14 +103,12 @@ class OnlineRadioInfoTestsCommon(unittest.TestCase):
 
 class OnlineRadioInfoMainTests(OnlineRadioInfoTestsCommon):
 
-    def _urllibmock_return_from_data(self, urllibmock, dataid):
-        '''Return some real content for urllibmock based on dataid
+    def _openmock_return_from_data(self, openmock, dataid):
+        '''Return some real content for the connection pool openmock based on dataid
 
         Those are files in the data/ directory'''
-        source = os.path.join(os.path.dirname(__file__), "data", dataid)
-        urllibmock.request.urlopen().readall().decode.return_value = open(source).read()
-        # setup the parser to the real one as well for checking parameters later
-        urllibmock.parse.urlencode = urllib.parse.urlencode
+        with open(get_data_path(dataid), 'rb') as f:
+            openmock.return_value = FakeResponse(f.read())
 
     def test_is_singleton(self):
         '''Test that OnlineRadioInfo is a singleton'''
@@ -64,98 +118,124 @@ class OnlineRadioInfoMainTests(OnlineRadioInfoTestsCommon):
         '''Test that get category is reporting what we need'''
         self.assertEqual(self.radioinfo.get_category_types(), self.radioinfo.VALID_CATEGORY_TYPES)
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_get_recommended_stations(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_get_recommended_stations(self, openmock):
         '''Ensuring the format for recommended stations is the one the client expect'''
-        self._urllibmock_return_from_data(urllibmock, 'recommended_stations')
+        self._openmock_return_from_data(openmock, 'recommended_stations')
         stations_list_gen = self.radioinfo.get_recommended_stations()
 
         radio_list = list(stations_list_gen)
-        # the urllib request is only done when the generator is done at least once, so check only now for call
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/broadcast/editorialreccomendationsembedded")
+        # the request is only done when the generator is done at least once, so check only now for call
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/broadcast/editorialreccomendationsembedded", {}, None)
         self.assertIsInstance(radio_list[0], Radio)
         self.assertEquals(len(radio_list), 12)
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_get_top_stations(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_get_top_stations(self, openmock):
         '''Ensuring the format for top stations is the one the client expect'''
-        self._urllibmock_return_from_data(urllibmock, 'top_stations')
+        self._openmock_return_from_data(openmock, 'top_stations')
         stations_list_gen = self.radioinfo.get_top_stations()
 
         radio_list = list(stations_list_gen)
-        # the urllib request is only done when the generator is done at least once, so check only now for call
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/menu/broadcastsofcategory?category=_top&value=")
+        # the request is only done when the generator is done at least once, so check only now for call
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/menu/broadcastsofcategory?category=_top&value=", {}, None)
         self.assertIsInstance(radio_list[0], Radio)
         self.assertEquals(len(radio_list), 100)
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_get_mostwanted_stations(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_get_mostwanted_stations(self, openmock):
         '''Ensuring the format for most wanted stations is the one the client expect'''
-        self._urllibmock_return_from_data(urllibmock, 'mostwanted_stations')
+        self._openmock_return_from_data(openmock, 'mostwanted_stations')
         stations_types_content = self.radioinfo.get_most_wanted_stations(num_entries=2)
 
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/account/getmostwantedbroadcastlists?sizeoflists=2")
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/account/getmostwantedbroadcastlists?sizeoflists=2", {}, None)
         for radio_type in ('local', 'recommended', 'top'):
             radios = list(stations_types_content[radio_type])
             self.assertIsInstance(radios[0], Radio)
             self.assertEquals(len(radios), 2)
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_get_categories_by_category_type(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_get_categories_by_category_type(self, openmock):
         '''Ensuring the format for category results is the one the client expect'''
-        self._urllibmock_return_from_data(urllibmock, 'availablecategory_per_genre')
+        self._openmock_return_from_data(openmock, 'availablecategory_per_genre')
         categories = self.radioinfo.get_categories_by_category_type('genre')
 
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/menu/valuesofcategory?category=_genre")
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/menu/valuesofcategory?category=_genre", {}, None)
         self.assertIsInstance(categories, list)
         self.assertTrue(len(categories) > 0)
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_get_stations_by_category(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_get_stations_by_category(self, openmock):
         '''Ensuring the format for getting stations by category is the one the client expect'''
-        self._urllibmock_return_from_data(urllibmock, 'radios_filtered_blues')
+        self._openmock_return_from_data(openmock, 'radios_filtered_blues')
         stations_list_gen = self.radioinfo.get_stations_by_category('genre', 'Blues')
 
         radio_list = list(stations_list_gen)
-        # the urllib request is only done when the generator is done at least once, so check only now for call
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/menu/broadcastsofcategory?category=_genre&value=Blues")
+        # the request is only done when the generator is done at least once, so check only now for call
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/menu/broadcastsofcategory?category=_genre&value=Blues", {}, None)
         self.assertIsInstance(radio_list[0], Radio)
         self.assertTrue(len(radio_list) > 0)
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_get_stations_by_searchstring(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_get_stations_by_searchstring(self, openmock):
         '''Ensuring the format for getting stations by per a search is the one the client expect'''
-        self._urllibmock_return_from_data(urllibmock, 'radios_by_search')
+        self._openmock_return_from_data(openmock, 'radios_by_search')
         stations_list_gen = self.radioinfo.get_stations_by_searchstring('radio')
 
         radio_list = list(stations_list_gen)
-        # the urllib request is only done when the generator is done at least once, so check only now for call
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/index/searchembeddedbroadcast?q=radio&start=0&rows=1000")
+        # the request is only done when the generator is done at least once, so check only now for call.
+        # Only the first page is requested, as the whole result is received
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/index/searchembeddedbroadcast?q=radio&start=0&rows=25", {}, mock.ANY)
         self.assertIsInstance(radio_list[0], Radio)
         self.assertEquals(len(radio_list), 1000)
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_get_details_by_station_id(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_get_details_by_station_id(self, openmock):
         '''Ensuring the format for getting stations by per a search is the one the client expect'''
-        self._urllibmock_return_from_data(urllibmock, 'radio_by_id2511')
+        self._openmock_return_from_data(openmock, 'radio_by_id2511')
         stations_additional_details = self.radioinfo.get_details_by_station_id(2511)
 
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/broadcast/getbroadcastembedded?broadcast=2511")
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/broadcast/getbroadcastembedded?broadcast=2511", {}, None)
         self.assertEquals(stations_additional_details, {'city': 'Paris',
                                                         'current_track': 'Megashira - At Last',
                                                         'description': 'Makes your nights sweeter ! Programmation downtempo, soul et chillout par Vmix.\r\n',
                                                         'stream_urls': ['http://live2.vmix.fr:8010'],
                                                         'web_link': 'http://www.vmix.fr/'})
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_get_stations_by_searchstring_with_limit(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_get_stations_by_searchstring_with_limit(self, openmock):
         '''Ensuring the search is restricted if asked for so'''
-        self._urllibmock_return_from_data(urllibmock, 'radios_by_search')
+        self._openmock_return_from_data(openmock, 'radios_by_search')
         stations_list_gen = self.radioinfo.get_stations_by_searchstring('radio', 42)
 
-        list(stations_list_gen)
-        # the urllib request is only done when the generator is done at least once, so check only now for call
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/index/searchembeddedbroadcast?q=radio&start=0&rows=42")
+        self.assertEquals(len(list(stations_list_gen)), 42)
+        # the request is only done when the generator is done at least once, so check only now for call
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/index/searchembeddedbroadcast?q=radio&start=0&rows=25", {}, mock.ANY)
+
+    @patch.object(PageSizer, 'record_page')
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_get_stations_by_searchstring_pages(self, openmock, record_page_mock):
+        '''Ensuring search results are requested by pages growing up to the maximum number of results'''
+        with open(get_data_path('radios_by_search'), encoding='utf-8') as f:
+            json_radios = json.load(f)
+
+        def open_page(url, request_headers, cancellable):
+            parameters = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query))
+            (start, rows) = (int(parameters['start']), int(parameters['rows']))
+            return FakeResponse(json.dumps(json_radios[start:start + rows]).encode('utf-8'))
+        openmock.side_effect = open_page
+
+        radios = list(self.radioinfo.get_stations_by_searchstring('radio', 500))
+        self.assertEquals([radio.id for radio in radios], [json_radio['id'] for json_radio in json_radios[:500]])
+        pages = [urllib.parse.urlsplit(call[0][0]).query for call in openmock.call_args_list]
+        self.assertEquals(pages, ['q=radio&start=0&rows=25', 'q=radio&start=25&rows=50', 'q=radio&start=75&rows=100',
+                                  'q=radio&start=175&rows=200', 'q=radio&start=375&rows=125'])
+
+        # stops at the first incomplete page
+        openmock.reset_mock()
+        self.assertEquals(len(list(self.radioinfo.get_stations_by_searchstring('radio', 5000))), 1000)
+        self.assertEquals(urllib.parse.urlsplit(openmock.call_args_list[-1][0][0]).query,
+                          'q=radio&start=775&rows=800')
 
 
 class OnlineRadioInfoLangTests(OnlineRadioInfoTestsCommon):
@@ -195,69 +275,642 @@ class OnlineRadioInfoLangTests(OnlineRadioInfoTestsCommon):
 
 class OnlineRadioInfoJsonLineTests(OnlineRadioInfoTestsCommon):
 
-    def _setup_mock_urllib(self, urllibmock):
-        '''Setup the urllib mock object with exceptions and data'''
-        urllibmock.error.HTTPError = urllib.error.HTTPError
-        urllibmock.error.URLError = urllib.error.URLError
-        urllibmock.parse.urlencode = urllib.parse.urlencode
-        urllibmock.request.urlopen().headers.get_content_charset.return_value = "UTF-8"
-        urllibmock.request.urlopen().readall().decode.return_value = '{"foo": [{"bar":"baz"}]}'
+    def _setup_mock_pool(self, openmock, body='{"foo": [{"bar":"baz"}]}'):
+        '''Setup the connection pool mock object with data'''
+        openmock.return_value = FakeResponse(body.encode('utf-8'))
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_url_without_parameters(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_url_without_parameters(self, openmock):
         '''Test a call without any parameter'''
-        self._setup_mock_urllib(urllibmock)
+        self._setup_mock_pool(openmock)
         self.radioinfo._url_request('foo/bar')
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/foo/bar")
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/foo/bar", {}, None)
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_getting_http_results(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_url_absolute(self, openmock):
+        '''Test a call to an absolute url, not on the radio website'''
+        self._setup_mock_pool(openmock)
+        self.radioinfo._url_request('http://foo.net/bar.pls')
+        openmock.assert_called_once_with("http://foo.net/bar.pls", {}, None)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_getting_http_results(self, openmock):
         '''Test getting regular results from a request with parameter in a string format (http request only)'''
-        self._setup_mock_urllib(urllibmock)
+        self._setup_mock_pool(openmock)
         result = self.radioinfo._url_request('foo/bar', baz='france', bill='de')
 
-        self.assertEqual(result, urllibmock.request.urlopen().readall().decode.return_value)
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/foo/bar?bill=de&baz=france")
-        self.assertTrue(urllibmock.request.urlopen.called)
-        urllibmock.request.urlopen().headers.get_content_charset.assert_called_once_with()
-        urllibmock.request.urlopen().readall().decode.assert_called_once_with("UTF-8")
+        self.assertEqual(result, '{"foo": [{"bar":"baz"}]}')
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/foo/bar?bill=de&baz=france", {}, None)
+        self.assertTrue(openmock.return_value.closed)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_getting_results_in_charset(self, openmock):
+        '''Test that the body is decoded with the charset of the response'''
+        openmock.return_value = FakeResponse('["Années 90"]'.encode('latin-1'),
+                                             headers='Content-Type: application/json; charset=ISO-8859-1')
+        self.assertEqual(self.radioinfo._url_request('foo/bar'), '["Années 90"]')
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_getting_json_results(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_getting_json_results(self, openmock):
         '''Test getting regular results from a request with parameter in a json format'''
-        self._setup_mock_urllib(urllibmock)
+        self._setup_mock_pool(openmock)
         result = self.radioinfo._get_json_result_for_parameters('foo/bar', baz='france', bill='de')
 
-        self.assertEqual(result, json.loads(urllibmock.request.urlopen().readall().decode.return_value))
-        urllibmock.request.Request.assert_called_once_with(self.radioinfo.radio_base_url + "/foo/bar?bill=de&baz=france")
-        self.assertTrue(urllibmock.request.urlopen.called)
-        urllibmock.request.urlopen().headers.get_content_charset.assert_called_once_with()
-        urllibmock.request.urlopen().readall().decode.assert_called_once_with("UTF-8")
+        self.assertEqual(result, {"foo": [{"bar": "baz"}]})
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/foo/bar?bill=de&baz=france", {}, None)
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_raising_http_error(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_raising_http_error(self, openmock):
         '''Raising an exception while can't connect to the Internet or getting content'''
-        self._setup_mock_urllib(urllibmock)
-        urllibmock.request.urlopen = Mock(side_effect=urllib.error.HTTPError(Mock(), Mock(), Mock(), Mock(), Mock()))
+        openmock.return_value = FakeResponse(b'Not found', status=404)
+        self.assertRaises(ConnectionError, self.radioinfo._url_request, 'foo/bar', baz='france', bill='de')
+
+        openmock.return_value = FakeResponse(b'Internal error', status=500)
         self.assertRaises(ConnectionError, self.radioinfo._url_request, 'foo/bar', baz='france', bill='de')
 
-        urllibmock.request.urlopen = Mock(side_effect=urllib.error.URLError(Mock(), Mock()))
+        openmock.side_effect = TransportError('Connection refused')
         self.assertRaises(ConnectionError, self.radioinfo._url_request, 'foo/bar', baz='france', bill='de')
 
-    @patch('private_lib.onlineradioinfo.urllib')
-    def test_invalid_json_error(self, urllibmock):
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_not_modified(self, openmock):
+        '''Test that a not modified response returns no content'''
+        openmock.return_value = FakeResponse(b'', status=304, headers='ETag: "42"')
+        (response, headers) = self.radioinfo._url_open('foo/bar', {'If-None-Match': '"42"'})
+        self.assertEqual(response, None)
+        self.assertEqual(headers['ETag'], '"42"')
+        openmock.assert_called_once_with(self.radioinfo.radio_base_url + "/foo/bar", {'If-None-Match': '"42"'}, None)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_invalid_json_error(self, openmock):
         '''Raising an exception when receives invalid json content'''
-        self._setup_mock_urllib(urllibmock)
-        urllibmock.request.urlopen().readall().decode.return_value = '{"foo": [{"bar":"baz"}] extraword}'
+        self._setup_mock_pool(openmock, '{"foo": [{"bar":"baz"}] extraword}')
         self.assertRaises(ConnectionError, self.radioinfo._get_json_result_for_parameters, 'foo/bar', baz='france', bill='de')
 
 
+class OnlineRadioInfoStreamingTests(OnlineRadioInfoTestsCommon):
+
+    def _setup_mock_pool(self, openmock, dataid='radios_by_search'):
+        with open(get_data_path(dataid), 'rb') as f:
+            openmock.return_value = FakeResponse(f.read())
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_first_radio_before_end_of_download(self, openmock):
+        '''Test that the first radios are available before the whole response is downloaded'''
+        self._setup_mock_pool(openmock)
+        stations_list_gen = self.radioinfo.get_stations_by_searchstring('radio')
+        radio = next(stations_list_gen)
+        self.assertIsInstance(radio, Radio)
+        self.assertFalse(openmock.return_value.is_fully_read())
+        self.assertEqual(len(list(stations_list_gen)), 999)
+        self.assertTrue(openmock.return_value.closed)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_streamed_response_cached(self, openmock):
+        '''Test that a streamed response is cached once fully downloaded'''
+        self._setup_mock_pool(openmock, 'radios_filtered_blues')
+        radios = list(self.radioinfo.get_stations_by_category('genre', 'Blues'))
+        cached_radios = list(self.radioinfo.get_stations_by_category('genre', 'Blues'))
+        self.assertEqual(openmock.call_count, 1)
+        self.assertEqual([radio.id for radio in radios], [radio.id for radio in cached_radios])
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_partially_streamed_response_not_cached(self, openmock):
+        '''Test that a response not read until the end isn't cached'''
+        self._setup_mock_pool(openmock)
+        next(self.radioinfo.get_stations_by_searchstring('radio'))
+        self._setup_mock_pool(openmock)
+        next(self.radioinfo.get_stations_by_searchstring('radio'))
+        self.assertEqual(openmock.call_count, 2)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_streamed_invalid_json(self, openmock):
+        '''Test that an invalid streamed content raises a ConnectionError after the valid items'''
+        openmock.return_value = FakeResponse(b'[{"foo": "bar"}, {"foo": ]')
+        items = self.radioinfo._iter_json_array_for_parameters('foo/bar')
+        self.assertEqual(next(items), {"foo": "bar"})
+        self.assertRaises(ConnectionError, next, items)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_streamed_http_error(self, openmock):
+        '''Test that an HTTP error raises a ConnectionError'''
+        openmock.return_value = FakeResponse(b'Internal error', status=500)
+        self.assertRaises(ConnectionError, list, self.radioinfo.get_stations_by_searchstring('radio'))
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_streamed_stale_response(self, openmock):
+        '''Test that a stale response is served for streamed requests if the network is down'''
+        self._setup_mock_pool(openmock, 'radios_filtered_blues')
+        radios = list(self.radioinfo.get_stations_by_category('genre', 'Blues'))
+        openmock.side_effect = TransportError('Connection refused')
+        with patch.dict(self.radioinfo.CACHE_TTLS, {'menu/broadcastsofcategory': 0}):
+            self.assertEqual(len(list(self.radioinfo.get_stations_by_category('genre', 'Blues'))), len(radios))
+
+
+class OnlineRadioInfoSingleFlightTests(OnlineRadioInfoTestsCommon):
+
+    def setUp(self):
+        super().setUp()
+        self.opened = threading.Event()
+        self.release = threading.Event()
+
+    def _setup_blocking_pool(self, openmock, bodies, error=None):
+        '''Make the connection pool mock block until released, then return the next body or raise error'''
+        bodies = list(bodies)
+
+        def blocking_open(*args):
+            self.opened.set()
+            self.release.wait(5)
+            if error:
+                raise error
+            return FakeResponse(bodies.pop(0))
+        openmock.side_effect = blocking_open
+
+    def _run_in_thread(self, function, *args, **kwargs):
+        '''Run function in a thread, returning the thread and a list filled with its result or exception'''
+        outcome = []
+
+        def run():
+            try:
+                outcome.append(function(*args, **kwargs))
+            except Exception as error:
+                outcome.append(error)
+        thread = threading.Thread(target=run)
+        thread.start()
+        return (thread, outcome)
+
+    def _run_concurrently(self, leader_function, follower_function):
+        '''Run the leader function, then the follower one while the leader request is in flight'''
+        (leader, leader_outcome) = self._run_in_thread(leader_function)
+        self.assertTrue(self.opened.wait(5))
+        (follower, follower_outcome) = self._run_in_thread(follower_function)
+        # let the follower join the request in flight
+        time.sleep(0.1)
+        self.release.set()
+        leader.join(5)
+        follower.join(5)
+        return (leader_outcome, follower_outcome)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_identical_requests_shared(self, openmock):
+        '''Test that identical concurrent requests share the same HTTP request'''
+        self._setup_blocking_pool(openmock, [b'["foo"]', b'["bar"]'])
+        request = lambda: self.radioinfo._url_request('foo/bar', baz='france')
+        (leader_outcome, follower_outcome) = self._run_concurrently(request, request)
+        self.assertEqual(leader_outcome, ['["foo"]'])
+        self.assertEqual(follower_outcome, ['["foo"]'])
+        self.assertEqual(openmock.call_count, 1)
+        self.assertEqual(self.radioinfo._inflight_requests, {})
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_different_requests_not_shared(self, openmock):
+        '''Test that requests with different parameters aren't shared'''
+        self._setup_blocking_pool(openmock, [b'["foo"]', b'["bar"]'])
+        (leader_outcome, follower_outcome) = self._run_concurrently(
+            lambda: self.radioinfo._url_request('foo/bar', baz='france'),
+            lambda: self.radioinfo._url_request('foo/bar', baz='uk'))
+        self.assertEqual(openmock.call_count, 2)
+        self.assertEqual(sorted(leader_outcome + follower_outcome), ['["bar"]', '["foo"]'])
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_identical_streamed_requests_shared(self, openmock):
+        '''Test that identical concurrent searches share the same HTTP request'''
+        with open(get_data_path('radios_filtered_blues'), 'rb') as f:
+            body = f.read()
+        self._setup_blocking_pool(openmock, [body, body])
+        search = lambda: [radio.id for radio in self.radioinfo.get_stations_by_searchstring('blues')]
+        (leader_outcome, follower_outcome) = self._run_concurrently(search, search)
+        self.assertEqual(openmock.call_count, 1)
+        self.assertEqual(leader_outcome, follower_outcome)
+        self.assertEqual(len(follower_outcome[0]), len(json.loads(body.decode('utf-8'))))
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_shared_error(self, openmock):
+        '''Test that the error of a shared request is raised for every caller'''
+        self._setup_blocking_pool(openmock, [], TransportError('Connection refused'))
+        request = lambda: self.radioinfo._url_request('foo/bar')
+        (leader_outcome, follower_outcome) = self._run_concurrently(request, request)
+        self.assertIsInstance(leader_outcome[0], ConnectionError)
+        self.assertIsInstance(follower_outcome[0], ConnectionError)
+        self.assertEqual(openmock.call_count, 1)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_cancelled_leader(self, openmock):
+        '''Test that waiting requests send their own request if the shared one is cancelled'''
+        self._setup_blocking_pool(openmock, [b'["foo"]'], CancelledError())
+        leader_request = lambda: self.radioinfo._url_request('foo/bar', Cancellable())
+
+        def follower_request():
+            # the follower request succeeds
+            openmock.side_effect = lambda *args: FakeResponse(b'["bar"]')
+            return self.radioinfo._url_request('foo/bar')
+        (leader_outcome, follower_outcome) = self._run_concurrently(leader_request, follower_request)
+        self.assertIsInstance(leader_outcome[0], CancelledError)
+        self.assertEqual(follower_outcome, ['["bar"]'])
+        self.assertEqual(openmock.call_count, 2)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_cancelled_follower(self, openmock):
+        '''Test that cancelling a waiting request doesn't cancel the shared one'''
+        self._setup_blocking_pool(openmock, [b'["foo"]'])
+        cancellable = Cancellable()
+        (leader, leader_outcome) = self._run_in_thread(self.radioinfo._url_request, 'foo/bar')
+        self.assertTrue(self.opened.wait(5))
+        (follower, follower_outcome) = self._run_in_thread(self.radioinfo._url_request, 'foo/bar', cancellable)
+        time.sleep(0.1)
+        cancellable.cancel()
+        follower.join(5)
+        self.assertIsInstance(follower_outcome[0], CancelledError)
+        self.release.set()
+        leader.join(5)
+        self.assertEqual(leader_outcome, ['["foo"]'])
+
+
+class OnlineRadioInfoReplayTests(OnlineRadioInfoTestsCommon):
+    '''Tests against the local replay server, through the real transport'''
+
+    def setUp(self):
+        # don't call super().setup() here as we want to create our own object with different parameters
+        self._use_temporary_cache()
+        self.server = ReplayServer().start()
+        self.radioinfo = OnlineRadioInfo(base_url=self.server.base_url)
+
+    def tearDown(self):
+        self.radioinfo._pool.close_all()
+        self.server.stop()
+        super().tearDown()
+
+    def test_base_url_from_environment(self):
+        '''Test selecting the radio website with the environment variable'''
+        base_url_env = self.radioinfo.BASE_URL_ENV
+        del(singleton.instances[OnlineRadioInfo().__class__])
+        with patch.dict(os.environ, {base_url_env: self.server.base_url + '/'}):
+            self.assertEqual(OnlineRadioInfo().radio_base_url, self.server.base_url)
+
+    def test_search_with_connection_reuse(self):
+        '''Test searching twice, through the same keep-alive connection'''
+        radios = list(self.radioinfo.get_stations_by_searchstring('radio', max_num_entries=100))
+        self.assertEqual(len(radios), 100)
+        self.assertIsInstance(radios[0], Radio)
+        self.assertEqual(len(list(self.radioinfo.get_stations_by_searchstring('jazz'))),
+                         len(self.server._server.catalog.search('jazz')))
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(set(self.server.requests), {'/info/index/searchembeddedbroadcast'})
+
+    def test_search_pages(self):
+        '''Test that every search result is received, by pages, in order'''
+        radios = list(self.radioinfo.get_stations_by_searchstring('radio'))
+        self.assertEqual([radio.id for radio in radios],
+                         [radio['id'] for radio in self.server._server.catalog.search('radio')])
+        self.assertGreater(len(self.server.requests), 1)
+
+    def test_search_pages_cancelled(self):
+        '''Test that no more pages are requested once the search is cancelled'''
+        self.server._server.latency = 0.05
+        cancellable = Cancellable()
+        radios = self.radioinfo.get_stations_by_searchstring('radio', cancellable=cancellable)
+        for i in range(FIRST_PAGE_SIZE + 1):
+            next(radios)
+        cancellable.cancel()
+        self.assertRaises(CancelledError, list, radios)
+        time.sleep(0.1)
+        self.assertLessEqual(len(self.server.requests), 3)
+
+    def test_most_wanted_and_filters(self):
+        radios = self.radioinfo.get_most_wanted_stations()
+        self.assertEqual(len(list(radios['top'])), 2)
+        self.assertIn('Blues', self.radioinfo.get_categories_by_category_type('genre'))
+        self.assertIn('France', self.radioinfo.get_categories_by_category_type('country'))
+        self.assertEqual(len(list(self.radioinfo.get_top_stations())), 100)
+
+    def test_details_with_playlist(self):
+        '''Test getting radio details, resolving its playlist on the replay server'''
+        radio = next(self.radioinfo.get_stations_by_searchstring('radio'))
+        details = self.radioinfo.get_details_by_station_id(radio.id)
+        self.assertEqual(details['current_track'], radio.current_track)
+        self.assertEqual(details['stream_urls'], ['http://awesome.net/trance.mp3', 'http://awesome.net/dance.mp3'])
+        self.assertEqual(self.radioinfo.get_details_by_station_id(42), {})
+
+    def test_revalidation(self):
+        '''Test that an expired cached response is revalidated with its etag'''
+        with patch.dict(self.radioinfo.CACHE_TTLS, {'index/searchembeddedbroadcast': 0}):
+            radios = list(self.radioinfo.get_stations_by_searchstring('blues'))
+            self.assertEqual(len(list(self.radioinfo.get_stations_by_searchstring('blues'))), len(radios))
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_server_errors(self):
+        '''Test that replayed server errors raise a ConnectionError'''
+        self.server._server.error_rate = 1
+        self.assertRaises(ConnectionError, list, self.radioinfo.get_stations_by_searchstring('radio'))
+
+    def test_crawl_and_local_search(self):
+        '''Test crawling the station catalog, and searching in it without any request'''
+        self.assertEqual(self.radioinfo.crawl_catalog(), len(self.server._server.catalog.radios))
+        self.assertIsNotNone(self.radioinfo.get_catalog().get_crawl_time())
+        num_requests = len(self.server.requests)
+        self.radioinfo.search_mode = 'local'
+        radios = list(self.radioinfo.get_stations_by_searchstring('jazz'))
+        self.assertGreater(len(radios), 0)
+        self.assertIsInstance(radios[0], Radio)
+        self.assertLessEqual(set(radio.id for radio in radios),
+                             set(radio['id'] for radio in self.server._server.catalog.search('jazz')))
+        self.assertEqual(list(self.radioinfo.get_stations_by_searchstring('nothingmatching')), [])
+        self.assertEqual(len(self.server.requests), num_requests)
+
+    def test_incremental_sync_revalidates(self):
+        '''Test that syncing an unchanged catalog only revalidates the responses, receiving no body'''
+        self.radioinfo.crawl_catalog()
+        received_bytes = self.radioinfo.get_received_bytes()
+        self.assertGreater(received_bytes, 0)
+        with patch.dict(self.radioinfo.CACHE_TTLS, {'menu/broadcastsofcategory': 0}):
+            stats = CatalogSync(self.radioinfo, self.radioinfo.get_catalog(), max_age=0).run()
+        self.assertGreater(stats['categories'], 0)
+        self.assertEqual((stats['inserted'], stats['updated'], stats['deleted']), (0, 0, 0))
+        self.assertEqual(stats['received_bytes'], 0)
+
+    def test_received_bytes_compressed(self):
+        '''Test that the bytes received are the compressed ones, not the decompressed body'''
+        Metrics().reset()
+        list(self.radioinfo.get_stations_by_searchstring('jazz'))
+        received_bytes = self.radioinfo.get_received_bytes()
+        self.assertGreater(received_bytes, 0)
+        snapshot = Metrics().get_snapshot()['paths']['index/searchembeddedbroadcast']
+        self.assertLess(received_bytes, snapshot['bytes'])
+        self.assertLess(snapshot['received_bytes'], snapshot['bytes'])
+        Metrics().reset()
+
+    def test_fallback_search(self):
+        '''Test that the fallback search mode only searches on the website if nothing is found locally'''
+        self.radioinfo.search_mode = 'fallback'
+        self.radioinfo.get_catalog().store(self.server._server.catalog.search('blues')[:1])
+        self.assertEqual(len(list(self.radioinfo.get_stations_by_searchstring('blues'))), 1)
+        self.assertEqual(len(self.server.requests), 0)
+        self.assertEqual(len(list(self.radioinfo.get_stations_by_searchstring('rock'))),
+                         len(self.server._server.catalog.search('rock')))
+        self.assertEqual(set(self.server.requests), {'/info/index/searchembeddedbroadcast'})
+
+    def test_crawl_cancelled(self):
+        '''Test that a cancelled crawl stops and isn't recorded as complete'''
+        cancellable = Cancellable()
+        cancellable.cancel()
+        self.assertRaises(CancelledError, self.radioinfo.crawl_catalog, cancellable)
+        self.assertIsNone(self.radioinfo.get_catalog().get_crawl_time())
+
+    def test_scaled_catalog(self):
+        '''Test a replay server with a bigger catalog, with bandwidth and latency'''
+        self.radioinfo._pool.close_all()
+        self.server.stop()
+        self.server = ReplayServer(latency=0.01, bandwidth=10 * 1024 * 1024, scale=3).start()
+        self.radioinfo.radio_base_url = self.server.base_url
+        radios = list(self.radioinfo.get_stations_by_searchstring('radio', max_num_entries=5000))
+        self.assertEqual(len(radios), len(self.server._server.catalog.search('radio')))
+        self.assertGreater(len(radios), 2000)
+        self.assertEqual(len(set(radio.id for radio in radios)), len(radios))
+
+
+class OnlineRadioInfoFederationTests(OnlineRadioInfoTestsCommon):
+    '''Tests of searches sent to several replay servers at once'''
+
+    def setUp(self):
+        # don't call super().setup() here as we want to create our own object with different parameters
+        self._use_temporary_cache()
+        self.server = ReplayServer().start()
+        self.other_server = ReplayServer(scale=2).start()
+        self.radioinfo = OnlineRadioInfo(base_url=self.server.base_url)
+        self.radioinfo.federated_base_urls = (self.server.base_url, self.other_server.base_url)
+
+    def tearDown(self):
+        self.radioinfo._pool.close_all()
+        self.server.stop()
+        self.other_server.stop()
+        super().tearDown()
+
+    def test_federated_languages(self):
+        self.radioinfo.set_federated_languages(['fr', 'xx', 'at'])
+        self.assertEqual(self.radioinfo.federated_base_urls,
+                         (self.server.base_url, 'http://radio.fr/info', 'http://www.radio.at'))
+        self.radioinfo.set_federated_languages([])
+        self.assertEqual(self.radioinfo.federated_base_urls, ())
+
+    def test_merged_results(self):
+        '''Test that the results of every website are merged, without duplicates'''
+        radios = list(self.radioinfo.get_stations_by_searchstring('jazz'))
+        radio_ids = [radio.id for radio in radios]
+        self.assertEqual(len(set(radio_ids)), len(radio_ids))
+        self.assertEqual(set(radio_ids), set(radio['id'] for radio in self.other_server._server.catalog.search('jazz')))
+        self.assertTrue(self.radioinfo.is_last_search_complete())
+
+    def test_enough_results(self):
+        '''Test that the searches stop once enough results are found'''
+        radios = list(self.radioinfo.get_stations_by_searchstring('radio', max_num_entries=40))
+        self.assertEqual(len(set(radio.id for radio in radios)), 40)
+        self.assertFalse(self.radioinfo.is_last_search_complete())
+
+    def test_slow_website_waited(self):
+        '''Test that a slow website isn't cancelled while more results are wanted'''
+        self.server._server.latency = 0.5
+        start_time = time.time()
+        radios = list(self.radioinfo.get_stations_by_searchstring('blues'))
+        self.assertGreaterEqual(time.time() - start_time, 0.5)
+        self.assertTrue(set(radio['id'] for radio in self.server._server.catalog.search('blues')) <=
+                        set(radio.id for radio in radios))
+        self.assertTrue(self.radioinfo.is_last_search_complete())
+
+    def test_trace_search_id(self):
+        '''Test that the spans of the website and page threads are tagged with the search id'''
+        trace_path = os.path.join(self.cache_dir, 'trace.json')
+        Tracer().enable(trace_path)
+        Tracer().set_search_id(7)
+        try:
+            list(self.radioinfo.get_stations_by_searchstring('radio'))
+        finally:
+            Tracer().disable()
+            Tracer().set_search_id(None)
+        with open(trace_path, encoding='utf-8') as f:
+            events = json.loads(f.read().rstrip().rstrip(',') + ']')
+        requests = [event for event in events if event['name'] == 'http request']
+        self.assertGreater(len(set(event['tid'] for event in requests)), 2)
+        self.assertEqual(set(event['args'].get('search_id') for event in events), {7})
+
+    def test_failing_website(self):
+        '''Test that a failing website is ignored, unless they are all failing'''
+        self.server._server.error_rate = 1
+        self.assertEqual(len(list(self.radioinfo.get_stations_by_searchstring('blues'))),
+                         len(self.other_server._server.catalog.search('blues')))
+        self.assertFalse(self.radioinfo.is_last_search_complete())
+        self.other_server._server.error_rate = 1
+        self.assertRaises(ConnectionError, list, self.radioinfo.get_stations_by_searchstring('rock'))
+
+    def test_cancelled(self):
+        cancellable = Cancellable()
+        cancellable.cancel()
+        self.assertRaises(CancelledError, list, self.radioinfo.get_stations_by_searchstring('blues',
+                                                                                          cancellable=cancellable))
+
+
+class OnlineRadioInfoCacheTests(OnlineRadioInfoTestsCommon):
+
+    def setUp(self):
+        super().setUp()
+        self.path = 'menu/valuesofcategory'
+        self.json_content = '["Blues", "Jazz"]'
+
+    def _setup_url_open(self, url_openmock, response=None, headers=None):
+        '''Return a response on _url_open call'''
+        if response is None and headers is None:
+            response = self.json_content
+        url_openmock.return_value = (response, headers or {})
+
+    def test_cache_fresh_response(self):
+        '''Test that a fresh cached response is served without any network access'''
+        with patch.object(self.radioinfo, '_url_open') as url_openmock:
+            self._setup_url_open(url_openmock)
+            self.assertEqual(self.radioinfo._get_json_result_for_parameters(self.path, category='_genre'), ["Blues", "Jazz"])
+            self.assertEqual(self.radioinfo._get_json_result_for_parameters(self.path, category='_genre'), ["Blues", "Jazz"])
+            url_openmock.assert_called_once_with(self.path, {}, None, category='_genre')
+
+    def test_cache_is_persistent(self):
+        '''Test that the cache is kept on disk between sessions'''
+        with patch.object(self.radioinfo, '_url_open') as url_openmock:
+            self._setup_url_open(url_openmock)
+            self.radioinfo._get_json_result_for_parameters(self.path, category='_genre')
+        del(singleton.instances[OnlineRadioInfo().__class__])
+        radioinfo = OnlineRadioInfo()
+        with patch.object(radioinfo, '_url_open') as url_openmock:
+            self.assertEqual(radioinfo._get_json_result_for_parameters(self.path, category='_genre'), ["Blues", "Jazz"])
+            self.assertEqual(url_openmock.call_count, 0)
+
+    def test_cache_key_per_parameters(self):
+        '''Test that different parameters are different cache entries'''
+        with patch.object(self.radioinfo, '_url_open') as url_openmock:
+            self._setup_url_open(url_openmock)
+            self.radioinfo._get_json_result_for_parameters(self.path, category='_genre')
+            self.radioinfo._get_json_result_for_parameters(self.path, category='_country')
+            self.assertEqual(url_openmock.call_count, 2)
+
+    def test_no_cache_for_unlisted_path(self):
+        '''Test that paths without any ttl are never cached'''
+        with patch.object(self.radioinfo, '_url_request') as url_requestmock:
+            url_requestmock.return_value = self.json_content
+            self.radioinfo._get_json_result_for_parameters('foo/bar')
+            self.radioinfo._get_json_result_for_parameters('foo/bar')
+            self.assertEqual(url_requestmock.call_count, 2)
+
+    def test_cache_revalidation(self):
+        '''Test that an expired response is revalidated with its etag and last modified date'''
+        with patch.object(self.radioinfo, '_url_open') as url_openmock:
+            self._setup_url_open(url_openmock, self.json_content, {'ETag': '"42"', 'Last-Modified': 'Sat, 01 Jan 2012 00:00:00 GMT'})
+            self.radioinfo._get_json_result_for_parameters(self.path, category='_genre')
+            with patch.dict(self.radioinfo.CACHE_TTLS, {self.path: 0}):
+                self._setup_url_open(url_openmock, None, {})
+                self.assertEqual(self.radioinfo._get_json_result_for_parameters(self.path, category='_genre'), ["Blues", "Jazz"])
+            url_openmock.assert_called_with(self.path, {'If-None-Match': '"42"',
+                                                        'If-Modified-Since': 'Sat, 01 Jan 2012 00:00:00 GMT'},
+                                            None, category='_genre')
+
+    def test_cache_updated_on_modification(self):
+        '''Test that an expired response is replaced if the content changed'''
+        with patch.object(self.radioinfo, '_url_open') as url_openmock:
+            self._setup_url_open(url_openmock)
+            self.radioinfo._get_json_result_for_parameters(self.path, category='_genre')
+            with patch.dict(self.radioinfo.CACHE_TTLS, {self.path: 0}):
+                self._setup_url_open(url_openmock, '["Rock"]')
+                self.assertEqual(self.radioinfo._get_json_result_for_parameters(self.path, category='_genre'), ["Rock"])
+            self.assertEqual(self.radioinfo._get_json_result_for_parameters(self.path, category='_genre'), ["Rock"])
+            self.assertEqual(url_openmock.call_count, 2)
+
+    def test_serve_stale_on_connection_error(self):
+        '''Test that an expired response is served if the network is unavailable'''
+        with patch.object(self.radioinfo, '_url_open') as url_openmock:
+            self._setup_url_open(url_openmock)
+            self.radioinfo._get_json_result_for_parameters(self.path, category='_genre')
+            url_openmock.side_effect = ConnectionError('network down')
+            with patch.dict(self.radioinfo.CACHE_TTLS, {self.path: 0}):
+                self.assertEqual(self.radioinfo._get_json_result_for_parameters(self.path, category='_genre'), ["Blues", "Jazz"])
+
+    def test_connection_error_without_cache(self):
+        '''Test that the connection error is raised if there is nothing in cache'''
+        with patch.object(self.radioinfo, '_url_open') as url_openmock:
+            url_openmock.side_effect = ConnectionError('network down')
+            self.assertRaises(ConnectionError, self.radioinfo._get_json_result_for_parameters, self.path, category='_genre')
+
+    def test_invalid_json_not_cached(self):
+        '''Test that an invalid response doesn't end up in the cache'''
+        with patch.object(self.radioinfo, '_url_open') as url_openmock:
+            self._setup_url_open(url_openmock, '["Blues", extraword')
+            self.assertRaises(ConnectionError, self.radioinfo._get_json_result_for_parameters, self.path, category='_genre')
+            self._setup_url_open(url_openmock)
+            self.assertEqual(self.radioinfo._get_json_result_for_parameters(self.path, category='_genre'), ["Blues", "Jazz"])
+
+
+class OnlineRadioInfoMetricsTests(OnlineRadioInfoTestsCommon):
+
+    def setUp(self):
+        super(OnlineRadioInfoMetricsTests, self).setUp()
+        Metrics().reset()
+
+    def tearDown(self):
+        Metrics().reset()
+        super(OnlineRadioInfoMetricsTests, self).tearDown()
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_request_metrics(self, openmock):
+        '''Test that requests are recorded by path, with their size and parse time'''
+        with open(get_data_path('radio_by_id2511'), 'rb') as f:
+            body = f.read()
+        openmock.return_value = FakeResponse(body)
+        self.radioinfo.get_details_by_station_id(2511)
+
+        snapshot = Metrics().get_snapshot()['paths']['broadcast/getbroadcastembedded']
+        self.assertEqual(snapshot['requests'], 1)
+        self.assertEqual(snapshot['bytes'], len(body))
+        self.assertEqual(snapshot['parses'], 1)
+        self.assertEqual(snapshot['errors'], 0)
+        self.assertIsNotNone(snapshot['p99_latency_ms'])
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_streamed_request_metrics(self, openmock):
+        '''Test that streamed requests are recorded once fully read'''
+        with open(get_data_path('radios_by_search'), 'rb') as f:
+            body = f.read()
+        openmock.return_value = FakeResponse(body)
+        list(self.radioinfo.get_stations_by_searchstring('foo'))
+
+        snapshot = Metrics().get_snapshot()['paths']['index/searchembeddedbroadcast']
+        self.assertEqual(snapshot['requests'], 1)
+        self.assertEqual(snapshot['bytes'], len(body))
+        self.assertEqual(snapshot['received_bytes'], len(body))
+        self.assertEqual(snapshot['parses'], 1)
+        self.assertGreater(snapshot['parse_time_ms'], 0)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_error_metrics(self, openmock):
+        '''Test that networking and HTTP errors are recorded'''
+        openmock.side_effect = TransportError('timeout')
+        self.assertRaises(ConnectionError, self.radioinfo.get_details_by_station_id, 1)
+        openmock.side_effect = None
+        openmock.return_value = FakeResponse(b'', status=500)
+        self.assertRaises(ConnectionError, self.radioinfo.get_details_by_station_id, 1)
+
+        snapshot = Metrics().get_snapshot()['paths']['broadcast/getbroadcastembedded']
+        self.assertEqual(snapshot['errors'], 2)
+        self.assertEqual(snapshot['requests'], 0)
+
+    @patch('private_lib.onlineradioinfo.ConnectionPool.open')
+    def test_cache_metrics(self, openmock):
+        '''Test that response cache hits and misses are counted'''
+        with open(get_data_path('radios_by_search'), 'rb') as f:
+            openmock.return_value = FakeResponse(f.read())
+        list(self.radioinfo.get_stations_by_searchstring('foo'))
+        list(self.radioinfo.get_stations_by_searchstring('foo'))
+
+        self.assertEqual(Metrics().get_snapshot()['caches']['responses'], {'miss': 1, 'hit': 1})
+
+
 class OnlineRadioInfoParsing(OnlineRadioInfoTestsCommon):
 
     def _setup_playlist_content(self, filename, url_requestmock):
         '''Return and marshmall a playlist url on _url_request call'''
-        full_path = os.path.join(os.path.dirname(__file__), "data", filename)
-        url_requestmock.return_value = open(full_path).read()
+        url_requestmock.return_value = open(get_data_path(filename)).read()
 
     def test_valid_m3u_file(self):
         '''Test a valid m3u file parsing'''
@@ -296,6 +949,16 @@ class OnlineRadioInfoParsing(OnlineRadioInfoTestsCommon):
             url_requestmock.assert_called_once_with(pls_file)
             self.assertEquals(radio_urls, ['invalid.pls'])
 
+    def test_playlist_resolved_once(self):
+        '''Test that resolving again a playlist doesn't fetch it again'''
+        with patch.object(self.radioinfo, '_url_request') as url_requestmock:
+            m3u_file = 'valid.m3u'
+            self._setup_playlist_content(m3u_file, url_requestmock)
+            self.radioinfo._resolve_playlist(m3u_file)
+            radio_urls = self.radioinfo._resolve_playlist(m3u_file)
+            url_requestmock.assert_called_once_with(m3u_file)
+            self.assertEquals(radio_urls, ['http://awesome.net/trance.mp3', 'http://awesome.net/dance.mp3'])
+
     def test_no_request_for_nonplaylist(self):
         '''Ensure that there is no connexion if we don't try to parse a playlist'''
         with patch.object(self.radioinfo, '_url_request') as url_requestmock:
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from ..paging import FIRST_PAGE_SIZE, MAX_PAGE_SIZE, PageSizer
+
+
+class PageSizerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.page_sizer = PageSizer()
+
+    def test_pages_double_without_measures(self):
+        '''Test that pages double up to MAX_PAGE_SIZE when nothing is known about the network'''
+        sizes = [self.page_sizer.get_first_page_size()]
+        while sizes[-1] < MAX_PAGE_SIZE:
+            sizes.append(self.page_sizer.get_next_page_size(sizes[-1]))
+        self.assertEqual(sizes, [25, 50, 100, 200, 400, 800])
+        self.assertEqual(self.page_sizer.get_next_page_size(MAX_PAGE_SIZE), MAX_PAGE_SIZE)
+
+    def test_slow_transfer(self):
+        '''Test that pages don't grow beyond a few request latencies of transfer'''
+        # 100 ms of latency, 5 ms per station: 80 stations, rounded to 50
+        self.page_sizer.record_page(25, 0.1, 0.125)
+        self.assertEqual(self.page_sizer.get_next_page_size(400), 50)
+        self.assertEqual(self.page_sizer.get_next_page_size(25), 50)
+
+    def test_high_latency(self):
+        '''Test that pages grow with the request latency'''
+        # 1 s of latency, 1 ms per station
+        self.page_sizer.record_page(50, 1, 0.05)
+        self.assertEqual(self.page_sizer.get_next_page_size(400), MAX_PAGE_SIZE)
+
+    def test_smoothed_measures(self):
+        '''Test that the measures are averaged, and that empty pages are ignored'''
+        self.page_sizer.record_page(25, 0.1, 0.125)
+        self.page_sizer.record_page(0, 10, 0)
+        self.assertEqual(self.page_sizer.get_next_page_size(400), 50)
+        for i in range(20):
+            self.page_sizer.record_page(100, 0.1, 0.025)
+        self.assertEqual(self.page_sizer.get_next_page_size(400), 800)
+        self.assertEqual(self.page_sizer.get_next_page_size(FIRST_PAGE_SIZE), 50)
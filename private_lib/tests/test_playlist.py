@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from mock import Mock, patch
+import os
+import threading
+import unittest
+
+from ..onlineradioinfo import ConnectionError
+from ..playlist import get_playlist_format, parse_playlist, PlaylistResolver
+
+
+def get_data_path(dataid):
+    return os.path.join(os.path.dirname(__file__), 'data', dataid)
+
+
+class PlaylistParsingTests(unittest.TestCase):
+
+    def test_playlist_format(self):
+        '''Test guessing the playlist format from the url'''
+        self.assertEqual(get_playlist_format('http://foo.net/radio.m3u'), 'm3u')
+        self.assertEqual(get_playlist_format('http://foo.net/radio.PLS?sid=42'), 'pls')
+        self.assertEqual(get_playlist_format('valid.xspf'), 'xspf')
+        self.assertEqual(get_playlist_format('http://foo.net/radio.mp3'), None)
+        self.assertEqual(get_playlist_format('http://foo.net/'), None)
+
+    def test_parse_m3u(self):
+        with open(get_data_path('valid.m3u')) as f:
+            self.assertEqual(parse_playlist(f.read(), 'm3u'),
+                             ['http://awesome.net/trance.mp3', 'http://awesome.net/dance.mp3'])
+
+    def test_parse_hls_m3u8(self):
+        '''Test that HLS playlists are not resolved into their segments'''
+        content = '#EXTM3U\n#EXT-X-TARGETDURATION:10\n#EXTINF:10,\nsegment1.aac\n'
+        self.assertEqual(parse_playlist(content, 'm3u8'), [])
+
+    def test_parse_pls(self):
+        '''Test that pls entries are sorted and limited to NumberOfEntries'''
+        content = ('[playlist]\nFile2=http://foo.net/2?a=b\nFile1=http://foo.net/1\n'
+                   'File3=http://foo.net/3\nNumberOfEntries=2\n')
+        self.assertEqual(parse_playlist(content, 'pls'), ['http://foo.net/1', 'http://foo.net/2?a=b'])
+        with open(get_data_path('valid.pls')) as f:
+            self.assertEqual(parse_playlist(f.read(), 'pls'),
+                             ['http://awesome.net/trance.mp3', 'http://awesome.net/dance.mp3'])
+
+    def test_parse_xspf(self):
+        content = ('<?xml version="1.0" encoding="UTF-8"?>\n<playlist version="1" xmlns="http://xspf.org/ns/0/">'
+                   '<trackList><track><location>http://foo.net/1?a=b&amp;c=d</location></track>'
+                   '<track><location> http://foo.net/2 </location></track></trackList></playlist>')
+        self.assertEqual(parse_playlist(content, 'xspf'), ['http://foo.net/1?a=b&c=d', 'http://foo.net/2'])
+        self.assertEqual(parse_playlist('<playlist><trackList>', 'xspf'), [])
+
+    def test_parse_asx(self):
+        content = ('<ASX version="3.0"><ENTRY><REF HREF="http://foo.net/1?a=b&amp;c=d" /></ENTRY>'
+                   "<Entry><ref href='mms://foo.net/2'/></Entry></asx>")
+        self.assertEqual(parse_playlist(content, 'asx'), ['http://foo.net/1?a=b&c=d', 'mms://foo.net/2'])
+
+
+class PlaylistResolverTests(unittest.TestCase):
+
+    def setUp(self):
+        self.playlists = {}
+        self.fetch = Mock(side_effect=lambda url: self.playlists[url])
+        self.resolver = PlaylistResolver(self.fetch, max_entries=3)
+
+    def test_resolve_cached(self):
+        '''Test that a playlist is only fetched once'''
+        self.playlists['http://foo.net/radio.m3u'] = 'http://foo.net/stream.mp3\n'
+        self.assertEqual(self.resolver.resolve('http://foo.net/radio.m3u'), ['http://foo.net/stream.mp3'])
+        self.assertEqual(self.resolver.resolve('http://foo.net/radio.m3u'), ['http://foo.net/stream.mp3'])
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_not_a_playlist(self):
+        '''Test that non playlist urls are returned without any fetch'''
+        self.assertEqual(self.resolver.resolve('http://foo.net/stream.mp3'), ['http://foo.net/stream.mp3'])
+        self.assertEqual(self.fetch.call_count, 0)
+
+    def test_nested_playlists(self):
+        '''Test resolving nested and relative playlists, each fetched once, without looping'''
+        self.playlists['http://foo.net/radio.pls'] = ('[playlist]\nNumberOfEntries=3\nFile1=http://bar.net/a.m3u\n'
+                                                      'File2=b.asx\nFile3=http://bar.net/a.m3u\n')
+        self.playlists['http://bar.net/a.m3u'] = 'http://bar.net/a.mp3\nhttp://foo.net/radio.pls\n'
+        self.playlists['http://foo.net/b.asx'] = '<asx><entry><ref href="http://foo.net/b.mp3"/></entry></asx>'
+        self.assertEqual(self.resolver.resolve('http://foo.net/radio.pls'),
+                         ['http://bar.net/a.mp3', 'http://foo.net/b.mp3'])
+        self.assertEqual(self.fetch.call_count, 3)
+
+    def test_nested_playlist_failing(self):
+        '''Test that a failing nested playlist is kept as is'''
+        self.playlists['http://foo.net/radio.m3u'] = 'http://bar.net/a.pls\n'
+        self.assertEqual(self.resolver.resolve('http://foo.net/radio.m3u'), ['http://bar.net/a.pls'])
+        self.fetch.side_effect = ConnectionError('Connection refused')
+        self.assertRaises(ConnectionError, self.resolver.resolve, 'http://foo.net/other.m3u')
+
+    def test_max_depth(self):
+        '''Test that playlists aren't resolved deeper than max_depth'''
+        for i in range(10):
+            self.playlists['http://foo.net/{0}.m3u'.format(i)] = 'http://foo.net/{0}.m3u\n'.format(i + 1)
+        self.assertEqual(self.resolver.resolve('http://foo.net/0.m3u'),
+                         ['http://foo.net/{0}.m3u'.format(self.resolver.max_depth + 1)])
+
+    def test_lru_eviction(self):
+        '''Test that the least recently used playlist is evicted'''
+        for i in range(4):
+            self.playlists['http://foo.net/{0}.m3u'.format(i)] = 'http://foo.net/{0}.mp3\n'.format(i)
+        for i in (0, 1, 2, 0, 3):
+            self.resolver.resolve('http://foo.net/{0}.m3u'.format(i))
+        self.assertEqual(self.fetch.call_count, 4)
+        self.resolver.resolve('http://foo.net/0.m3u')
+        self.assertEqual(self.fetch.call_count, 4)
+        self.resolver.resolve('http://foo.net/1.m3u')
+        self.assertEqual(self.fetch.call_count, 5)
+
+    @patch('private_lib.playlist.time.time')
+    def test_ttl(self, timemock):
+        '''Test that resolved playlists are fetched again once outdated'''
+        timemock.return_value = 1000
+        self.playlists['http://foo.net/radio.m3u'] = 'http://foo.net/stream.mp3\n'
+        self.resolver.resolve('http://foo.net/radio.m3u')
+        timemock.return_value = 1000 + self.resolver.ttl
+        self.resolver.resolve('http://foo.net/radio.m3u')
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_resolve_many(self):
+        '''Test resolving playlists concurrently, with at most max_workers fetches at once'''
+        self.resolver = PlaylistResolver(self.fetch, max_workers=2)
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def fetch(url):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            threading.Event().wait(0.02)
+            with lock:
+                running[0] -= 1
+            if url.endswith('broken.m3u'):
+                raise ConnectionError('Connection refused')
+            return 'http://foo.net/{0}.mp3\n'.format(url.rsplit('/', 1)[1])
+        self.fetch.side_effect = fetch
+        urls = ['http://foo.net/{0}.m3u'.format(i) for i in range(6)] + ['http://foo.net/broken.m3u']
+        results = self.resolver.resolve_many(urls + urls[:2])
+        self.assertEqual(len(results), 7)
+        self.assertEqual(results['http://foo.net/1.m3u'], ['http://foo.net/1.m3u.mp3'])
+        self.assertEqual(results['http://foo.net/broken.m3u'], ['http://foo.net/broken.m3u'])
+        self.assertEqual(self.fetch.call_count, 7)
+        self.assertEqual(running[1], 2)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+
+from ..onlineradioinfo import ConnectionError
+from ..prefetcher import DetailsPrefetcher
+from ..radio import Radio
+
+
+class FakeOnlineRadioInfo(object):
+    '''Return radio details once released, recording the order of the requests'''
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.requested_ids = []
+        self.running = 0
+        self.max_running = 0
+        self.failing_ids = set()
+        self.broken_ids = set()
+        self._lock = threading.Lock()
+
+    def get_details_by_station_id(self, station_id):
+        with self._lock:
+            self.requested_ids.append(station_id)
+            self.running += 1
+            self.max_running = max(self.running, self.max_running)
+        self.release.wait(5)
+        with self._lock:
+            self.running -= 1
+        if station_id in self.failing_ids:
+            raise ConnectionError('Connection refused')
+        if station_id in self.broken_ids:
+            raise ValueError('Unexpected details')
+        return {'city': 'Paris', 'current_track': 'track', 'description': '', 'stream_urls': ['http://foo'],
+                'web_link': ''}
+
+
+class DetailsPrefetcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.onlineradioinfo = FakeOnlineRadioInfo()
+        self.radios = [Radio({'name': "Radio{0}".format(i), "pictureBaseURL": "/root/", "picture1Name": "foo.png",
+                              "genresAndTopics": "Rock", 'currentTrack': "", "country": "France", "rating": 5,
+                              "id": i}, self.onlineradioinfo)
+                       for i in range(10)]
+
+    def wait_for_prefetch(self, prefetcher):
+        '''Release the requests and wait for every queued radio to be prefetched'''
+        self.onlineradioinfo.release.set()
+        for i in range(500):
+            with prefetcher._condition:
+                if not prefetcher._pending_ids:
+                    return
+            threading.Event().wait(0.01)
+        self.fail('Radios not prefetched in time')
+
+    def test_prefetch_details(self):
+        '''Test that details are loaded in background, so that reading them doesn't need any request'''
+        prefetcher = DetailsPrefetcher(max_workers=2, budget=10)
+        for radio in self.radios[:3]:
+            self.assertTrue(prefetcher.prefetch(radio))
+        self.wait_for_prefetch(prefetcher)
+        self.assertEqual(sorted(self.onlineradioinfo.requested_ids), [0, 1, 2])
+        self.assertEqual(self.radios[0].stream_urls, ['http://foo'])
+        self.assertEqual(len(self.onlineradioinfo.requested_ids), 3)
+
+    def test_concurrency_cap(self):
+        '''Test that no more than max_workers requests are running at once'''
+        prefetcher = DetailsPrefetcher(max_workers=2, budget=10)
+        for radio in self.radios:
+            prefetcher.prefetch(radio)
+        self.wait_for_prefetch(prefetcher)
+        self.assertEqual(len(self.onlineradioinfo.requested_ids), 10)
+        self.assertLessEqual(self.onlineradioinfo.max_running, 2)
+        self.assertLessEqual(len(prefetcher._workers), 2)
+
+    def test_priority(self):
+        '''Test that radios closer to the top are prefetched first'''
+        prefetcher = DetailsPrefetcher(max_workers=1, budget=10)
+        # the first radio keeps the only worker busy while queueing the others
+        prefetcher.prefetch(self.radios[0], 0)
+        for (priority, radio) in ((3, self.radios[3]), (1, self.radios[1]), (2, self.radios[2])):
+            prefetcher.prefetch(radio, priority)
+        self.wait_for_prefetch(prefetcher)
+        self.assertEqual(self.onlineradioinfo.requested_ids, [0, 1, 2, 3])
+
+    def test_budget_and_new_generation(self):
+        '''Test that the budget is limiting prefetches until the next generation, dropping the waiting ones'''
+        prefetcher = DetailsPrefetcher(max_workers=1, budget=3)
+        for radio in self.radios[:3]:
+            self.assertTrue(prefetcher.prefetch(radio))
+        self.assertFalse(prefetcher.prefetch(self.radios[3]))
+        # wait for the worker to request the first radio
+        for i in range(500):
+            if self.onlineradioinfo.requested_ids:
+                break
+            threading.Event().wait(0.01)
+        prefetcher.new_generation()
+        self.assertTrue(prefetcher.prefetch(self.radios[4]))
+        self.wait_for_prefetch(prefetcher)
+        # radio 0 was already being prefetched, radios 1 and 2 were dropped
+        self.assertEqual(self.onlineradioinfo.requested_ids, [0, 4])
+
+    def test_no_duplicated_prefetch(self):
+        '''Test that loaded or already queued radios aren't prefetched again'''
+        prefetcher = DetailsPrefetcher(max_workers=1, budget=10)
+        self.assertTrue(prefetcher.prefetch(self.radios[0]))
+        self.assertFalse(prefetcher.prefetch(self.radios[0]))
+        self.wait_for_prefetch(prefetcher)
+        self.assertFalse(prefetcher.prefetch(self.radios[0]))
+        self.assertEqual(self.onlineradioinfo.requested_ids, [0])
+
+    def test_failed_prefetch(self):
+        '''Test that a failing prefetch doesn't stop the workers, and is loaded again on access'''
+        self.onlineradioinfo.failing_ids = {0}
+        prefetcher = DetailsPrefetcher(max_workers=1, budget=10)
+        prefetcher.prefetch(self.radios[0])
+        prefetcher.prefetch(self.radios[1])
+        self.wait_for_prefetch(prefetcher)
+        self.assertEqual(self.radios[0].get_loaded_detail('stream_urls'), None)
+        self.assertEqual(self.radios[1].get_loaded_detail('stream_urls'), ['http://foo'])
+
+    def test_unexpected_error(self):
+        '''Test that an unexpected error doesn't kill the worker'''
+        self.onlineradioinfo.broken_ids = {0}
+        prefetcher = DetailsPrefetcher(max_workers=1, budget=10)
+        prefetcher.prefetch(self.radios[0])
+        self.wait_for_prefetch(prefetcher)
+        prefetcher.prefetch(self.radios[1])
+        self.wait_for_prefetch(prefetcher)
+        self.assertEqual(self.radios[1].get_loaded_detail('stream_urls'), ['http://foo'])
+        self.assertTrue(prefetcher._workers[0].is_alive())
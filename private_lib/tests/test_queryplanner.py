@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+from mock import patch
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..queryplanner import (CardinalityEstimates, DEFAULT_CATEGORY_SIZE, DEFAULT_SEARCH_SIZE, ESTIMATES_VERSION,
+                            QueryPlan, QueryPlanner, REQUEST_COST)
+from .fixtures import make_radio
+
+
+class CardinalityEstimatesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.estimates_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.estimates_dir, 'cache', 'estimates.json')
+        self.estimates = CardinalityEstimates(self.path, 'http://rad.io/info')
+
+    def tearDown(self):
+        shutil.rmtree(self.estimates_dir)
+
+    def test_defaults(self):
+        self.assertEqual(self.estimates.get_search_size('radio'), DEFAULT_SEARCH_SIZE)
+        self.assertEqual(self.estimates.get_category_size('genre', 'Jazz'), DEFAULT_CATEGORY_SIZE)
+
+    def test_record_search(self):
+        '''Test that a search result gives its size, and lower bounds of its category sizes'''
+        radios = [make_radio(i, 'Radio', genres='Jazz') for i in range(300)] + \
+            [make_radio(300, 'Radio', genres='Jazz, Blues', country='UK')]
+        self.estimates.record_search('Rädio', radios)
+        self.assertEqual(self.estimates.get_search_size('radio'), 301)
+        self.assertEqual(self.estimates.get_category_size('genre', 'Jazz'), 301)
+        self.assertEqual(self.estimates.get_category_size('country', 'France'), 300)
+        self.assertEqual(self.estimates.get_category_size('genre', 'Blues'), DEFAULT_CATEGORY_SIZE)
+
+    def test_record_category(self):
+        '''Test that category sizes are exact, and averaged for the unknown categories of the same type'''
+        self.estimates.record_search('radio', [make_radio(i, 'Radio', genres='Jazz') for i in range(30)])
+        self.estimates.record_category('genre', 'Jazz', 12)
+        self.estimates.record_category('genre', 'Blues', 20)
+        self.estimates.record_search('radio', [make_radio(i, 'Radio', genres='Jazz') for i in range(30)])
+        self.assertEqual(self.estimates.get_category_size('genre', 'Jazz'), 12)
+        self.assertEqual(self.estimates.get_category_size('genre', 'Rock'), 16)
+        self.assertEqual(self.estimates.get_category_size('country', 'UK'), DEFAULT_CATEGORY_SIZE)
+
+    def test_search_sizes_limit(self):
+        '''Test that the least recently recorded searches are forgotten'''
+        with patch('private_lib.queryplanner.MAX_SEARCH_SIZES', 2):
+            for search_terms in ('rock', 'jazz', 'rock', 'blues'):
+                self.estimates.record_search(search_terms, [])
+        self.assertEqual(self.estimates.get_search_size('rock'), 0)
+        self.assertEqual(self.estimates.get_search_size('jazz'), DEFAULT_SEARCH_SIZE)
+        self.assertEqual(self.estimates.get_search_size('blues'), 0)
+
+    def test_persistence(self):
+        '''Test that estimates are saved on demand and loaded back, only for the same version and website'''
+        self.estimates.record_search('radio', [make_radio(1, 'Radio', genres='Jazz')])
+        self.estimates.record_category('country', 'UK', 42)
+        self.assertFalse(os.path.exists(self.path))
+        self.estimates.save()
+        estimates = CardinalityEstimates(self.path, 'http://rad.io/info')
+        self.assertEqual(estimates.get_search_size('radio'), 1)
+        self.assertEqual(estimates.get_category_size('country', 'UK'), 42)
+        self.assertEqual(CardinalityEstimates(self.path, 'http://radio.fr/info').get_search_size('radio'),
+                         DEFAULT_SEARCH_SIZE)
+        with open(self.path) as f:
+            data = json.load(f)
+        data['version'] = ESTIMATES_VERSION + 1
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+        self.assertEqual(CardinalityEstimates(self.path, 'http://rad.io/info').get_search_size('radio'),
+                         DEFAULT_SEARCH_SIZE)
+
+    def test_corrupted_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{"version": 1, "sea')
+        self.assertEqual(self.estimates.get_search_size('radio'), DEFAULT_SEARCH_SIZE)
+
+
+class QueryPlannerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.estimates_dir = tempfile.mkdtemp()
+        self.estimates = CardinalityEstimates(os.path.join(self.estimates_dir, 'estimates.json'), 'http://rad.io/info')
+        self.planner = QueryPlanner(self.estimates)
+
+    def tearDown(self):
+        shutil.rmtree(self.estimates_dir)
+
+    def test_narrow_filters_pushed(self):
+        '''Test that the stations of narrow categories are fetched instead of a big search result'''
+        self.estimates.record_category('genre', 'Jazz', 40)
+        self.estimates.record_category('genre', 'Blues', 30)
+        self.assertEqual(self.planner.plan('radio', {'genre': {'Jazz', 'Blues'}, 'decade': [1960, 1980]}),
+                         QueryPlan('genre', ('Blues', 'Jazz'), 70 + 2 * REQUEST_COST))
+
+    def test_cheapest_filter_pushed(self):
+        self.estimates.record_category('genre', 'Jazz', 40)
+        self.estimates.record_category('country', 'France', 400)
+        self.estimates.record_category('country', 'UK', 20)
+        self.assertEqual(self.planner.plan('radio', {'genre': {'Jazz'}, 'country': {'France'}}).category_type, 'genre')
+        self.assertEqual(self.planner.plan('radio', {'genre': {'Jazz'}, 'country': {'UK'}}).category_type, 'country')
+
+    def test_small_search_filtered_locally(self):
+        '''Test that searches with less results than the filter categories are filtered locally'''
+        self.estimates.record_search('nostalgie', [make_radio(i, 'Radio', genres='Oldies') for i in range(8)])
+        self.estimates.record_category('genre', 'Oldies', 150)
+        self.assertEqual(self.planner.plan('nostalgie', {'genre': {'Oldies'}}), QueryPlan(None, (), 8 + REQUEST_COST))
+        self.assertEqual(self.planner.plan('radio', {'decade': [1960, 1980]}).category_type, None)
+
+    def test_covers(self):
+        '''Test that plan results can be reused for filters selecting less categories of the same type'''
+        plan = QueryPlan('genre', ('Blues', 'Jazz'), 100)
+        self.assertTrue(plan.covers({'genre': {'Jazz'}, 'country': {'UK'}}))
+        self.assertFalse(plan.covers({'genre': {'Jazz', 'Rock'}}))
+        self.assertFalse(plan.covers({'country': {'UK'}}))
+        self.assertTrue(QueryPlan(None, (), 100).covers({}))
@@ -109,3 +109,28 @@ class RadioTests(unittest.TestCase):
                                 '"pictureBaseURL":"http://static.radio.de/images/broadcasts/"}')
         radio = Radio(radio_data, None)
         self.assertEqual(radio.picture_url, 'audio-x-generic')
+
+    def test_no_instance_dict(self):
+        '''Test that radios are slotted and don't accept unknown attributes'''
+        self.assertFalse(hasattr(self.radio, '__dict__'))
+        self.assertRaises(AttributeError, setattr, self.radio, 'playable', 'FREE')
+
+    def test_lazy_load_only_once(self):
+        '''Test that details loaded once aren't requested again by any lazy attribute'''
+        radio = self.radio
+        with patch.object(radio, '_onlineradioinfo') as onelineradioinfo:
+            onelineradioinfo.get_details_by_station_id.return_value = \
+            {'city': 'Paris', 'current_track': 'Megashira - At Last',
+             'description': 'Makes your nights sweeter !',
+             'stream_urls': ['http://live2.vmix.fr:8010'], 'web_link': 'http://www.vmix.fr/'}
+            self.assertEquals(radio.web_link, 'http://www.vmix.fr/')
+            self.assertEquals(radio.description, 'Makes your nights sweeter !')
+            self.assertEquals(radio.city, 'Paris')
+            self.assertEquals(radio.stream_urls, ['http://live2.vmix.fr:8010'])
+            self.assertEquals(onelineradioinfo.get_details_by_station_id.call_count, 1)
+
+    def test_json_data(self):
+        '''Test that the json data of a radio build the same radio'''
+        radio = Radio(self.radio.get_json_data(), None)
+        for attribute in ('id', 'name', 'picture_url', 'genres', 'decades', 'current_track', 'country', 'rating'):
+            self.assertEqual(getattr(radio, attribute), getattr(self.radio, attribute))
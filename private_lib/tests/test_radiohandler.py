@@ -22,20 +22,35 @@ from gi.repository import Gio
 from gi.repository import Unity
 import mock
 from mock import Mock, patch
+import os
+import shutil
+import tempfile
 import unittest
 
+from ..enums import SEARCH_NETWORK
+from ..metrics import Metrics
 from ..radiohandler import singleton, RadioHandler
 from ..radio import Radio
+from ..tools import Cancellable, CancelledError
 
 
 class RadioHandlerTests(unittest.TestCase):
 
     def setUp(self):
+        # saved data goes to a fresh temporary cache directory
+        self.cache_dir = tempfile.mkdtemp()
+        self.system_cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = self.cache_dir
         # create the singleton. Don't call the super method for children if they need
         # to create the singleton with other parameters
         self.radiohandler = RadioHandler()
 
     def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        if self.system_cache_home is None:
+            del(os.environ['XDG_CACHE_HOME'])
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.system_cache_home
         # remove the current singleton
         try:
         # need to use the singleton to find the class as it's decorated
@@ -71,12 +86,11 @@ class RadioHandlerTests(unittest.TestCase):
 
     @patch('private_lib.radiohandler.OnlineRadioInfo')
     def test_getting_filters(self, onlineradioinfomock):
-        '''Test getting fresh new unity filters'''
-        onlineradioinfomock().get_categories_by_category_type.return_value = ["foo", "bar"]
-        unity_filters = self.radiohandler.get_unity_radio_filters()
-        self.assertEqual(onlineradioinfomock().get_categories_by_category_type.call_args_list[0], mock.call('genre'))
-        self.assertEqual(onlineradioinfomock().get_categories_by_category_type.call_args_list[1], mock.call('country'))
-        self.assertEqual(len(onlineradioinfomock().get_categories_by_category_type.call_args_list), 2)
+        '''Test getting fresh new unity filters from the snapshot, without any request'''
+        with patch.object(self.radiohandler._filter_snapshot, 'load') as loadmock:
+            loadmock.return_value = {'genre': ["foo", "bar"], 'country': ["foo", "bar"]}
+            unity_filters = self.radiohandler.get_unity_radio_filters()
+        self.assertEqual(onlineradioinfomock().get_categories_by_category_type.call_count, 0)
         self.assertEqual(len(unity_filters), 3)
         self.assertIsInstance(unity_filters[0], Unity.MultiRangeFilter)
         self.assertNotEqual(unity_filters[0].get_option("1980"), None)
@@ -87,6 +101,43 @@ class RadioHandlerTests(unittest.TestCase):
             self.assertEqual(unity_filters[i + 1].get_option("1980"), None)
             self.assertNotEqual(unity_filters[i + 1].get_option("bar"), None)
 
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_getting_filters_without_snapshot(self, onlineradioinfomock):
+        '''Test that filters without snapshot have no genre and country options, without any request'''
+        with patch.object(self.radiohandler._filter_snapshot, 'load') as loadmock:
+            loadmock.return_value = None
+            unity_filters = self.radiohandler.get_unity_radio_filters()
+        self.assertEqual(onlineradioinfomock().get_categories_by_category_type.call_count, 0)
+        self.assertEqual(len(unity_filters), 3)
+        self.assertEqual(len(unity_filters[1].options), 0)
+        self.assertEqual(len(unity_filters[2].options), 0)
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_refresh_filter_vocabularies(self, onlineradioinfomock):
+        '''Test that refreshing the filter options saves them, and returns them only if they changed'''
+        onlineradioinfomock().get_categories_by_category_type.side_effect = lambda name: [name + "1", name + "2"]
+        with patch.object(self.radiohandler, '_filter_snapshot') as snapshotmock:
+            snapshotmock.load.return_value = None
+            vocabularies = self.radiohandler.refresh_filter_vocabularies()
+            self.assertEqual(vocabularies, {'genre': ["genre1", "genre2"], 'country': ["country1", "country2"]})
+            snapshotmock.save.assert_called_once_with(vocabularies)
+            snapshotmock.load.return_value = vocabularies
+            self.assertEqual(self.radiohandler.refresh_filter_vocabularies(), None)
+            self.assertEqual(snapshotmock.save.call_count, 1)
+
+    def test_update_filters_in_place(self):
+        '''Test that filter options are updated in place, keeping the active ones'''
+        with patch.object(self.radiohandler._filter_snapshot, 'load') as loadmock:
+            loadmock.return_value = {'genre': ["Rock", "Jazz"], 'country': ["France"]}
+            unity_filters = self.radiohandler.get_unity_radio_filters()
+        genre_filter = unity_filters[1]
+        genre_filter.get_option("Rock").props.active = True
+        self.radiohandler.update_unity_radio_filters({'genre': ["Rock", "Blues"], 'country': ["France", "UK"]})
+        self.assertIs(self.radiohandler._unity_filters['genre'], genre_filter)
+        self.assertEqual([option.props.id for option in genre_filter.options], ["Rock", "Blues"])
+        self.assertTrue(genre_filter.get_option("Rock").props.active)
+        self.assertEqual([option.props.id for option in unity_filters[2].options], ["France", "UK"])
+
     def test_is_radio_fulfill_filters(self):
         '''Prepare some radios and filters, and check that the criterias matches'''
         radio_attributes = {'name': "Radio1", "pictureBaseURL": "/root/", "picture1Name": "foo.png", "genresAndTopics": "Rock, Techno, Années 90s, Years 2100",
@@ -235,7 +286,7 @@ class RadioHandlerSearchTests(RadioHandlerTests):
             for (radio, model_data) in self.radiohandler.get_model_data_from_content_search("", None):
                 self.assertEquals((radio, model_data), results[i])
                 i += 1
-            onlineradioinfromclass().get_most_wanted_stations.assert_called_once_with()
+            onlineradioinfromclass().get_most_wanted_stations.assert_called_once_with(cancellable=None)
 
     @patch('private_lib.radiohandler.OnlineRadioInfo')
     def test_search_content_search(self, onlineradioinfromclass):
@@ -252,7 +303,7 @@ class RadioHandlerSearchTests(RadioHandlerTests):
             for (radio, model_data) in self.radiohandler.get_model_data_from_content_search("searchsearch", None):
                 self.assertEquals((radio, model_data), results[i])
                 i += 1
-            onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("searchsearch")
+            onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("searchsearch", cancellable=None)
 
     @patch('private_lib.radiohandler.OnlineRadioInfo')
     def test_search_content_global_with_filter(self, onlineradioinfromclass):
@@ -269,7 +320,7 @@ class RadioHandlerSearchTests(RadioHandlerTests):
             for (radio, model_data) in self.radiohandler.get_model_data_from_content_search("", None):
                 self.assertEquals((radio, model_data), results[i])
                 i += 1
-            onlineradioinfromclass().get_most_wanted_stations.assert_called_once_with()
+            onlineradioinfromclass().get_most_wanted_stations.assert_called_once_with(cancellable=None)
 
     @patch('private_lib.radiohandler.OnlineRadioInfo')
     def test_search_content_search_with_filters(self, onlineradioinfromclass):
@@ -285,7 +336,7 @@ class RadioHandlerSearchTests(RadioHandlerTests):
             for (radio, model_data) in self.radiohandler.get_model_data_from_content_search("searchsearch", None):
                 self.assertEquals((radio, model_data), results[i])
                 i += 1
-            onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("searchsearch")
+            onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("searchsearch", cancellable=None)
 
     @patch('private_lib.radiohandler.OnlineRadioInfo')
     def test_search_using_cache(self, onlineradioinfromclass):
@@ -299,12 +350,12 @@ class RadioHandlerSearchTests(RadioHandlerTests):
             self.assertEquals(list(self.radiohandler._last_all_radios_dict.keys()), ["recommended", "local", "top"])
             self.assertEquals(self.radiohandler._last_search, "")
 
-            onlineradioinfromclass().get_most_wanted_stations.assert_called_once_with()
+            onlineradioinfromclass().get_most_wanted_stations.assert_called_once_with(cancellable=None)
             # second search, should still be searched once
             list(self.radiohandler.get_model_data_from_content_search("", None))
             self.assertEquals(list(self.radiohandler._last_all_radios_dict.keys()), ["recommended", "local", "top"])
             self.assertEquals(self.radiohandler._last_search, "")
-            onlineradioinfromclass().get_most_wanted_stations.assert_called_once_with()
+            onlineradioinfromclass().get_most_wanted_stations.assert_called_once_with(cancellable=None)
 
             # Same with real search, not only global (and ensure that the cache is cleaned)
             fake_radio_results = [self.radio1, self.radio2]
@@ -313,14 +364,202 @@ class RadioHandlerSearchTests(RadioHandlerTests):
             self.assertEquals(list(self.radiohandler._last_all_radios_dict.keys()), ["search"])
             self.assertEquals(self.radiohandler._last_search, "searchsearch")
 
-            onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("searchsearch")
+            onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("searchsearch", cancellable=None)
             list(self.radiohandler.get_model_data_from_content_search("searchsearch", None))
             self.assertEquals(self.radiohandler._last_search, "searchsearch")
             self.assertEquals(list(self.radiohandler._last_all_radios_dict.keys()), ["search"])
-            onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("searchsearch")
+            onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("searchsearch", cancellable=None)
 
             # ensure when switching back to global that the cache is cleaned
             list(self.radiohandler.get_model_data_from_content_search("", None))
             self.assertEquals(list(self.radiohandler._last_all_radios_dict.keys()), ["recommended", "local", "top"])
             self.assertEquals(self.radiohandler._last_search, "")
 
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_search_with_given_filters(self, onlineradioinfromclass):
+        '''Test that given filters are used instead of reading them from the scope'''
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1, self.radio2]
+        with patch.object(self.radiohandler, '_return_active_filters') as _return_active_filters_func:
+            results = list(self.radiohandler.get_model_data_from_content_search("searchsearch", None,
+                                                                                filters={"country": {'UK'}}))
+            self.assertEquals([radio for (radio, model_data) in results], [self.radio2])
+            self.assertEquals(_return_active_filters_func.call_count, 0)
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_incomplete_search_not_cached(self, onlineradioinfromclass):
+        '''Test that the results of an incomplete federated search are neither cached nor counted'''
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1, self.radio2]
+        onlineradioinfromclass().is_last_search_complete.return_value = False
+        with patch.object(self.radiohandler._query_planner.estimates, 'record_search') as record_searchmock:
+            results = list(self.radiohandler.get_model_data_from_content_search("searchsearch", None, filters={}))
+            self.assertEquals([radio for (radio, model_data) in results], [self.radio1, self.radio2])
+            self.assertEquals(record_searchmock.call_count, 0)
+        self.assertEquals(self.radiohandler._search_cache.get("searchsearch"), None)
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_search_cancelled(self, onlineradioinfromclass):
+        '''Test that the cancellable is forwarded and that a cancelled search isn't cached'''
+        cancellable = Cancellable()
+        onlineradioinfromclass().get_stations_by_searchstring.side_effect = CancelledError()
+        self.assertRaises(CancelledError, list,
+                          self.radiohandler.get_model_data_from_content_search("searchsearch", None, cancellable, {}))
+        onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("searchsearch", cancellable=cancellable)
+        self.assertEqual(self.radiohandler._last_search, None)
+        self.assertEqual(self.radiohandler._last_all_radios_dict, {})
+
+    @patch('private_lib.radiohandler.FilterIndex')
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_filter_index_built_once(self, onlineradioinfromclass, filterindexclass):
+        '''Test that the filter index is built once per search and reused on filter changes'''
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1, self.radio2]
+        filter_index = filterindexclass.return_value
+        filter_index.filter.return_value = [self.radio2]
+        list(self.radiohandler.get_model_data_from_content_search("searchsearch", None, filters={}))
+        results = list(self.radiohandler.get_model_data_from_content_search("searchsearch", None,
+                                                                            filters={"country": {'UK'}}))
+        list(self.radiohandler.get_model_data_from_content_search("searchsearch", None, filters={"country": {'France'}}))
+        self.assertEquals([radio for (radio, model_data) in results], [self.radio2])
+        filterindexclass.assert_called_once_with([self.radio1, self.radio2])
+        self.assertEquals(filter_index.filter.call_args_list, [mock.call({"country": {'UK'}}),
+                                                               mock.call({"country": {'France'}})])
+
+        # a new search drops the index
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1]
+        list(self.radiohandler.get_model_data_from_content_search("othersearch", None, filters={}))
+        list(self.radiohandler.get_model_data_from_content_search("othersearch", None, filters={"country": {'UK'}}))
+        self.assertEquals(filterindexclass.call_count, 2)
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_refined_model_data(self, onlineradioinfromclass):
+        '''Test that an extended search is refined from the previous results without any request'''
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1, self.radio2]
+        list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={}))
+        onlineradioinfromclass().get_stations_by_searchstring.reset_mock()
+
+        results = self.radiohandler.get_refined_model_data("radio2", {})
+        self.assertEquals(results, [(self.radio2, ("2", '/root/bar.png', 3, 'text/html', 'Radio2',
+                                                   'Radio2 current track', ''))])
+        # genres are searched as well, with every word
+        results = self.radiohandler.get_refined_model_data("Radio Techno", {})
+        self.assertEquals([radio for (radio, model_data) in results], [self.radio1, self.radio2])
+        results = self.radiohandler.get_refined_model_data("radio jazz", {})
+        self.assertEquals(results, [])
+        # but not countries
+        results = self.radiohandler.get_refined_model_data("radio france", {})
+        self.assertEquals(results, [])
+        # filters are applied
+        results = self.radiohandler.get_refined_model_data("radio rock", {"country": {'France'}})
+        self.assertEquals([radio for (radio, model_data) in results], [self.radio1])
+        self.assertEquals(onlineradioinfromclass().get_stations_by_searchstring.call_count, 0)
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_refined_model_data_not_extending(self, onlineradioinfromclass):
+        '''Test that searches not extending the previous one can't be refined'''
+        self.assertEquals(self.radiohandler.get_refined_model_data("radio", {}), None)
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1, self.radio2]
+        list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={}))
+        self.assertEquals(self.radiohandler.get_refined_model_data("radio", {}), None)
+        self.assertEquals(self.radiohandler.get_refined_model_data("rad", {}), None)
+        self.assertEquals(self.radiohandler.get_refined_model_data("jazz", {}), None)
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_refined_model_data_without_loading_details(self, onlineradioinfromclass):
+        '''Test that refining doesn't request the radio details, but uses the loaded ones'''
+        onlineradioinfo = Mock()
+        radio = Radio({'name': "Radio3", "pictureBaseURL": "/root/", "picture1Name": "baz.png",
+                       "genresAndTopics": "Jazz", 'currentTrack': "", "country": "France", "rating": 5, "id": 3},
+                      onlineradioinfo)
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [radio]
+        list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={}))
+        self.assertEquals(self.radiohandler.get_refined_model_data("radio paris", {}), [])
+        self.assertEquals(onlineradioinfo.get_details_by_station_id.call_count, 0)
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_search_result_cache(self, onlineradioinfromclass):
+        '''Test that switching back to a previous search or its canonical variants doesn't request it again'''
+        onlineradioinfromclass().get_most_wanted_stations.return_value = {"top": [self.radio1]}
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1, self.radio2]
+        list(self.radiohandler.get_model_data_from_content_search("", None, filters={}))
+        list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={}))
+        results = list(self.radiohandler.get_model_data_from_content_search("", None, filters={}))
+        self.assertEquals([radio for (radio, model_data) in results], [self.radio1])
+        results = list(self.radiohandler.get_model_data_from_content_search("Rädio ", None, filters={"country": {'UK'}}))
+        self.assertEquals([radio for (radio, model_data) in results], [self.radio2])
+        self.assertEquals(self.radiohandler._last_search, "Rädio ")
+        onlineradioinfromclass().get_most_wanted_stations.assert_called_once_with(cancellable=None)
+        onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("radio", cancellable=None)
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_filters_pushed_to_the_website(self, onlineradioinfromclass):
+        '''Test that the stations of a narrow filter category are fetched instead of every search result'''
+        onlineradioinfromclass().search_mode = SEARCH_NETWORK
+        radio3 = Radio({'name': "Jazz FM", "pictureBaseURL": "/root/", "picture1Name": "baz.png",
+                        "genresAndTopics": "Jazz", 'currentTrack': "", "country": "UK", "rating": 5, "id": 3}, None)
+        onlineradioinfromclass().get_stations_by_category.return_value = [self.radio2, radio3]
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1, self.radio2]
+        results = list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={"country": {'UK'}}))
+        self.assertEquals([radio for (radio, model_data) in results], [self.radio2])
+        onlineradioinfromclass().get_stations_by_category.assert_called_once_with('country', 'UK', None)
+        self.assertEquals(onlineradioinfromclass().get_stations_by_searchstring.call_count, 0)
+        self.assertEquals(self.radiohandler._query_planner.estimates.get_category_size('country', 'UK'), 2)
+
+        # the category stations can't answer the search without the filter
+        results = list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={}))
+        self.assertEquals([radio for (radio, model_data) in results], [self.radio1, self.radio2])
+        onlineradioinfromclass().get_stations_by_searchstring.assert_called_once_with("radio", cancellable=None)
+        self.assertEquals(self.radiohandler._query_planner.estimates.get_search_size("radio"), 2)
+
+        # the previous results contain the filtered ones
+        results = list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={"country": {'UK'}}))
+        self.assertEquals([radio for (radio, model_data) in results], [self.radio2])
+        self.assertEquals(onlineradioinfromclass().get_stations_by_category.call_count, 1)
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_suggestions_for_misspelled_search(self, onlineradioinfromclass):
+        '''Test that radios seen before and close to a search without results are suggested'''
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1, self.radio2]
+        list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={}))
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = []
+        results = list(self.radiohandler.get_model_data_from_content_search("Raido1", None, filters={}))
+        self.assertEquals(results[0][0].id, self.radio1.id)
+        self.assertEquals(results[0][1], ("42", '/root/foo.png', 3, 'text/html', 'Radio1', 'Radio1 current track', ''))
+        # filters apply to suggestions as well
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = []
+        results = list(self.radiohandler.get_model_data_from_content_search("Raido", None, filters={"country": {'UK'}}))
+        self.assertEquals([radio.id for (radio, model_data) in results], [self.radio2.id])
+        # also when the filters change
+        results = list(self.radiohandler.get_model_data_from_content_search("Raido", None, filters={}))
+        self.assertEquals(sorted(radio.id for (radio, model_data) in results), [self.radio2.id, self.radio1.id])
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_suggestions_not_cached(self, onlineradioinfromclass):
+        '''Test that suggestions aren't kept as the results of the misspelled search'''
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1, self.radio2]
+        list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={}))
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = []
+        list(self.radiohandler.get_model_data_from_content_search("Raido", None, filters={}))
+        self.assertEquals(self.radiohandler._search_cache.get("Raido"), {"search": []})
+        self.assertEquals(self.radiohandler._last_all_radios_dict, {"search": []})
+        self.assertEquals(self.radiohandler.get_refined_model_data("Raido radio2", {}), [])
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_suggested_model_data(self, onlineradioinfromclass):
+        '''Test that suggestions are given locally, with filters'''
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1, self.radio2]
+        list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={}))
+        results = self.radiohandler.get_suggested_model_data("Raido1", {})
+        self.assertEquals(results[0][1], ("42", '/root/foo.png', 3, 'text/html', 'Radio1', 'Radio1 current track', ''))
+        results = self.radiohandler.get_suggested_model_data("Raido", {"country": {'UK'}})
+        self.assertEquals([radio.id for (radio, model_data) in results], [self.radio2.id])
+        self.assertEquals(onlineradioinfromclass().get_stations_by_searchstring.call_count, 1)
+
+    @patch('private_lib.radiohandler.OnlineRadioInfo')
+    def test_search_result_cache_metrics(self, onlineradioinfromclass):
+        '''Test that search results cache hits and misses are counted'''
+        Metrics().reset()
+        onlineradioinfromclass().get_stations_by_searchstring.return_value = [self.radio1]
+        list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={}))
+        list(self.radiohandler.get_model_data_from_content_search("jazz", None, filters={}))
+        list(self.radiohandler.get_model_data_from_content_search("radio", None, filters={}))
+        self.assertEquals(Metrics().get_snapshot()['caches']['searches'], {'miss': 2, 'hit': 1})
+        Metrics().reset()
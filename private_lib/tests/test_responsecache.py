@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from ..responsecache import CacheEntry, ResponseCache
+
+
+class ResponseCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = os.path.join(tempfile.mkdtemp(), 'responses')
+        self.cache = ResponseCache(self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.cache_dir))
+
+    def test_key_ignore_parameters_order(self):
+        '''Test that the cache key doesn't depend on the parameters order'''
+        self.assertEqual(ResponseCache.make_key('http://rad.io/info', 'foo/bar', {'q': 'jazz', 'rows': 10}),
+                         ResponseCache.make_key('http://rad.io/info', 'foo/bar', {'rows': '10', 'q': 'jazz'}))
+
+    def test_key_depends_on_url(self):
+        '''Test that base url, path and parameters all are part of the key'''
+        key = ResponseCache.make_key('http://rad.io/info', 'foo/bar', {'q': 'jazz'})
+        self.assertNotEqual(key, ResponseCache.make_key('http://radio.fr/info', 'foo/bar', {'q': 'jazz'}))
+        self.assertNotEqual(key, ResponseCache.make_key('http://rad.io/info', 'foo/baz', {'q': 'jazz'}))
+        self.assertNotEqual(key, ResponseCache.make_key('http://rad.io/info', 'foo/bar', {'q': 'blues'}))
+
+    def test_missing_entry(self):
+        '''Test that a missing entry returns None'''
+        self.assertEqual(self.cache.get('foo'), None)
+
+    def test_store_and_get(self):
+        '''Test storing an entry and getting it back'''
+        self.cache.store('foo', '["bar"]', '"42"', 'Sat, 01 Jan 2012 00:00:00 GMT')
+        entry = self.cache.get('foo')
+        self.assertEqual(entry.body, '["bar"]')
+        self.assertEqual(entry.etag, '"42"')
+        self.assertEqual(entry.last_modified, 'Sat, 01 Jan 2012 00:00:00 GMT')
+        self.assertTrue(entry.is_fresh(60))
+
+    def test_corrupted_entry(self):
+        '''Test that a corrupted entry is ignored'''
+        self.cache.store('foo', '["bar"]')
+        with open(os.path.join(self.cache_dir, 'foo.json'), 'w') as f:
+            f.write('{"body": ')
+        self.assertEqual(self.cache.get('foo'), None)
+
+    def test_refresh(self):
+        '''Test that refreshing an entry make it fresh again'''
+        entry = self.cache.store('foo', '["bar"]')
+        entry.timestamp = time.time() - 3600
+        self.assertFalse(entry.is_fresh(60))
+        self.cache.refresh('foo', entry)
+        self.assertTrue(self.cache.get('foo').is_fresh(60))
+
+    def test_failed_write_cleaned(self):
+        '''Test that no temporary file is left behind when an entry can't be written'''
+        self.cache.store('foo', object())
+        self.assertEqual(self.cache.get('foo'), None)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_prune(self):
+        '''Test that the least recently used entries are removed beyond the maximum size'''
+        for (i, key) in enumerate(('foo', 'bar', 'baz')):
+            self.cache.store(key, 'x' * 100)
+            os.utime(os.path.join(self.cache_dir, '{0}.json'.format(key)), (i, i))
+        self.cache.get('foo')
+        self.cache.max_size = 2.5 * os.path.getsize(os.path.join(self.cache_dir, 'foo.json'))
+        self.cache.prune()
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['baz.json', 'foo.json'])
+
+    def test_prune_on_first_store(self):
+        '''Test that the cache size is checked when storing the first entry'''
+        ResponseCache(self.cache_dir).store('foo', 'x' * 100)
+        os.utime(os.path.join(self.cache_dir, 'foo.json'), (0, 0))
+        max_size = 1.5 * os.path.getsize(os.path.join(self.cache_dir, 'foo.json'))
+        ResponseCache(self.cache_dir, max_size=max_size).store('bar', 'x' * 100)
+        self.assertEqual(os.listdir(self.cache_dir), ['bar.json'])
+
+    def test_validation_headers(self):
+        '''Test conditional headers depending on the available validators'''
+        self.assertEqual(CacheEntry('').get_validation_headers(), {})
+        self.assertEqual(CacheEntry('', etag='"42"').get_validation_headers(), {'If-None-Match': '"42"'})
+        self.assertEqual(CacheEntry('', last_modified='Sat, 01 Jan 2012 00:00:00 GMT').get_validation_headers(),
+                         {'If-Modified-Since': 'Sat, 01 Jan 2012 00:00:00 GMT'})
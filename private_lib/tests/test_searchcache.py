@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from mock import patch
+import unittest
+
+from ..searchcache import estimate_size, get_canonical_search_terms, SearchResultCache
+from .fixtures import make_radios_dict
+
+
+class CanonicalSearchTermsTests(unittest.TestCase):
+
+    def test_canonical_search_terms(self):
+        '''Test that case, accents and whitespaces differences are ignored'''
+        for search_terms in ("jazz", "Jazz ", "JÄZZ", "  jàzz"):
+            self.assertEqual(get_canonical_search_terms(search_terms), "jazz")
+        self.assertEqual(get_canonical_search_terms(" Radio\t  Über   Jazz"), "radio uber jazz")
+        self.assertNotEqual(get_canonical_search_terms("jazz"), get_canonical_search_terms("jaz z"))
+
+
+class SearchResultCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SearchResultCache(max_entries=3)
+
+    def test_get_and_store(self):
+        '''Test getting stored results under canonical search terms, with hits and misses'''
+        self.assertEqual(self.cache.get("jazz"), None)
+        radios_dict = make_radios_dict("Jazz radio")
+        self.cache.store("Jazz ", radios_dict)
+        self.assertIs(self.cache.get("jazz"), radios_dict)
+        self.assertIs(self.cache.get("jäzz"), radios_dict)
+        self.assertEqual(self.cache.get("rock"), None)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def test_evict_least_recently_used(self):
+        '''Test that the least recently used entry is evicted when there are too many'''
+        for search_terms in ("a", "b", "c"):
+            self.cache.store(search_terms, make_radios_dict(search_terms))
+        self.cache.get("a")
+        self.cache.store("d", make_radios_dict("d"))
+        self.assertEqual(len(self.cache), 3)
+        self.assertEqual(self.cache.get("b"), None)
+        for search_terms in ("a", "c", "d"):
+            self.assertNotEqual(self.cache.get(search_terms), None)
+
+    def test_evict_on_size(self):
+        '''Test that entries are evicted when their estimated memory is too big'''
+        one_radio_size = estimate_size(make_radios_dict("a"))
+        self.cache = SearchResultCache(max_entries=10, max_size=one_radio_size * 3)
+        self.cache.store("a", make_radios_dict("a", 2))
+        self.cache.store("b", make_radios_dict("b"))
+        self.assertEqual(self.cache.size, one_radio_size * 3)
+        self.cache.store("c", make_radios_dict("c"))
+        self.assertEqual(self.cache.get("a"), None)
+        self.assertEqual(self.cache.size, one_radio_size * 2)
+        # too big to be cached at all
+        self.cache.store("d", make_radios_dict("d", 4))
+        self.assertEqual(self.cache.get("d"), None)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_replace_entry(self):
+        '''Test that storing again the same search replaces the entry'''
+        self.cache.store("a", make_radios_dict("a"))
+        radios_dict = make_radios_dict("a", 2)
+        self.cache.store("A", radios_dict)
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.size, estimate_size(radios_dict))
+        self.assertIs(self.cache.get("a"), radios_dict)
+
+    @patch('private_lib.searchcache.time.time')
+    def test_outdated_entry(self, timemock):
+        '''Test that old entries aren't returned anymore'''
+        timemock.return_value = 1000
+        self.cache.store("a", make_radios_dict("a"))
+        timemock.return_value = 1000 + self.cache.max_age
+        self.assertEqual(self.cache.get("a"), None)
+        self.assertEqual((len(self.cache), self.cache.size), (0, 0))
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import stationcatalog
+from ..stationcatalog import get_match_expression, StationCatalog
+from .fixtures import make_json_radio
+
+
+class MatchExpressionTests(unittest.TestCase):
+
+    def test_match_expression(self):
+        '''Test that every search word is a prefix, without accents nor full-text operators'''
+        self.assertEqual(get_match_expression('Rädio  Jazz'), 'radio* jazz*')
+        self.assertEqual(get_match_expression('"rock" -n* OR'), 'rock* n* or*')
+        self.assertEqual(get_match_expression(' - '), '')
+
+
+class StationCatalogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.catalog_dir, 'unity-lens-radios', 'catalog.sqlite')
+        self.catalog = StationCatalog(self.path, 'http://rad.io/info')
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.catalog_dir)
+
+    def test_store_and_search(self):
+        '''Test searching stations by name, genres, country and city prefixes'''
+        self.assertEqual(self.catalog.store([make_json_radio(1, 'Jazz Radio', genres='Jazz, Blues'),
+                                             make_json_radio(2, 'Rock FM', country='Royaume-Uni'),
+                                             make_json_radio(3, 'Vmix', genres='Electro', city='Paris')]), 3)
+        self.assertEqual(len(self.catalog), 3)
+        self.assertEqual([radio['id'] for radio in self.catalog.search('jaz')], [1])
+        self.assertEqual([radio['id'] for radio in self.catalog.search('blues')], [1])
+        self.assertEqual([radio['id'] for radio in self.catalog.search('royaume')], [2])
+        self.assertEqual([radio['id'] for radio in self.catalog.search('paris')], [3])
+        self.assertEqual([radio['id'] for radio in self.catalog.search('rock fm')], [2])
+        self.assertEqual(self.catalog.search('radio rock'), [])
+        self.assertEqual(self.catalog.search(''), [])
+        self.assertEqual(self.catalog.search('jazz')[0]['name'], 'Jazz Radio')
+
+    def test_accents(self):
+        '''Test that accents and case differences are ignored'''
+        self.catalog.store([make_json_radio(1, 'Radio Nostalgie', genres='Années 80', country='Allemagne')])
+        self.assertEqual(len(self.catalog.search('ANNEES')), 1)
+        self.assertEqual(len(self.catalog.search('nostalgíe')), 1)
+
+    def test_ranking(self):
+        '''Test that the most popular stations come first, then the best rated ones'''
+        self.catalog.store([make_json_radio(1, 'Radio 1', rank=300),
+                            make_json_radio(2, 'Radio 2', rank=None),
+                            make_json_radio(3, 'Radio 3', rank=10),
+                            make_json_radio(4, 'Radio 4', rank=300, rating=5)])
+        self.assertEqual([radio['id'] for radio in self.catalog.search('radio')], [3, 4, 1, 2])
+        self.assertEqual([radio['id'] for radio in self.catalog.search('radio', limit=2)], [3, 4])
+
+    def test_replace(self):
+        '''Test that storing a station again replaces it in the index too'''
+        self.catalog.store([make_json_radio(1, 'Jazz Radio')])
+        self.catalog.store([make_json_radio(1, 'Blues Radio')])
+        self.assertEqual(len(self.catalog), 1)
+        self.assertEqual(self.catalog.search('jazz'), [])
+        self.assertEqual(self.catalog.search('blues')[0]['name'], 'Blues Radio')
+
+    def test_persistence(self):
+        '''Test that the catalog is kept for the same website, and emptied otherwise'''
+        self.catalog.store([make_json_radio(1, 'Jazz Radio')])
+        self.catalog.set_crawl_time(42.5)
+        self.catalog.close()
+        self.catalog = StationCatalog(self.path, 'http://rad.io/info')
+        self.assertEqual(len(self.catalog), 1)
+        self.assertEqual(self.catalog.get_crawl_time(), 42.5)
+        self.catalog.close()
+        self.catalog = StationCatalog(self.path, 'http://radio.fr/info')
+        self.assertEqual(len(self.catalog), 0)
+        self.assertIsNone(self.catalog.get_crawl_time())
+
+    def test_category_uses(self):
+        '''Test that category uses are only written once flushed, most used categories being due first'''
+        self.catalog.set_categories('genre', ['Jazz', 'Rock'])
+        self.catalog.sync_category('genre', 'Jazz', [], 1)
+        self.catalog.sync_category('genre', 'Rock', [], 2)
+        self.catalog.record_category_use('genre', 'Rock')
+        self.catalog.record_category_use('genre', 'Unknown')
+        self.assertEqual(self.catalog.get_due_categories(10), [('genre', 'Jazz'), ('genre', 'Rock')])
+        self.catalog.flush_category_uses()
+        self.assertEqual(self.catalog.get_due_categories(10), [('genre', 'Rock'), ('genre', 'Jazz')])
+
+    def test_other_version(self):
+        '''Test that a catalog from another version is emptied'''
+        self.catalog.store([make_json_radio(1, 'Jazz Radio')])
+        self.catalog.close()
+        version = stationcatalog.CATALOG_VERSION
+        stationcatalog.CATALOG_VERSION = version + 1
+        try:
+            self.catalog = StationCatalog(self.path, 'http://rad.io/info')
+        finally:
+            stationcatalog.CATALOG_VERSION = version
+        self.assertEqual(len(self.catalog), 0)
@@ -17,6 +17,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+import os
+import shutil
+import tempfile
 import unittest
 
 from .. import tools
@@ -33,3 +37,82 @@ class ToolsTest(unittest.TestCase):
         a = Foo()
         b = Foo()
         self.assertEqual(a, b)
+
+
+class SaveJsonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'sub', 'data.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save(self):
+        '''Test that data is saved, creating the directory'''
+        tools.save_json(self.path, {'foo': [1, 2]})
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {'foo': [1, 2]})
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['data.json'])
+
+    def test_failed_save(self):
+        '''Test that a failed save raises, leaving the previous file and no temporary one'''
+        tools.save_json(self.path, {'foo': 1})
+        self.assertRaises(TypeError, tools.save_json, self.path, {'foo': object()})
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {'foo': 1})
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['data.json'])
+
+
+class CancellableTest(unittest.TestCase):
+
+    def test_cancel(self):
+        '''Test cancelling a cancellable'''
+        cancellable = tools.Cancellable()
+        self.assertFalse(cancellable.is_cancelled())
+        cancellable.raise_if_cancelled()
+        cancellable.cancel()
+        self.assertTrue(cancellable.is_cancelled())
+        self.assertRaises(tools.CancelledError, cancellable.raise_if_cancelled)
+
+    def test_callbacks(self):
+        '''Test that connected callbacks are called once on cancellation'''
+        cancellable = tools.Cancellable()
+        calls = []
+        cancellable.connect(lambda: calls.append(1))
+        handler_id = cancellable.connect(lambda: calls.append(2))
+        cancellable.connect(lambda: calls.append(3))
+        cancellable.disconnect(handler_id)
+        cancellable.cancel()
+        cancellable.cancel()
+        self.assertEqual(sorted(calls), [1, 3])
+
+    def test_connect_when_cancelled(self):
+        '''Test that connecting to a cancelled cancellable calls the callback right away'''
+        cancellable = tools.Cancellable()
+        cancellable.cancel()
+        calls = []
+        self.assertEqual(cancellable.connect(lambda: calls.append(1)), 0)
+        self.assertEqual(calls, [1])
+
+
+class StartupTimerTest(unittest.TestCase):
+
+    def test_phases(self):
+        '''Test that each phase lasts from the end of the previous one'''
+        timer = tools.StartupTimer(10)
+        timer.mark('imports', 10.5)
+        timer.mark('export', 12)
+        self.assertEqual(timer.phases, [('imports', 0.5), ('export', 1.5)])
+        report = timer.report().splitlines()
+        self.assertEqual(len(report), 3)
+        self.assertTrue(report[0].startswith('imports'))
+        self.assertTrue(report[0].endswith('500.0 ms'))
+        self.assertTrue(report[2].startswith('total'))
+        self.assertTrue(report[2].endswith('2000.0 ms'))
+
+    def test_mark_now(self):
+        '''Test marking a phase as finished right now'''
+        timer = tools.StartupTimer()
+        timer.mark('phase')
+        self.assertGreaterEqual(timer.phases[0][1], 0)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+from mock import patch
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from .. import tracing
+from ..tracing import Tracer
+
+
+def load_events(path):
+    '''Return the events of a trace file, which has no closing bracket'''
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    return json.loads(content.rstrip().rstrip(',') + ']')
+
+
+class TracerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.trace_dir = tempfile.mkdtemp()
+        self.trace_path = os.path.join(self.trace_dir, 'trace.json')
+        self.tracer = Tracer()
+
+    def tearDown(self):
+        self.tracer.disable()
+        self.tracer.set_search_id(None)
+        shutil.rmtree(self.trace_dir)
+
+    def test_disabled(self):
+        '''Test that spans do nothing when tracing is disabled'''
+        self.assertIs(tracing.span('search'), tracing._NULL_SPAN)
+        with tracing.span('search'):
+            pass
+        self.assertFalse(os.path.exists(self.trace_path))
+
+    def test_span(self):
+        '''Test that spans are written as complete events, tagged with the search id'''
+        self.tracer.enable(self.trace_path)
+        self.tracer.set_search_id(3)
+        with tracing.span('json decode', path='search'):
+            pass
+        self.tracer.flush()
+        [event] = load_events(self.trace_path)
+        self.assertEqual(event['name'], 'json decode')
+        self.assertEqual(event['ph'], 'X')
+        self.assertEqual(event['pid'], os.getpid())
+        self.assertEqual(event['tid'], threading.current_thread().ident)
+        self.assertEqual(event['args'], {'path': 'search', 'search_id': 3})
+        self.assertGreaterEqual(event['dur'], 0)
+
+    def test_search_id_by_thread(self):
+        '''Test that the search id is only the one of the span thread'''
+        self.tracer.enable(self.trace_path)
+        self.tracer.set_search_id(3)
+
+        def worker():
+            with tracing.span('http request'):
+                pass
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.tracer.flush()
+        [event] = load_events(self.trace_path)
+        self.assertEqual(event['args'], {})
+
+    def test_span_error(self):
+        '''Test that a span records the exception leaving it, without catching it'''
+        self.tracer.enable(self.trace_path)
+
+        def fail():
+            with tracing.span('http request'):
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.tracer.flush()
+        self.assertEqual(load_events(self.trace_path)[0]['args'], {'error': 'ValueError'})
+
+    def test_rotation(self):
+        '''Test that the file is rotated when too big, keeping only the backups'''
+        self.tracer.enable(self.trace_path, max_size=500, backups=2)
+        for i in range(30):
+            with tracing.span('radio', index=i):
+                pass
+        self.tracer.flush()
+        self.assertTrue(os.path.exists(self.trace_path + '.1'))
+        self.assertTrue(os.path.exists(self.trace_path + '.2'))
+        self.assertFalse(os.path.exists(self.trace_path + '.3'))
+        for path in (self.trace_path, self.trace_path + '.1'):
+            self.assertLessEqual(os.path.getsize(path), 500 + 200)
+        # last event in the current file
+        self.assertEqual(load_events(self.trace_path)[-1]['args']['index'], 29)
+
+    def test_write_error(self):
+        '''Test that failing to write the trace disables tracing, without failing the traced code'''
+        self.tracer.enable(self.trace_path, max_size=10)
+        with patch('private_lib.tracing.os.rename', side_effect=OSError('No space left on device')):
+            with tracing.span('search'):
+                pass
+        self.assertFalse(self.tracer.enabled)
+        self.assertIs(tracing.span('search'), tracing._NULL_SPAN)
+
+    def test_get_search_id(self):
+        '''Test that the search id of a thread can be given to the threads it starts'''
+        self.assertEqual(self.tracer.get_search_id(), None)
+        self.tracer.set_search_id(3)
+        self.assertEqual(self.tracer.get_search_id(), 3)
+        search_ids = []
+        thread = threading.Thread(target=lambda: search_ids.append(self.tracer.get_search_id()))
+        thread.start()
+        thread.join()
+        self.assertEqual(search_ids, [None])
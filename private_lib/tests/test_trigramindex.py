@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+from mock import patch
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..radio import Radio
+from ..trigramindex import get_trigrams, TrigramIndex
+from .fixtures import make_radio
+
+
+class TrigramsTests(unittest.TestCase):
+
+    def test_trigrams(self):
+        '''Test that trigrams of each canonical word are padded'''
+        self.assertEqual(get_trigrams('Jäzz FM'), {'  j', ' ja', 'jaz', 'azz', 'zz ', '  f', ' fm', 'fm '})
+        self.assertEqual(get_trigrams('  '), set())
+
+
+class TrigramIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.index_dir, 'trigrams.json')
+        self.index = TrigramIndex(self.path)
+        self.index.add_radios([make_radio(1, 'Radio Nostalgie', genres='Oldies, Années 80'),
+                               make_radio(2, 'Jazz Radio', genres='Jazz, Blues'),
+                               make_radio(3, 'Vmix Late', genres='Electro', city='Paris'),
+                               make_radio(4, 'Radio Swiss Pop', genres='Pop', country='Switzerland')])
+
+    def tearDown(self):
+        shutil.rmtree(self.index_dir)
+
+    def test_misspelled_lookup(self):
+        '''Test that misspelled queries find the closest radios first'''
+        self.assertEqual([radio_id for (radio_id, data, similarity) in self.index.lookup('nostalgei')], [1])
+        self.assertEqual([radio_id for (radio_id, data, similarity) in self.index.lookup('jaz radoi')][0], 2)
+        self.assertEqual([radio_id for (radio_id, data, similarity) in self.index.lookup('pari')], [3])
+        self.assertEqual([radio_id for (radio_id, data, similarity) in self.index.lookup('switzerlnd')], [4])
+        self.assertEqual(self.index.lookup('xyz'), [])
+        self.assertEqual(self.index.lookup(''), [])
+
+    def test_lookup_data(self):
+        '''Test that the radio data found build the same radio again'''
+        [(radio_id, data, similarity)] = self.index.lookup('radio nostalgie', limit=1)
+        self.assertEqual(similarity, 1)
+        radio = Radio(data, None)
+        self.assertEqual((radio.id, radio.name, radio.picture_url, radio.genres, radio.decades, radio.current_track,
+                          radio.country, radio.rating),
+                         (1, 'Radio Nostalgie', 'http://static/radio.png', ['Oldies'], [1980], 'A track', 'France', 0))
+
+    def test_reindex(self):
+        '''Test that a radio added again with other texts is reindexed'''
+        self.index.add_radios([make_radio(2, 'Blues Radio', genres='Blues')])
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.lookup('jazz'), [])
+        self.assertEqual(self.index.lookup('blues radio')[0][0], 2)
+
+    def test_limits(self):
+        '''Test the number of results and lookups visiting a limited number of radios'''
+        self.index.add_radios([make_radio(i, 'Radio {0}'.format(i)) for i in range(10, 100)])
+        self.assertEqual(len(self.index.lookup('radio', limit=5)), 5)
+        self.index.max_visits = 10
+        self.index.max_candidates = 3
+        self.assertEqual(len(self.index.lookup('radio')), 3)
+
+    def test_persistence(self):
+        '''Test that the index is only saved on demand, if it changed, and loaded on first use'''
+        self.index.add_radios([make_radio(5, 'Sky Radio')])
+        self.assertFalse(os.path.exists(self.path))
+        self.index.save()
+        index = TrigramIndex(self.path)
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.lookup('sky raido')[0][0], 5)
+        with patch.object(self.index, '_write') as writemock:
+            self.index.save()
+            self.assertEqual(writemock.call_count, 0)
+
+    def test_failed_save(self):
+        '''Test that an index failing to be saved is saved again next time'''
+        with patch.object(self.index, '_write', return_value=False):
+            self.index.save()
+        self.index.save()
+        self.assertEqual(len(TrigramIndex(self.path)), 4)
+
+    def test_invalid_file(self):
+        '''Test that corrupted or older files are ignored'''
+        with open(self.path, 'w') as f:
+            f.write('{"version": 1, "docu')
+        self.assertEqual(len(TrigramIndex(self.path)), 0)
+        with open(self.path, 'w') as f:
+            json.dump({'version': 0, 'documents': [[1, 'radio', '{}']]}, f)
+        self.assertEqual(len(TrigramIndex(self.path)), 0)
@@ -17,7 +17,21 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import os
+import tempfile
+import threading
+import time
+
+# seconds between two saves of what was learned from the searches (trigram index, cardinality estimates)
+SAVE_INTERVAL = 60
+# seconds between two syncs of the local station catalog, and bytes received per sync at most
+SYNC_INTERVAL = 30 * 60
+SYNC_BUDGET = 2 * 1024 * 1024
+
+
+class CancelledError(Exception):
+    pass
 
 
 def singleton(cls):
@@ -34,3 +48,100 @@ def singleton(cls):
 def get_icon_path():
     '''Get the relative or absolute icon paths for the lens'''
     return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'images')
+
+
+def get_cache_path():
+    '''Get the lens cache directory, following the XDG base directory specification'''
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'unity-lens-radios')
+
+
+def save_json(path, data):
+    '''Atomically write data to path as json, creating its directory if needed
+
+    The temporary file is removed if anything fails, the error being raised again.'''
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    (fd, temp_path) = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.rename(temp_path, path)
+    except Exception:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class Cancellable(object):
+    '''Thread-safe cancellation token
+
+    Callbacks connected to it are called once, in the thread cancelling it.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks = {}
+        self._last_handler_id = 0
+
+    def cancel(self):
+        '''Cancel the operation, calling every connected callback'''
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks = list(self._callbacks.values())
+            self._callbacks = {}
+        for callback in callbacks:
+            callback()
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def raise_if_cancelled(self):
+        '''Raise a CancelledError if the operation was cancelled'''
+        if self._cancelled:
+            raise CancelledError()
+
+    def connect(self, callback):
+        '''Call callback on cancellation, right now if it's already cancelled
+
+        Return an handler id to disconnect it, 0 if it was called right away'''
+        with self._lock:
+            if not self._cancelled:
+                self._last_handler_id += 1
+                self._callbacks[self._last_handler_id] = callback
+                return self._last_handler_id
+        callback()
+        return 0
+
+    def disconnect(self, handler_id):
+        with self._lock:
+            self._callbacks.pop(handler_id, None)
+
+
+class StartupTimer(object):
+    '''Record the time spent in each startup phase'''
+
+    def __init__(self, start_time=None):
+        if start_time is None:
+            start_time = time.time()
+        self.start_time = start_time
+        self._last_time = start_time
+        # list of (phase name, duration in seconds)
+        self.phases = []
+
+    def mark(self, phase, end_time=None):
+        '''Record the end of phase, started at the end of the previous one'''
+        if end_time is None:
+            end_time = time.time()
+        self.phases.append((phase, end_time - self._last_time))
+        self._last_time = end_time
+
+    def report(self):
+        '''Return a printable report of the phases durations'''
+        lines = ['{0:<30} {1:>8.1f} ms'.format(phase, duration * 1000) for (phase, duration) in self.phases]
+        lines.append('{0:<30} {1:>8.1f} ms'.format('total', (self._last_time - self.start_time) * 1000))
+        return '\n'.join(lines)
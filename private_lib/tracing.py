@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import threading
+import time
+
+from .tools import singleton
+
+_log = logging.getLogger(__name__)
+
+# environment variable enabling the tracing to the given file
+TRACE_ENV = 'UNITY_LENS_RADIOS_TRACE'
+DEFAULT_MAX_SIZE = 8 * 1024 * 1024
+DEFAULT_BACKUPS = 2
+
+# checked first by span(), without getting the tracer
+_enabled = False
+
+
+class _NullSpan(object):
+    '''Span doing nothing, used when tracing is disabled'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    '''Span recording a complete event for the time spent in its with block'''
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._args['error'] = exc_type.__name__
+        self._tracer.add_event(self._name, self._start_time, time.time() - self._start_time, self._args)
+        return False
+
+
+@singleton
+class Tracer(object):
+    '''Write search stages spans to a file, in the Chrome trace event format
+
+    The file can be loaded in chrome://tracing or Perfetto. It's rotated once
+    bigger than max_size bytes, keeping backups older files (path.1, path.2…).
+    Every span is tagged with the search id of its thread, if any: threads
+    started for a search need to be given it (see get_search_id).
+    Spans from span() cost a function call when tracing isn't enabled.
+    Tracing is disabled if the file can't be written, never failing a search.'''
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.max_size = DEFAULT_MAX_SIZE
+        self.backups = DEFAULT_BACKUPS
+        self._file = None
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def enable(self, path, max_size=DEFAULT_MAX_SIZE, backups=DEFAULT_BACKUPS):
+        '''Start writing the spans to path'''
+        with self._lock:
+            self._close()
+            self.path = path
+            self.max_size = max_size
+            self.backups = backups
+            self._open()
+            self.enabled = True
+        global _enabled
+        _enabled = True
+        _log.debug("Tracing to {0}".format(path))
+
+    def disable(self):
+        global _enabled
+        _enabled = False
+        with self._lock:
+            self.enabled = False
+            self._close()
+
+    def get_search_id(self):
+        '''Return the search id of the current thread, None if there is none'''
+        return getattr(self._local, 'search_id', None)
+
+    def set_search_id(self, search_id):
+        '''Tag the next spans of the current thread with search_id'''
+        self._local.search_id = search_id
+
+    def span(self, name, args):
+        '''Return a context manager recording a span name with the args dict'''
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def add_event(self, name, start_time, duration, args):
+        '''Write a complete event, times being in seconds'''
+        search_id = self.get_search_id()
+        if search_id is not None:
+            args['search_id'] = search_id
+        event = {'name': name, 'cat': 'search', 'ph': 'X', 'pid': self._pid,
+                 'tid': threading.current_thread().ident,
+                 'ts': int(start_time * 1000000), 'dur': int(duration * 1000000), 'args': args}
+        line = '{0},\n'.format(json.dumps(event))
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(line)
+                if self._file.tell() >= self.max_size:
+                    self._rotate()
+            except (IOError, OSError) as error:
+                self._stop(error)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                try:
+                    self._file.flush()
+                except (IOError, OSError) as error:
+                    self._stop(error)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        # the trace event format allows a missing closing bracket, for truncated files
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write('[\n')
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _stop(self, error):
+        '''Disable the tracing after a failure to write the file, with _lock held'''
+        global _enabled
+        _log.warning("Can't write the trace, disabling tracing: {0}".format(error))
+        _enabled = False
+        self.enabled = False
+        trace_file = self._file
+        self._file = None
+        if trace_file is not None:
+            try:
+                trace_file.close()
+            except (IOError, OSError):
+                pass
+
+    def _rotate(self):
+        '''Move the current file to path.1, shifting the older ones, and start a new file'''
+        self._close()
+        for index in range(self.backups - 1, 0, -1):
+            backup_path = '{0}.{1}'.format(self.path, index)
+            if os.path.exists(backup_path):
+                os.rename(backup_path, '{0}.{1}'.format(self.path, index + 1))
+        if self.backups:
+            os.rename(self.path, '{0}.1'.format(self.path))
+        self._open()
+
+
+def span(name, **args):
+    '''Return a context manager recording a span name with args, if tracing is enabled'''
+    if not _enabled:
+        return _NULL_SPAN
+    return Tracer().span(name, args)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2012 Canonical
+#
+# Authors:
+#  Didier Roche <didrocks@ubuntu.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+import collections
+import heapq
+import json
+import logging
+from operator import itemgetter
+import threading
+
+from .searchcache import get_canonical_search_terms
+from .tools import save_json
+
+_log = logging.getLogger(__name__)
+
+# bump when the file format or the indexed text change, older files are then ignored
+INDEX_VERSION = 2
+
+
+def get_trigrams(text):
+    '''Return the set of trigrams of the canonical words of text, padded to match their start and end'''
+    return _get_canonical_trigrams(get_canonical_search_terms(text))
+
+
+def _get_canonical_trigrams(canonical_text):
+    padded_words = ['  {0} '.format(word) for word in canonical_text.split()]
+    return set(padded_word[i:i + 3] for padded_word in padded_words for i in range(len(padded_word) - 2))
+
+
+class TrigramIndex(object):
+    '''Trigram index of the names, cities, countries and genres of radios, for typo tolerant lookups
+
+    Radios are added incrementally and the index is saved to path, as json, by
+    save (meant to be called every tools.SAVE_INTERVAL seconds, out of the searches).
+    It's loaded on first use.
+    Lookups start with the rarest trigrams of the query and stop once
+    max_visits radio ids were counted, so that their cost doesn't depend on
+    the index size. The max_candidates radios having most of these trigrams
+    are then ranked by similarity.
+    It can be used from any thread.'''
+
+    def __init__(self, path, max_visits=2000, max_candidates=30):
+        self.path = path
+        self.max_visits = max_visits
+        self.max_candidates = max_candidates
+        # radio id: (indexed canonical text, radio json data)
+        self._documents = {}
+        # trigram: array of radio ids
+        self._postings = {}
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.Lock()
+        # only one save at a time, without holding _lock while writing
+        self._save_lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._documents)
+
+    def add_radios(self, radios):
+        '''Index or reindex the radios'''
+        with self._lock:
+            self._load()
+            for radio in radios:
+                text = get_canonical_search_terms(' '.join([radio.name, radio.get_loaded_detail('city') or '',
+                                                            radio.country or ''] + radio.genres))
+                document = self._documents.get(radio.id)
+                if document is not None:
+                    if document[0] == text:
+                        continue
+                    self._remove_postings(radio.id, document[0])
+                self._documents[radio.id] = (text, json.dumps(radio.get_json_data()))
+                self._add_postings(radio.id, text)
+                self._dirty = True
+
+    def lookup(self, query, limit=25, min_similarity=0.3):
+        '''Return the (radio id, radio json data, similarity) of the radios best matching query
+
+        similarity is the part of the query trigrams found in the radio, then
+        the Jaccard index of both trigram sets, which decide the order.'''
+        query_trigrams = get_trigrams(query)
+        if not query_trigrams:
+            return []
+        with self._lock:
+            self._load()
+            counts = collections.Counter()
+            visits = 0
+            for (frequency, trigram) in sorted((len(self._postings[trigram]), trigram)
+                                               for trigram in query_trigrams if trigram in self._postings):
+                if visits and visits + frequency > self.max_visits:
+                    break
+                # even the rarest trigram can be very common, like in "radio"
+                counts.update(self._postings[trigram][:self.max_visits])
+                visits += frequency
+            candidates = [(radio_id, self._documents[radio_id])
+                          for (radio_id, count) in heapq.nlargest(self.max_candidates, counts.items(),
+                                                                  key=itemgetter(1))]
+        results = []
+        for (radio_id, (text, data)) in candidates:
+            trigrams = _get_canonical_trigrams(text)
+            common = len(query_trigrams & trigrams)
+            coverage = common / len(query_trigrams)
+            if coverage >= min_similarity:
+                results.append((coverage, common / len(query_trigrams | trigrams), radio_id, data))
+        results.sort(reverse=True)
+        return [(radio_id, json.loads(data), coverage) for (coverage, jaccard, radio_id, data) in results[:limit]]
+
+    def save(self):
+        '''Write the indexed radios to path if they changed since the last save
+
+        Lookups are only blocked while copying the radios, not while writing them.'''
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                documents = [(radio_id, text, radio_data)
+                             for (radio_id, (text, radio_data)) in self._documents.items()]
+                self._dirty = False
+            if not self._write(documents):
+                with self._lock:
+                    self._dirty = True
+
+    def _add_postings(self, radio_id, text):
+        for trigram in _get_canonical_trigrams(text):
+            postings = self._postings.get(trigram)
+            if postings is None:
+                postings = array('i')
+                self._postings[trigram] = postings
+            postings.append(radio_id)
+
+    def _remove_postings(self, radio_id, text):
+        for trigram in _get_canonical_trigrams(text):
+            postings = self._postings[trigram]
+            postings.remove(radio_id)
+            if not postings:
+                del(self._postings[trigram])
+
+    def _load(self):
+        '''Load the saved radios, if not done yet, rebuilding the trigram postings'''
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, OSError):
+            return
+        except ValueError as error:
+            _log.debug('Ignoring corrupted trigram index: {0}'.format(error))
+            return
+        if not isinstance(data, dict) or data.get('version') != INDEX_VERSION:
+            _log.debug('Ignoring trigram index from another version')
+            return
+        for (radio_id, text, radio_data) in data['documents']:
+            self._documents[radio_id] = (text, radio_data)
+            self._add_postings(radio_id, text)
+        _log.debug('Loaded {0} radios in the trigram index'.format(len(self._documents)))
+
+    def _write(self, documents):
+        '''Write the (radio id, text, radio data) documents to path, atomically. Return True on success'''
+        data = {'version': INDEX_VERSION, 'documents': documents}
+        try:
+            save_json(self.path, data)
+        except (IOError, OSError) as error:
+            _log.warning("Couldn't save the trigram index: {0}".format(error))
+            return False
+        return True